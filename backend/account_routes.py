@@ -1,12 +1,14 @@
 # Create file: account_routes.py
 import azure.functions as func
 import json
-from passlib.hash import bcrypt
 from models import PasswordChange, UserSettings
-from database import get_user_by_email, _container
+from database import get_user_by_email, _container, patch_document
+from storage import patch_path
 from user_routes import verify_session
 
 def change_password(req: func.HttpRequest) -> func.HttpResponse:
+    from passlib.hash import bcrypt
+
     is_valid, identity = verify_session(req)
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
@@ -93,31 +95,36 @@ def update_settings(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         settings_data = req.get_json()
+        if not isinstance(settings_data, dict):
+            return func.HttpResponse(json.dumps({"error": "Settings must be an object"}), status_code=400)
 
         user_doc = get_user_by_email(identity)
         if not user_doc:
             return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404)
 
-        # Initialize settings if not exist
-        if "settings" not in user_doc:
-            user_doc["settings"] = {}
-
-        # Update with deep merge
-        updated_settings = settings_data
-        
-        # Perform deep merge for nested objects
-        deep_merge(user_doc["settings"], updated_settings)
-
-        _container.upsert_item(user_doc)
+        # Deep merge expressed as patch operations, so untouched settings are kept
+        operations = merge_operations(settings_data, user_doc.get("settings"), "settings")
+        if operations:
+            user_doc = patch_document(identity, operations, create_parents=True)
+            if not user_doc:
+                return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404)
 
-        return func.HttpResponse(json.dumps(user_doc["settings"]), status_code=200)
+        return func.HttpResponse(json.dumps(user_doc.get("settings", {})), status_code=200)
     except Exception as e:
         return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
 
-def deep_merge(target, source):
-    """Deep merge dictionaries with nested keys"""
+def merge_operations(source, target, *prefix):
+    """
+    Patch operations that deep merge source into target, the object at prefix:
+    one 'set' per leaf, and one for a whole value where there is no object to
+    merge it into (missing, or not an object), so empty objects are set too.
+    """
+    if not isinstance(target, dict):
+        return [{"op": "set", "path": patch_path(*prefix), "value": source}]
+    operations = []
     for key, value in source.items():
-        if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-            deep_merge(target[key], value)
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            operations.extend(merge_operations(value, target[key], *prefix, key))
         else:
-            target[key] = value
\ No newline at end of file
+            operations.append({"op": "set", "path": patch_path(*prefix, key), "value": value})
+    return operations
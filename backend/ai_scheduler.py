@@ -5,8 +5,10 @@ import datetime
 import uuid
 import time
 import logging
+import threading
 from typing import List, Dict, Any, Optional, Tuple
-from openai import AzureOpenAI  # Azure OpenAI client
+
+from resilience import non_critical
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,20 +18,29 @@ logger = logging.getLogger(__name__)
 api_key = os.environ.get("AZURE_OPENAI_API_KEY")
 azure_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
 deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
-client = None
-
-if api_key and azure_endpoint:
-    client = AzureOpenAI(
-        api_key=api_key,
-        api_version="2023-05-15",
-        azure_endpoint=azure_endpoint
-    )
+_client = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    """Return the shared Azure OpenAI client, created on first use; None if not configured."""
+    global _client
+    if _client is None and api_key and azure_endpoint:
+        with _client_lock:
+            if _client is None:
+                # Deferred so the openai package only loads for requests that need it
+                from openai import AzureOpenAI
+                _client = AzureOpenAI(
+                    api_key=api_key,
+                    api_version="2023-05-15",
+                    azure_endpoint=azure_endpoint
+                )
+    return _client
 
 def call_openai_with_retry(prompt: str, max_retries: int = 3) -> Any:
     """Call OpenAI with retry logic for transient errors."""
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
+            response = get_openai_client().chat.completions.create(
                 model=deployment_name,
                 messages=[
                     {"role": "system", "content": "You are an advanced AI study scheduler that creates personalized, optimized study schedules based on user preferences, module characteristics, and learning science principles."},
@@ -245,7 +256,7 @@ def generate_study_schedule(user_email: str, schedule_request: dict, modules: Li
 
     try:
         # Call the Azure OpenAI API with retry logic
-        if client:
+        if get_openai_client():
             response = call_openai_with_retry(prompt)
             ai_response = response.choices[0].message.content.strip()
 
@@ -732,7 +743,7 @@ def generate_ai_tips(user_email: str, sessions: List[dict], modules: List[dict],
 
     try:
         # Call the Azure OpenAI API with updated client syntax
-        if client:
+        if get_openai_client():
             response = call_openai_with_retry(prompt)
             ai_response = response.choices[0].message.content.strip()
 
@@ -904,8 +915,8 @@ def learn_from_user_modifications(original_schedule: dict, modified_schedule: di
                 if session_mods:
                     modifications["session_changes"][session_id] = session_mods
         
-        # Record feedback for future learning
-        record_schedule_feedback(
+        # Record feedback for future learning; skipped while the store is throttling
+        non_critical(record_schedule_feedback)(
             user_email=original_schedule.get("user_email", "unknown"),
             schedule_id=original_schedule.get("id", "unknown"),
             feedback_type="modification",
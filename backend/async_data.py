@@ -0,0 +1,47 @@
+# async_data.py
+
+"""
+Awaitable versions of the read functions used by the heavy handlers.
+
+The data layer itself stays synchronous (the Cosmos sync client is thread-safe
+and already shared by every route); each wrapper runs its function on the
+default thread pool with asyncio.to_thread, which copies the caller's context so
+the request cache and data metrics keep working. Handlers then issue
+independent reads together:
+
+    stats, timeline = await asyncio.gather(
+        get_study_stats(identity),
+        get_sessions_timeline(identity),
+    )
+"""
+
+import asyncio
+import functools
+
+import database
+import grade_calculator
+import study_database
+
+
+def to_async(func):
+    """Wrap a blocking data function so it can be awaited without blocking the event loop."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return wrapper
+
+
+# Users
+get_user_by_email = to_async(database.get_user_by_email)
+
+# Grade statistics
+get_dashboard_stats = to_async(grade_calculator.get_dashboard_stats)
+get_prediction_analysis = to_async(grade_calculator.get_prediction_analysis)
+
+# Study analytics
+get_study_stats = to_async(study_database.get_study_stats)
+get_module_study_stats = to_async(study_database.get_module_study_stats)
+get_module_time_distribution = to_async(study_database.get_module_time_distribution)
+get_sessions_timeline = to_async(study_database.get_sessions_timeline)
+get_productivity_patterns = to_async(study_database.get_productivity_patterns)
+get_grade_distribution_data = to_async(study_database.get_grade_distribution_data)
@@ -1,8 +1,8 @@
 # blob_storage.py
 import os
 import logging
+import threading
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
 from azure.core.exceptions import AzureError
 
 # Configure logging
@@ -13,6 +13,20 @@ logger = logging.getLogger(__name__)
 STORAGE_CONNECTION_STRING = os.environ.get("STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = os.environ.get("STORAGE_CONTAINER_NAME", "user-avatars")
 
+_blob_service_client = None
+_client_lock = threading.Lock()
+
+def get_blob_service_client():
+    """Return the shared BlobServiceClient, created on first use."""
+    global _blob_service_client
+    if _blob_service_client is None:
+        with _client_lock:
+            if _blob_service_client is None:
+                # Deferred so azure.storage.blob only loads for avatar requests
+                from azure.storage.blob import BlobServiceClient
+                _blob_service_client = BlobServiceClient.from_connection_string(STORAGE_CONNECTION_STRING)
+    return _blob_service_client
+
 def generate_avatar_upload_url(user_email, filename):
     """
     Generates a SAS URL for direct browser upload to blob storage.
@@ -29,9 +43,9 @@ def generate_avatar_upload_url(user_email, filename):
         if not STORAGE_CONNECTION_STRING:
             raise ValueError("Storage connection string is not configured")
 
-        # Create blob service client
+        # Get blob service client
         try:
-            blob_service_client = BlobServiceClient.from_connection_string(STORAGE_CONNECTION_STRING)
+            blob_service_client = get_blob_service_client()
             container_client = blob_service_client.get_container_client(CONTAINER_NAME)
         except Exception as e:
             logger.error(f"Failed to create blob service client: {str(e)}")
@@ -48,6 +62,7 @@ def generate_avatar_upload_url(user_email, filename):
         
         # Generate SAS token with write permission (for frontend upload)
         try:
+            from azure.storage.blob import generate_blob_sas, BlobSasPermissions
             sas_token = generate_blob_sas(
                 account_name=blob_service_client.account_name,
                 container_name=CONTAINER_NAME,
@@ -87,8 +102,8 @@ def delete_avatar(blob_name):
         if not blob_name:
             raise ValueError("Blob name is required")
 
-        # Create blob service client
-        blob_service_client = BlobServiceClient.from_connection_string(STORAGE_CONNECTION_STRING)
+        # Get blob service client
+        blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client(CONTAINER_NAME)
         
         blob_client = container_client.get_blob_client(blob_name)
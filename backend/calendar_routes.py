@@ -3,7 +3,8 @@ import azure.functions as func
 import json
 import traceback
 from models import CalendarEvent
-from database import create_calendar_event, get_user_events, update_calendar_event, delete_calendar_event
+from database import create_calendar_event, get_user_events, get_user_events_page, update_calendar_event, delete_calendar_event
+from storage import page_params
 from user_routes import verify_session
 
 def get_events(req: func.HttpRequest) -> func.HttpResponse:
@@ -16,6 +17,14 @@ def get_events(req: func.HttpRequest) -> func.HttpResponse:
     end_date = req.params.get('end_date')
 
     try:
+        page_size, cursor = page_params(req.params)
+    except ValueError as e:
+        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+
+    try:
+        if page_size:
+            events, next_cursor = get_user_events_page(user_email, page_size, cursor, start_date, end_date)
+            return func.HttpResponse(json.dumps({"items": events, "next_cursor": next_cursor}), status_code=200)
         events = get_user_events(user_email, start_date, end_date)
         return func.HttpResponse(json.dumps(events), status_code=200)
     except Exception as e:
@@ -0,0 +1,114 @@
+# counters.py
+
+"""
+Sharded counters.
+
+A counter key (e.g. one university's registrations) is spread over
+COUNTER_SHARDS shard documents, each in its own partition. An increment picks
+a random shard and applies a single patch with incr operations to it, so
+concurrent increments are atomic, never lose updates, and no single document
+takes every write. Reading sums the shards.
+
+Shard documents live next to the documents they count:
+
+    {"id": "counter_shard:<key>:<n>", "type": "counter_shard",
+     "counter_key": <key>, "counts": {<name>: <int>}, "labels": {<name>: <str>}}
+
+Callers periodically fold the totals into a regular document (see
+database.compact_university_counters) so list views don't read shards.
+"""
+
+import os
+import random
+import time
+
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
+
+from storage import patch_path, PATCH_OPERATION_LIMIT
+
+COUNTER_SHARDS = int(os.environ.get("COUNTER_SHARDS", "8"))
+SHARD_TYPE = "counter_shard"
+BASE_SHARD = "base"
+
+
+def shard_id(key: str, shard) -> str:
+    return f"{SHARD_TYPE}:{key}:{shard}"
+
+
+def _shard_doc(key: str, shard, counts: dict, labels: dict = None) -> dict:
+    doc_id = shard_id(key, shard)
+    return {
+        "id": doc_id,
+        "type": SHARD_TYPE,
+        "counter_key": key,
+        "shard": shard,
+        "counts": dict(counts),
+        "labels": dict(labels or {})
+    }
+
+
+def increment(container, key: str, amounts: dict, labels: dict = None):
+    """
+    Atomically add amounts ({name: delta}) to the counters of key.
+    labels optionally records a display name per counter name.
+    """
+    operations = [{"op": "incr", "path": patch_path("counts", name), "value": delta} for name, delta in amounts.items()]
+    operations += [{"op": "set", "path": patch_path("labels", name), "value": label} for name, label in (labels or {}).items()]
+    if len(operations) > PATCH_OPERATION_LIMIT:
+        raise ValueError(f"A counter increment takes at most {PATCH_OPERATION_LIMIT} counters and labels")
+
+    shard = random.randrange(COUNTER_SHARDS)
+    doc_id = shard_id(key, shard)
+    while True:
+        try:
+            container.patch_item(item=doc_id, partition_key=doc_id, patch_operations=operations)
+            return
+        except CosmosResourceNotFoundError:
+            pass
+        try:
+            # First increment on this shard
+            container.create_item(body=_shard_doc(key, shard, amounts, labels))
+            return
+        except CosmosResourceExistsError:
+            # Another writer created it first; patch it instead
+            continue
+
+
+def seed(container, key: str, counts: dict, labels: dict = None) -> bool:
+    """
+    Record counts kept before sharding as the base shard of key, once.
+    Returns False if the base shard already existed.
+    """
+    try:
+        container.create_item(body=_shard_doc(key, BASE_SHARD, counts, labels))
+        return True
+    except CosmosResourceExistsError:
+        return False
+
+
+def read(container, key: str) -> tuple:
+    """
+    Return (counts, labels, seeded) for key, summed over its shards; seeded
+    tells whether a base shard has been recorded.
+    """
+    query = "SELECT * FROM c WHERE c.type = @type AND c.counter_key = @key"
+    parameters = [{"name": "@type", "value": SHARD_TYPE}, {"name": "@key", "value": key}]
+    counts = {}
+    labels = {}
+    seeded = False
+    for shard in container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+        for name, value in shard.get("counts", {}).items():
+            counts[name] = counts.get(name, 0) + value
+        labels.update(shard.get("labels", {}))
+        seeded = seeded or shard.get("shard") == BASE_SHARD
+    return counts, labels, seeded
+
+
+def keys_changed_since(container, seconds: float) -> set:
+    """Counter keys with a shard written in the last seconds."""
+    query = "SELECT c.counter_key FROM c WHERE c.type = @type AND c._ts >= @since"
+    parameters = [
+        {"name": "@type", "value": SHARD_TYPE},
+        {"name": "@since", "value": int(time.time() - seconds)}
+    ]
+    return {row["counter_key"] for row in container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True)}
@@ -1,27 +1,29 @@
 # dashboard_routes.py
 import azure.functions as func
+import asyncio
 import json
 from user_routes import verify_session
-from database import get_user_by_email, _container, get_user_modules
-from grade_calculator import get_dashboard_stats, get_prediction_analysis
+from database import get_user_by_email, _container, get_user_modules, patch_document, set_operations, push_recent_activity, get_module_cohorts
+from grade_calculator import get_dashboard_stats
+import async_data
+from resilience import non_critical
 from datetime import datetime
 
-def get_dashboard_data(req: func.HttpRequest) -> func.HttpResponse:
+async def get_dashboard_data(req: func.HttpRequest) -> func.HttpResponse:
     """Get all dashboard data including grade statistics"""
-    is_valid, identity = verify_session(req)
+    is_valid, identity = await asyncio.to_thread(verify_session, req)
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
 
     try:
-        # Get statistics
-        stats = get_dashboard_stats(identity)
-        
-        # Get predictions
-        predictions = get_prediction_analysis(identity)
+        # Statistics, predictions and the user's dashboard configuration load together
+        stats, predictions, user_doc = await asyncio.gather(
+            async_data.get_dashboard_stats(identity),
+            async_data.get_prediction_analysis(identity),
+            async_data.get_user_by_email(identity)
+        )
         stats["predictions"] = predictions
 
-        # Get user dashboard configuration
-        user_doc = get_user_by_email(identity)
         dashboard_config = user_doc.get("dashboardConfig", {})
         
         # Add personal information
@@ -80,10 +82,6 @@ def add_activity(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         activity_data = req.get_json()
-        user_doc = get_user_by_email(identity)
-
-        if not user_doc:
-            return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404)
 
         # Ensure required fields
         required_fields = ["title", "description", "type", "time"]
@@ -94,27 +92,17 @@ def add_activity(req: func.HttpRequest) -> func.HttpResponse:
                     status_code=400
                 )
 
-        # Initialize activities array if it doesn't exist
-        if "dashboardConfig" not in user_doc:
-            user_doc["dashboardConfig"] = {}
-        if "recentActivities" not in user_doc["dashboardConfig"]:
-            user_doc["dashboardConfig"]["recentActivities"] = []
-
         # Add timestamp if not provided
         if "timestamp" not in activity_data:
             activity_data["timestamp"] = datetime.utcnow().isoformat()
 
-        # Add new activity to the beginning
-        user_doc["dashboardConfig"]["recentActivities"].insert(0, activity_data)
-
-        # Limit to 10 activities
-        user_doc["dashboardConfig"]["recentActivities"] = user_doc["dashboardConfig"]["recentActivities"][:10]
-
-        # Save to database
-        _container.upsert_item(user_doc)
+        # Add new activity to the beginning (limited to 10 activities)
+        activities = push_recent_activity(identity, activity_data)
+        if activities is None:
+            return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404)
 
         return func.HttpResponse(
-            json.dumps(user_doc["dashboardConfig"]["recentActivities"]),
+            json.dumps(activities),
             status_code=200
         )
     except Exception as e:
@@ -133,18 +121,11 @@ def update_goals(req: func.HttpRequest) -> func.HttpResponse:
         if not user_doc:
             return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404)
 
-        # Initialize if needed
-        if "dashboardConfig" not in user_doc:
-            user_doc["dashboardConfig"] = {}
-
-        # Update goals
-        user_doc["dashboardConfig"]["goals"] = goals_data
-        
         # Calculate goal progress based on current stats
         stats = get_dashboard_stats(identity)
         current_avg = stats.get("overallAverage", 0)
         
-        for goal in user_doc["dashboardConfig"]["goals"]:
+        for goal in goals_data:
             if "target_score" in goal:
                 target = goal.get("target_score", 100)
                 # Calculate progress as percentage of target achieved
@@ -152,23 +133,25 @@ def update_goals(req: func.HttpRequest) -> func.HttpResponse:
                     progress = min(100, (current_avg / target) * 100)
                     goal["progress"] = round(progress, 1)
 
-        # Save to database
-        _container.upsert_item(user_doc)
+        # Save only the goals field
+        patch_document(identity, set_operations({"goals": goals_data}, "dashboardConfig"), create_parents=True)
 
-        return func.HttpResponse(json.dumps(user_doc["dashboardConfig"]["goals"]), status_code=200)
+        return func.HttpResponse(json.dumps(goals_data), status_code=200)
     except Exception as e:
         return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
 
-def get_insights(req: func.HttpRequest) -> func.HttpResponse:
+async def get_insights(req: func.HttpRequest) -> func.HttpResponse:
     """Get insights based on user's academic data"""
-    is_valid, identity = verify_session(req)
+    is_valid, identity = await asyncio.to_thread(verify_session, req)
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
 
     try:
         # Get user modules and statistics
-        stats = get_dashboard_stats(identity)
-        predictions = get_prediction_analysis(identity)
+        stats, predictions = await asyncio.gather(
+            async_data.get_dashboard_stats(identity),
+            async_data.get_prediction_analysis(identity)
+        )
         
         # Generate insights
         insights = []
@@ -251,11 +234,12 @@ def get_insights(req: func.HttpRequest) -> func.HttpResponse:
             })
             
         # Response with all insights
+        strengths_and_weaknesses = await asyncio.to_thread(get_strengths_and_weaknesses, identity)
         response = {
             "insights": insights,
             "predictions": predictions,
-            "strengths": get_strengths_and_weaknesses(identity)["strengths"],
-            "weaknesses": get_strengths_and_weaknesses(identity)["weaknesses"]
+            "strengths": strengths_and_weaknesses["strengths"],
+            "weaknesses": strengths_and_weaknesses["weaknesses"]
         }
         
         return func.HttpResponse(json.dumps(response), status_code=200)
@@ -285,15 +269,17 @@ def get_strengths_and_weaknesses(user_email: str) -> dict:
     weaknesses = sorted_modules[-num_to_show:]
     
     # Format for output
+    percentiles = _cohort_percentiles(strengths + weaknesses)
     strength_data = [
         {
             "name": m.get("name", "Unknown"),
             "score": m.get("score", 0),
             "year": m.get("year", "Unknown"),
             "semester": m.get("semester", 1),
-            "variance": round(m.get("score", 0) - average_score, 1)
+            "variance": round(m.get("score", 0) - average_score, 1),
+            "percentile": percentile
         }
-        for m in strengths
+        for m, percentile in zip(strengths, percentiles)
     ]
     
     weakness_data = [
@@ -302,12 +288,23 @@ def get_strengths_and_weaknesses(user_email: str) -> dict:
             "score": m.get("score", 0),
             "year": m.get("year", "Unknown"),
             "semester": m.get("semester", 1),
-            "variance": round(m.get("score", 0) - average_score, 1)
+            "variance": round(m.get("score", 0) - average_score, 1),
+            "percentile": percentile
         }
-        for m in weaknesses
+        for m, percentile in zip(weaknesses, percentiles[len(strengths):])
     ]
     
     return {
         "strengths": strength_data,
         "weaknesses": weakness_data
-    }
\ No newline at end of file
+    }
+
+def _cohort_percentiles(modules: list) -> list:
+    """Each module score's percentile against its cohort, or None (see database.get_module_cohort)"""
+    try:
+        # None when shed
+        cohorts = non_critical(get_module_cohorts)(modules) or [None] * len(modules)
+    except Exception as e:
+        print(f"Error getting module cohorts: {str(e)}")
+        cohorts = [None] * len(modules)
+    return [cohort["percentile"] if cohort else None for cohort in cohorts]
@@ -0,0 +1,309 @@
+# data_metrics.py
+
+"""
+Cost accounting for data access.
+
+storage.ContainerClient reports every container call here with its operation,
+query template, request charge (RU, from the x-ms-request-charge response
+header), item count and wall time. Calls are aggregated per endpoint - the
+function handler name that request_cache.request_scoped records for each
+invocation - so we can see which routes spend the RU budget.
+
+summary() returns the aggregates as JSON-friendly dicts and export_prometheus()
+renders the same data as Prometheus histograms; both are served by the
+metrics/data function.
+"""
+
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+DATA_METRICS_ENABLED = os.environ.get("DATA_METRICS_ENABLED", "true").lower() != "false"
+
+# Upper bounds of the histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+CHARGE_BUCKETS_RU = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Templates are normalized, but f-string queries could still produce unbounded keys
+MAX_TRACKED_KEYS = 2000
+BACKGROUND_ENDPOINT = "(background)"
+
+_current_endpoint = contextvars.ContextVar("data_metrics_endpoint", default=BACKGROUND_ENDPOINT)
+_current_totals = contextvars.ContextVar("data_metrics_totals", default=None)
+
+_lock = threading.Lock()
+_operations = {}
+_endpoints = {}
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_CONSTANT_LITERAL = re.compile(r"[A-Za-z_]{1,40}")
+_NUMBER_LITERAL = re.compile(r"(?<![\w@.])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, fraction: float):
+        """Upper bound of the bucket holding the given fraction of observations."""
+        observed = sum(self.counts)
+        if not observed:
+            return None
+        rank = fraction * observed
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= rank:
+                return self.bounds[index] if index < len(self.bounds) else self.maximum
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "sum": round(self.total, 3),
+            "max": round(self.maximum, 3),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class _OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.items = 0
+        self.request_charge = 0.0
+        self.latency = _Histogram(LATENCY_BUCKETS_MS)
+        self.charge = _Histogram(CHARGE_BUCKETS_RU)
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.calls = 0
+        self.request_charge = 0.0
+        self.charge_per_request = _Histogram(CHARGE_BUCKETS_RU)
+        self.calls_per_request = _Histogram((1, 2, 3, 5, 10, 20, 50, 100, 250))
+        self.data_latency = _Histogram(LATENCY_BUCKETS_MS)
+
+
+class _RequestTotals:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.request_charge = 0.0
+        self.seconds = 0.0
+
+
+def _mask_string(match) -> str:
+    # Keep word-like constants such as c.type = 'module' so different queries
+    # stay apart; emails, ids and dates inlined by f-strings become ?
+    literal = match.group(0)
+    return literal if _CONSTANT_LITERAL.fullmatch(literal[1:-1]) else "?"
+
+
+@functools.lru_cache(maxsize=1024)
+def query_template(query: str) -> str:
+    """Collapse literals and whitespace so the same query shape aggregates together."""
+    template = _STRING_LITERAL.sub(_mask_string, query)
+    template = _NUMBER_LITERAL.sub("?", template)
+    return _WHITESPACE.sub(" ", template).strip()
+
+
+def begin_request(endpoint: str) -> tuple:
+    """Attribute data calls made from here on to endpoint; returns a token for end_request."""
+    return _current_endpoint.set(endpoint), _current_totals.set(_RequestTotals())
+
+
+def end_request(token: tuple):
+    """Fold the finished invocation into its endpoint's per-request histograms."""
+    endpoint_token, totals_token = token
+    endpoint = _current_endpoint.get()
+    totals = _current_totals.get()
+    _current_endpoint.reset(endpoint_token)
+    _current_totals.reset(totals_token)
+    if not DATA_METRICS_ENABLED or totals is None:
+        return
+
+    with _lock:
+        stats = _endpoints.get(endpoint)
+        if stats is None:
+            stats = _endpoints[endpoint] = _EndpointStats()
+        stats.requests += 1
+        stats.charge_per_request.observe(totals.request_charge)
+        stats.calls_per_request.observe(totals.calls)
+        stats.data_latency.observe(totals.seconds * 1000)
+
+    if totals.calls:
+        logger.info(
+            f"data access endpoint={endpoint} calls={totals.calls} "
+            f"request_charge={totals.request_charge:.2f} data_ms={totals.seconds * 1000:.1f}"
+        )
+
+
+def record(container: str, operation: str, template: str, request_charge: float, item_count: int, seconds: float, error: bool = False):
+    """Record one container call against the current endpoint."""
+    if not DATA_METRICS_ENABLED:
+        return
+    endpoint = _current_endpoint.get()
+    key = (endpoint, container, operation, template)
+
+    totals = _current_totals.get()
+    if totals is not None:
+        with totals.lock:
+            totals.calls += 1
+            totals.request_charge += request_charge
+            totals.seconds += seconds
+
+    with _lock:
+        stats = _operations.get(key)
+        if stats is None:
+            if len(_operations) >= MAX_TRACKED_KEYS:
+                key = (endpoint, container, operation, "(other)")
+                stats = _operations.get(key)
+            if stats is None:
+                stats = _operations[key] = _OperationStats()
+        stats.count += 1
+        stats.items += item_count
+        stats.request_charge += request_charge
+        stats.latency.observe(seconds * 1000)
+        stats.charge.observe(request_charge)
+        if error:
+            stats.errors += 1
+
+        endpoint_stats = _endpoints.get(endpoint)
+        if endpoint_stats is None:
+            endpoint_stats = _endpoints[endpoint] = _EndpointStats()
+        endpoint_stats.calls += 1
+        endpoint_stats.request_charge += request_charge
+
+
+def summary(endpoint: str = None) -> dict:
+    """Aggregates per endpoint and per call site, most expensive first."""
+    with _lock:
+        endpoints = {
+            name: {
+                "requests": stats.requests,
+                "calls": stats.calls,
+                "request_charge": round(stats.request_charge, 3),
+                "charge_per_request": stats.charge_per_request.to_dict(),
+                "calls_per_request": stats.calls_per_request.to_dict(),
+                "data_latency_ms": stats.data_latency.to_dict(),
+            }
+            for name, stats in _endpoints.items()
+            if endpoint is None or name == endpoint
+        }
+        operations = [
+            {
+                "endpoint": key[0],
+                "container": key[1],
+                "operation": key[2],
+                "template": key[3],
+                "count": stats.count,
+                "errors": stats.errors,
+                "items": stats.items,
+                "request_charge": round(stats.request_charge, 3),
+                "latency_ms": stats.latency.to_dict(),
+                "charge_ru": stats.charge.to_dict(),
+            }
+            for key, stats in _operations.items()
+            if endpoint is None or key[0] == endpoint
+        ]
+
+    operations.sort(key=lambda op: (op["request_charge"], op["latency_ms"]["sum"]), reverse=True)
+    ranked = dict(sorted(endpoints.items(), key=lambda item: item[1]["request_charge"], reverse=True))
+    return {"endpoints": ranked, "operations": operations}
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+
+def _prometheus_histogram(lines: list, name: str, labels: str, histogram: _Histogram):
+    running = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        running += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+    running += histogram.counts[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {running}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+    lines.append(f"{name}_count{{{labels}}} {running}")
+
+
+def export_prometheus() -> str:
+    """
+    Render the aggregates in the Prometheus text format.
+
+    Query templates are left out of the labels to keep cardinality bounded;
+    call sites are merged per (endpoint, container, operation).
+    """
+    merged = {}
+    with _lock:
+        for (endpoint, container, operation, _), stats in _operations.items():
+            key = (endpoint, container, operation)
+            target = merged.get(key)
+            if target is None:
+                target = merged[key] = _OperationStats()
+            target.count += stats.count
+            target.errors += stats.errors
+            target.items += stats.items
+            target.request_charge += stats.request_charge
+            for mine, theirs in ((target.latency, stats.latency), (target.charge, stats.charge)):
+                mine.counts = [a + b for a, b in zip(mine.counts, theirs.counts)]
+                mine.total += theirs.total
+                mine.maximum = max(mine.maximum, theirs.maximum)
+        endpoints = {
+            name: (stats.requests, stats.charge_per_request.counts[:], stats.charge_per_request.total)
+            for name, stats in _endpoints.items()
+        }
+
+    lines = [
+        "# TYPE gradeguard_data_call_latency_ms histogram",
+    ]
+    for (endpoint, container, operation), stats in sorted(merged.items()):
+        labels = f'endpoint="{_label(endpoint)}",container="{_label(container)}",operation="{_label(operation)}"'
+        _prometheus_histogram(lines, "gradeguard_data_call_latency_ms", labels, stats.latency)
+
+    # Each family's samples must follow its own TYPE line
+    for family, field in (
+        ("gradeguard_data_request_charge_total", "request_charge"),
+        ("gradeguard_data_items_total", "items"),
+        ("gradeguard_data_errors_total", "errors"),
+    ):
+        lines.append(f"# TYPE {family} counter")
+        for (endpoint, container, operation), stats in sorted(merged.items()):
+            labels = f'endpoint="{_label(endpoint)}",container="{_label(container)}",operation="{_label(operation)}"'
+            lines.append(f"{family}{{{labels}}} {getattr(stats, field)}")
+
+    lines.append("# TYPE gradeguard_endpoint_request_charge_ru histogram")
+    for endpoint, (requests, counts, total) in sorted(endpoints.items()):
+        histogram = _Histogram(CHARGE_BUCKETS_RU)
+        histogram.counts = counts
+        histogram.total = total
+        _prometheus_histogram(lines, "gradeguard_endpoint_request_charge_ru", f'endpoint="{_label(endpoint)}"', histogram)
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop all collected metrics."""
+    with _lock:
+        _operations.clear()
+        _endpoints.clear()
@@ -1,105 +1,442 @@
 # database.py
 
+import collections
 import os
+import time
 import uuid
-from azure.cosmos import CosmosClient
 from datetime import datetime
 import json
 from typing import List, Dict, Any
+from urllib.parse import quote
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+from storage import get_container, patch_path, apply_patch_operations, optimistic_update, decode_cursor, encode_cursor, PATCH_OPERATION_LIMIT
+from storage_layout import main_container, SYSTEM_PROPERTIES
+import counters
+import score_sketch
+from university_catalog import UniversityCatalog
+from university_search import UniversitySearchIndex
+from module_search import ModuleSearchIndex
+from request_cache import memoize_per_request
 
-COSMOS_ENDPOINT = os.environ.get("COSMOS_ENDPOINT")
-COSMOS_KEY = os.environ.get("COSMOS_KEY")
-COSMOS_DBNAME = os.environ.get("COSMOS_DBNAME")
-COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER")  # e.g., "users"
-COSMOS_UNI_CONTAINER = os.environ.get("COSMOS_UNI_CONTAINER")  # e.g. "universities"
+COSMOS_CONTAINER = os.environ.get("COSMOS_CONTAINER", "users")
+COSMOS_UNI_CONTAINER = os.environ.get("COSMOS_UNI_CONTAINER", "universities")
 COSMOS_EVENTS_CONTAINER = os.environ.get("COSMOS_EVENTS_CONTAINER", "events")
 
 
-_client = CosmosClient(COSMOS_ENDPOINT, credential=COSMOS_KEY)
-_db = _client.get_database_client(COSMOS_DBNAME)
-
-_container = _db.get_container_client(COSMOS_CONTAINER)
-_uni_container = _db.get_container_client(COSMOS_UNI_CONTAINER)
-_events_container = _db.get_container_client(COSMOS_EVENTS_CONTAINER)
+# Container clients come from the configured storage backend (see storage.py);
+# the main container is routed by STORAGE_LAYOUT (see storage_layout.py)
+_container = main_container(COSMOS_CONTAINER)
+_uni_container = get_container(COSMOS_UNI_CONTAINER, "/id")
+_events_container = get_container(COSMOS_EVENTS_CONTAINER, "/pk")
 
 def create_user(user_dict: dict):
     _container.create_item(user_dict)
 
+@memoize_per_request
 def get_user_by_email(email: str):
     try:
         user_doc = _container.read_item(item=email, partition_key=email)
         return user_doc
-    except Exception:
+    except CosmosResourceNotFoundError:
+        # Anything else (throttling, outages) propagates so it is not mistaken
+        # for a missing account
+        return None
+
+def user_partition_key(doc_id: str, user_email: str = None):
+    """
+    Partition key to pass to the main container for a document: its owner.
+    Documents without an owner (users, auth sessions, reset tokens) own themselves.
+    """
+    return user_email if user_email is not None else doc_id
+
+def read_document(doc_id: str, user_email: str = None, doc_type: str = None):
+    """
+    Point-read a document from the main container by id.
+    Returns None if it does not exist, belongs to another user or has a different type.
+    """
+    try:
+        doc = _container.read_item(item=doc_id, partition_key=user_partition_key(doc_id, user_email))
+    except CosmosResourceNotFoundError:
+        return None
+    if user_email is not None and doc.get("user_email") != user_email:
+        return None
+    if doc_type is not None and doc.get("type") != doc_type:
+        return None
+    return doc
+
+def find_document(doc_id: str, doc_type: str = None):
+    """
+    Read a document from the main container when its owner isn't known.
+    Only a point read in the legacy layout; prefer read_document with the owner.
+    """
+    try:
+        doc = _container.read_item(item=doc_id, partition_key=None)
+    except CosmosResourceNotFoundError:
+        return None
+    if doc_type is not None and doc.get("type") != doc_type:
         return None
+    return doc
+
+def delete_document(doc_id: str, user_email: str = None):
+    """Delete a document from the main container by id."""
+    _container.delete_item(item=doc_id, partition_key=user_partition_key(doc_id, user_email))
 
+def set_operations(updates: dict, *prefix) -> list:
+    """Build patch 'set' operations for each field in updates (optionally under a nested path)."""
+    return [{"op": "set", "path": patch_path(*prefix, key), "value": value} for key, value in updates.items()]
+
+def _filter_predicate(user_email: str = None, doc_type: str = None, condition: str = None):
+    clauses = []
+    if user_email is not None:
+        clauses.append(f"c.user_email = {json.dumps(user_email, ensure_ascii=False)}")
+    if doc_type is not None:
+        clauses.append(f"c.type = {json.dumps(doc_type)}")
+    if condition:
+        clauses.append(f"({condition})")
+    return f"FROM c WHERE {' AND '.join(clauses)}" if clauses else None
+
+def patch_document(doc_id: str, operations: list, user_email: str = None, doc_type: str = None,
+                   condition: str = None, create_parents: bool = False):
+    """
+    Apply partial-update operations (set/add/replace/remove/incr) to a document
+    in the main container without reading it first.
+
+    Ownership, type and an optional extra condition (SQL over c) are checked
+    server-side. More than PATCH_OPERATION_LIMIT operations are sent as one
+    transactional batch. With create_parents, a patch that fails because an
+    intermediate object is missing falls back to an ETag-guarded
+    read-modify-replace, checking the same conditions.
+    Returns the updated document, or None if it is missing or a check fails.
+    """
+    partition_key = user_partition_key(doc_id, user_email)
+    predicate = _filter_predicate(user_email, doc_type, condition)
+    try:
+        if len(operations) <= PATCH_OPERATION_LIMIT:
+            return _container.patch_item(
+                item=doc_id,
+                partition_key=partition_key,
+                patch_operations=operations,
+                filter_predicate=predicate
+            )
+        batch = [
+            ("patch", (doc_id, operations[i:i + PATCH_OPERATION_LIMIT]), {"filter_predicate": predicate} if predicate else {})
+            for i in range(0, len(operations), PATCH_OPERATION_LIMIT)
+        ]
+        results = _container.execute_item_batch(batch_operations=batch, partition_key=partition_key)
+        return results[-1].get("resourceBody")
+    except (CosmosResourceNotFoundError, CosmosAccessConditionFailedError):
+        return None
+    except (CosmosHttpResponseError, CosmosBatchOperationError) as e:
+        if e.status_code in (404, 412):
+            return None
+        if e.status_code != 400 or not create_parents:
+            raise
+
+    # A parent object on one of the paths doesn't exist yet (e.g. first write to a
+    # nested map): read-modify-write under the ETag, so concurrent patches to the
+    # document are re-applied rather than overwritten
+    from local_storage import compile_query
+    passed = [False]
+
+    def apply_operations(doc):
+        # The checks the patch would have made server-side, on each fresh copy
+        passed[0] = not predicate or bool(compile_query(f"SELECT * {predicate}").run([doc]))
+        if not passed[0]:
+            return False
+        apply_patch_operations(doc, operations, create_parents=True)
+
+    updated = optimistic_update(_container, doc_id, partition_key, apply_operations)
+    return updated if updated is not None and passed[0] else None
+
+RECENT_ACTIVITY_LIMIT = 10
+
+def push_recent_activity(user_email: str, activity: dict):
+    """
+    Prepend an activity to the user's dashboard feed and trim it to
+    RECENT_ACTIVITY_LIMIT entries, using patches instead of rewriting the user doc.
+    Returns the updated activity list, or None if the user doesn't exist.
+    """
+    path = patch_path("dashboardConfig", "recentActivities")
+    user_doc = patch_document(user_email, [{"op": "add", "path": f"{path}/0", "value": activity}], create_parents=True)
+    if not user_doc:
+        return None
+
+    activities = user_doc["dashboardConfig"]["recentActivities"]
+    overflow = len(activities) - RECENT_ACTIVITY_LIMIT
+    if overflow > 0:
+        trim = [{"op": "remove", "path": f"{path}/{RECENT_ACTIVITY_LIMIT}"}] * min(overflow, PATCH_OPERATION_LIMIT)
+        patch_document(
+            user_email,
+            trim,
+            condition=f"ARRAY_LENGTH(c.dashboardConfig.recentActivities) >= {RECENT_ACTIVITY_LIMIT + len(trim)}"
+        )
+    return activities[:RECENT_ACTIVITY_LIMIT]
+
+@memoize_per_request
 def get_user_modules(email: str) -> List[Dict[str, Any]]:
     """Retrieve modules for a user"""
-    query = f"SELECT * FROM c WHERE c.type = 'module' AND c.user_email = '{email}'"
-    modules = list(_container.query_items(query=query, enable_cross_partition_query=True))
+    query = "SELECT * FROM c WHERE c.type = 'module' AND c.user_email = @email"
+    parameters = [{"name": "@email", "value": email}]
+    modules = list(_container.query_items(query=query, parameters=parameters, partition_key=email))
     return modules
 
+# Registration counts are sharded counters keyed by university document id;
+# the document's counter and major_counts fields are refreshed by compaction
+COUNTER_COMPACTION_LOOKBACK_SECONDS = int(os.environ.get("COUNTER_COMPACTION_LOOKBACK_SECONDS", "900"))
+TOTAL_COUNTER = "total"
+
+def _major_counter(major_name: str) -> str:
+    return f"major:{major_name.lower()}"
+
+# Majors are named once, in a dictionary document shared by every university:
+#
+#     {"id": "majors_dictionary", "type": "majors_dictionary", "majors": {<major id>: <name>}}
+#
+# University documents only count the majors that have students, by id
+# ("major_counts": {<major id>: n}). Documents written before keep a "majors"
+# list of every major with its counter until their counters are next compacted
+# or migrate_majors.py runs.
+MAJORS_DICTIONARY_ID = "majors_dictionary"
+MAJORS_RELOAD_SECONDS = 60
+_majors_cache = {"by_id": None, "by_name": None, "loaded_at": 0.0}
+
+def _cache_majors_dictionary(doc: dict) -> dict:
+    by_id = dict(doc.get("majors", {}))
+    _majors_cache.update(
+        by_id=by_id,
+        by_name={name.lower(): major for major, name in by_id.items()},
+        loaded_at=time.monotonic()
+    )
+    return _majors_cache
+
+def _load_majors_dictionary() -> dict:
+    try:
+        doc = _uni_container.read_item(item=MAJORS_DICTIONARY_ID, partition_key=MAJORS_DICTIONARY_ID)
+    except CosmosResourceNotFoundError:
+        doc = {}
+    return _cache_majors_dictionary(doc)
+
+def get_majors_dictionary() -> dict:
+    """{major id: name} of every major, cached in this worker."""
+    if _majors_cache["by_id"] is None:
+        _load_majors_dictionary()
+    return _majors_cache["by_id"]
+
+def major_id(major_name: str, create: bool = False):
+    """
+    Dictionary id of a major by name (case-insensitive), or None. With create,
+    a major missing from the dictionary is added to it; only registrations and
+    counter compaction create majors, never reads.
+    """
+    key = (major_name or "").strip().lower()
+    if not key:
+        return None
+    get_majors_dictionary()
+    if key in _majors_cache["by_name"]:
+        return _majors_cache["by_name"][key]
+    if not create:
+        # Another worker may have added it since we loaded
+        if time.monotonic() - _majors_cache["loaded_at"] > MAJORS_RELOAD_SECONDS:
+            _load_majors_dictionary()
+        return _majors_cache["by_name"].get(key)
+
+    added = [None]
+
+    def add_major(doc):
+        majors = doc.setdefault("majors", {})
+        for major, name in majors.items():
+            if name.lower() == key:
+                # Added by another worker since we loaded
+                added[0] = major
+                return False
+        added[0] = str(max((int(major) for major in majors if major.isdigit()), default=0) + 1)
+        majors[added[0]] = major_name.strip()
+
+    stored = optimistic_update(
+        _uni_container,
+        MAJORS_DICTIONARY_ID,
+        MAJORS_DICTIONARY_ID,
+        add_major,
+        create=lambda: {"id": MAJORS_DICTIONARY_ID, "type": "majors_dictionary", "majors": {}}
+    )
+    _cache_majors_dictionary(stored)
+    return added[0]
+
+def get_major_count(uni_doc: dict, major_name: str) -> int:
+    """Students of a university registered for a major, as last compacted into its document."""
+    if "majors" in uni_doc and "major_counts" not in uni_doc:
+        for major in uni_doc["majors"]:
+            if major.get("major_name") == major_name:
+                return major.get("counter", 0)
+        return 0
+    # Live counts of majors not in the dictionary yet are keyed by name
+    return uni_doc.get("major_counts", {}).get(major_id(major_name) or major_name, 0)
+
+def _find_university_doc(university_name: str):
+    """University document by id, falling back to a name lookup for documents stored under another id."""
+    doc = get_university_doc(university_name)
+    if doc:
+        return doc
+    query = "SELECT * FROM c WHERE c.name = @name"
+    parameters = [{"name": "@name", "value": university_name}]
+    items = list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+    return items[0] if items else None
+
+def _ensure_university_doc(university_name: str):
+    """The university's document, created if this is its first student or module."""
+    uni_doc = _find_university_doc(university_name)
+    if uni_doc is not None:
+        return uni_doc
+    try:
+        uni_doc = _uni_container.create_item({
+            "id": university_name,  # Use name as ID
+            "name": university_name,
+            "counter": 0,
+            "major_counts": {}
+        })
+    except CosmosResourceExistsError:
+        return get_university_doc(university_name)
+    _university_catalog.invalidate()
+    return uni_doc
+
 def increment_university_and_major_counter(university_name: str, major_name: str):
     """
-    Increments counters for university and major, handling the case when the university
-    already exists in a different document.
+    Count a registration for a university and major, creating the university
+    document if needed. The increment is a single atomic patch on one counter
+    shard, so concurrent registrations neither conflict nor lose counts.
     """
     try:
-        # First, query for the university by name (instead of trying to read directly)
-        query = f"SELECT * FROM c WHERE c.name = '{university_name}'"
-        items = list(_uni_container.query_items(query=query, enable_cross_partition_query=True))
-        
-        # If we found items, use the first one
-        if items:
-            uni_doc = items[0]
-        else:
-            # Create a new university document
-            uni_doc = {
-                "id": university_name,  # Use name as ID
-                "name": university_name,
-                "counter": 0,
-                "majors": []
-            }
-        
-        # Increment the counter
-        uni_doc["counter"] = uni_doc.get("counter", 0) + 1
-        
-        # Check if the major exists
-        major_found = None
-        for m in uni_doc.get("majors", []):
-            if m["major_name"].lower() == major_name.lower():
-                major_found = m
-                break
-        
-        # If major found, increment counter, otherwise add it
-        if major_found:
-            major_found["counter"] += 1
-        else:
-            if "majors" not in uni_doc:
-                uni_doc["majors"] = []
-            
-            uni_doc["majors"].append({
-                "major_name": major_name,
-                "counter": 1
-            })
-        
-        # Upsert (update or insert) the document
-        _uni_container.upsert_item(uni_doc)
-        
+        uni_doc = _ensure_university_doc(university_name)
+        # Registering a major nobody has taken yet names it in the dictionary
+        major_id(major_name, create=True)
+
+        major_key = _major_counter(major_name)
+        counters.increment(
+            _uni_container,
+            uni_doc["id"],
+            {TOTAL_COUNTER: 1, major_key: 1},
+            labels={major_key: major_name}
+        )
     except Exception as e:
         print(f"Error updating university counter: {str(e)}")
         # Don't raise the exception - we don't want user registration to fail
         # if the counter update fails
 
+def _document_counts(uni_doc: dict) -> tuple:
+    """Counts stored on a university document before its counters were sharded."""
+    counts = {TOTAL_COUNTER: uni_doc.get("counter", 0)}
+    labels = {}
+    majors = [(major["major_name"], major.get("counter", 0)) for major in uni_doc.get("majors", [])]
+    dictionary = get_majors_dictionary() if uni_doc.get("major_counts") else {}
+    majors += [(dictionary.get(major, major), count) for major, count in uni_doc.get("major_counts", {}).items()]
+    for major_name, count in majors:
+        key = _major_counter(major_name)
+        counts[key] = counts.get(key, 0) + count
+        labels[key] = major_name
+    return counts, labels
+
+def _university_totals(uni_doc: dict, counts: dict, labels: dict, create: bool = False) -> tuple:
+    """
+    Turn counter totals into the document's (counter, major_counts) fields.
+    Majors missing from the dictionary are keyed by name unless create adds them.
+    """
+    # Keep the spelling a major was first listed under
+    names = {_major_counter(m["major_name"]): m["major_name"] for m in uni_doc.get("majors", [])}
+    major_counts = {}
+    for name, value in counts.items():
+        if not name.startswith("major:") or not value:
+            continue
+        label = names.get(name) or labels.get(name) or name[len("major:"):]
+        major = major_id(label, create=create) or label
+        major_counts[major] = major_counts.get(major, 0) + value
+    return counts.get(TOTAL_COUNTER, 0), major_counts
+
+def get_university_counts(uni_doc: dict) -> tuple:
+    """Exact (counter, major_counts) for a university document, including increments not yet compacted."""
+    counts, labels, seeded = counters.read(_uni_container, uni_doc["id"])
+    if not seeded:
+        document_counts, document_labels = _document_counts(uni_doc)
+        for name, value in document_counts.items():
+            counts[name] = counts.get(name, 0) + value
+        labels = {**document_labels, **labels}
+    return _university_totals(uni_doc, counts, labels)
+
+def with_live_counts(uni_doc: dict) -> dict:
+    """Copy of a university document with exact registration counts."""
+    doc = dict(uni_doc)
+    doc["counter"], doc["major_counts"] = get_university_counts(uni_doc)
+    doc.pop("majors", None)
+    return doc
+
+def compact_university_counters(lookback_seconds: int = COUNTER_COMPACTION_LOOKBACK_SECONDS) -> int:
+    """
+    Fold the sharded registration counts of universities whose counters changed
+    recently into their documents' counter and major_counts fields. Idempotent; the
+    lookback overlaps runs so a missed run is caught up by the next one.
+    Returns the number of universities updated.
+    """
+    updated = 0
+    for key in counters.keys_changed_since(_uni_container, lookback_seconds):
+        uni_doc = get_university_doc(key)
+        if not uni_doc:
+            continue
+        counts, labels, seeded = counters.read(_uni_container, key)
+        if not seeded:
+            # First compaction: the document still holds the pre-sharding counts
+            document_counts, document_labels = _document_counts(uni_doc)
+            counters.seed(_uni_container, key, document_counts, document_labels)
+            counts, labels, _ = counters.read(_uni_container, key)
+        counter, major_counts = _university_totals(uni_doc, counts, labels, create=True)
+        operations = set_operations({
+            "counter": counter,
+            "major_counts": major_counts,
+            "counter_compacted_at": datetime.utcnow().isoformat()
+        })
+        if "majors" in uni_doc:
+            # Superseded by major_counts
+            operations.append({"op": "remove", "path": patch_path("majors")})
+        _uni_container.patch_item(item=key, partition_key=key, patch_operations=operations)
+        updated += 1
+    if updated:
+        _university_catalog.invalidate()
+    return updated
+
+# University documents are the untyped ones; counter shards share the container
+_UNIVERSITY_DOCS_QUERY = "SELECT * FROM c WHERE NOT IS_DEFINED(c.type)"
+
+def _fetch_university_docs(since: int = None):
+    """University documents written at or after the _ts since (all of them when None)."""
+    if since is None:
+        return list(_uni_container.query_items(query=_UNIVERSITY_DOCS_QUERY, enable_cross_partition_query=True))
+    query = _UNIVERSITY_DOCS_QUERY + " AND c._ts >= @since"
+    parameters = [{"name": "@since", "value": since}]
+    return list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+
+# Module search also indexes statistics still embedded in university documents
+_module_search_index = ModuleSearchIndex(lambda uni_doc: _legacy_module_stats(uni_doc))
+_university_catalog = UniversityCatalog(_fetch_university_docs, on_refresh=_module_search_index.apply_universities)
+
 def get_all_universities_docs():
-    query = "SELECT * FROM c"
-    items = list(_uni_container.query_items(query=query, enable_cross_partition_query=True))
-    return items
+    """Every university document, served from the process-wide catalog snapshot (read-only)."""
+    return _university_catalog.documents()
+
+def get_all_universities_json() -> str:
+    """get_all_universities_docs() serialized, once per catalog snapshot."""
+    return _university_catalog.derive("json", json.dumps)
 
 def get_university_doc(university_name: str):
     try:
         doc = _uni_container.read_item(item=university_name, partition_key=university_name)
         return doc
-    except:
+    except CosmosResourceNotFoundError:
+        # Throttling, outages and open breakers propagate so they are not
+        # mistaken for a missing university (and one created in its place)
         return None
 
 def update_user_calculator(email: str, calculator_config: dict):
@@ -109,15 +446,31 @@ def update_user_calculator(email: str, calculator_config: dict):
     user_doc["calculator"] = calculator_config
     _container.upsert_item(user_doc)
 
+def _university_search_index() -> UniversitySearchIndex:
+    # Rebuilt only when the catalog snapshot changes
+    return _university_catalog.derive("search_index", UniversitySearchIndex)
+
 def search_universities(query: str, limit: int = 10, offset: int = 0):
-    query_lower = query.lower()
-    query_str = "SELECT * FROM c WHERE CONTAINS(LOWER(c.name), @query)"
-    parameters = [{"name": "@query", "value": query_lower}]
-    items = list(_uni_container.query_items(query=query_str, parameters=parameters, enable_cross_partition_query=True))
-    return items[offset:offset+limit]
+    """Universities whose name contains query, best matches first (see university_search.py)."""
+    return _university_search_index().search(query, offset=offset, limit=limit)
 
+def search_cursor_offset(cursor: str = None) -> int:
+    """Offset a university search cursor points at; raises ValueError if it is malformed."""
+    offset = int(decode_cursor(cursor) or 0)
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
 
-def create_calendar_event(user_email: str, event_data: dict):
+def search_universities_page(query: str, page_size: int, cursor: str = None):
+    """Return (universities, next_cursor) for one page of a name search"""
+    offset = search_cursor_offset(cursor)
+    results = _university_search_index().search(query, offset=offset, limit=page_size + 1)
+    next_cursor = encode_cursor(str(offset + page_size)) if len(results) > page_size else None
+    return results[:page_size], next_cursor
+
+
+def prepare_calendar_event(user_email: str, event_data: dict):
+    """Assign id, owner and partition key to a new calendar event"""
     # Generate ID if not provided
     if not event_data.get('id'):
         event_data['id'] = str(uuid.uuid4())
@@ -125,16 +478,53 @@ def create_calendar_event(user_email: str, event_data: dict):
     event_data['user_email'] = user_email
     
     # Create composite key for partitioning
-    event_id = event_data['id']
-    event_data['pk'] = f"{user_email}:{event_id}"
+    event_data['pk'] = f"{user_email}:{event_data['id']}"
+    return event_data
+
+def create_calendar_event(user_email: str, event_data: dict):
+    prepare_calendar_event(user_email, event_data)
     
-    print(f"Creating event with ID: {event_id} and partition key: {event_data['pk']}")
+    print(f"Creating event with ID: {event_data['id']} and partition key: {event_data['pk']}")
     
     created_item = _events_container.create_item(body=event_data)
     return created_item  # Return the actual created item from the database
 
+def create_calendar_events(user_email: str, events: List[dict]):
+    """
+    Create many calendar events with one bulk write. If it fails, the events
+    are created one by one and those that still fail are skipped; returns the
+    events created.
+    """
+    for event_data in events:
+        prepare_calendar_event(user_email, event_data)
+    try:
+        return _events_container.bulk_create(events)
+    except Exception as e:
+        print(f"Bulk event creation failed, creating events one by one: {str(e)}")
 
-def get_user_events(user_email: str, start_date: str = None, end_date: str = None):
+    created = []
+    for event_data in events:
+        try:
+            created.append(_events_container.create_item(body=event_data))
+        except CosmosResourceExistsError:
+            # Written before the bulk write failed
+            created.append(event_data)
+        except Exception as e:
+            print(f"Error creating calendar event {event_data['id']}: {str(e)}")
+    return created
+
+def discard_calendar_events(events: List[dict]):
+    """Best-effort delete of events created by create_calendar_events whose sessions could not be saved"""
+    for event_data in events:
+        try:
+            _events_container.delete_item(item=event_data["id"], partition_key=event_data["pk"])
+        except CosmosResourceNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error discarding calendar event {event_data['id']}: {str(e)}")
+
+
+def _user_events_query(user_email: str, start_date: str = None, end_date: str = None):
     query = "SELECT * FROM c WHERE c.user_email = @email"
     params = [{"name": "@email", "value": user_email}]
     
@@ -144,7 +534,10 @@ def get_user_events(user_email: str, start_date: str = None, end_date: str = Non
             {"name": "@start", "value": start_date},
             {"name": "@end", "value": end_date}
         ])
-    
+    return query, params
+
+def get_user_events(user_email: str, start_date: str = None, end_date: str = None):
+    query, params = _user_events_query(user_email, start_date, end_date)
     events = list(_events_container.query_items(
         query=query,
         parameters=params,
@@ -152,6 +545,11 @@ def get_user_events(user_email: str, start_date: str = None, end_date: str = Non
     ))
     return events
 
+def get_user_events_page(user_email: str, page_size: int, cursor: str = None, start_date: str = None, end_date: str = None):
+    """Return (events, next_cursor) for one page of a user's calendar events"""
+    query, params = _user_events_query(user_email, start_date, end_date)
+    return _events_container.query_page(query, params, page_size, cursor, enable_cross_partition_query=True)
+
 def update_calendar_event(user_email: str, event_id: str, update_data: dict):
     pk = f"{user_email}:{event_id}"
     try:
@@ -270,25 +668,221 @@ def delete_calendar_event(user_email: str, event_id: str):
         print(traceback.format_exc())
         return False
     
+# Module statistics live in the universities container as one small document
+# per (university, degree, module), so a score or review only rewrites its own
+# module's document:
+#
+#     {"id": "module_stats:<university>:<degree>:<module key>", "type": "module_stats",
+#      "university": <university id>, "degree": <degree>, "module_key": <code, else name>,
+#      "name", "code", "average_score", "student_counter", "grade_distribution",
+#      "score_sketch" (see score_sketch.py; absent for modules scored before it),
+#      "module_id", "review_totals", "statistics", "last_updated"}
+#
+# The university document only keeps degree_summaries ({degree: {"modules_count": n}}).
+# Documents written before the split still embed degrees -> modules -> stats;
+# readers fall back to that, and the first write to the university (or
+# split_university_stats.py) moves it out.
+MODULE_STATS_TYPE = "module_stats"
+
+def module_stats_id(university_id: str, degree: str, module_key: str) -> str:
+    # Cosmos ids may not contain / \ ? #, and the parts may not contain the separator
+    return ":".join([MODULE_STATS_TYPE] + [quote(str(part), safe=" ") for part in (university_id, degree, module_key)])
+
+def _module_stats_doc(university_id: str, degree: str, module_key: str, **fields) -> dict:
+    doc = dict(fields)
+    doc.update({
+        "id": module_stats_id(university_id, degree, module_key),
+        "type": MODULE_STATS_TYPE,
+        "university": university_id,
+        "degree": degree,
+        "module_key": module_key
+    })
+    return doc
+
+def _legacy_module_stats(uni_doc: dict, degree: str = None) -> list:
+    """Module statistics embedded in a university document written before the split, as documents."""
+    docs = []
+    for degree_name, degree_data in uni_doc.get("degrees", {}).items():
+        if degree is not None and degree_name != degree:
+            continue
+        for module_key, module_data in degree_data.get("modules", {}).items():
+            fields = dict(module_data)
+            if "statistics" in module_data and "name" not in module_data:
+                # Review statistics were keyed by module id
+                fields["module_id"] = module_key
+            docs.append(_module_stats_doc(uni_doc["id"], degree_name, module_key, **fields))
+    return docs
+
+def get_module_stats_docs(uni_doc: dict, degree: str = None) -> list:
+    """Statistics documents of a university's modules, optionally for one degree."""
+    if "degrees" in uni_doc:
+        return _legacy_module_stats(uni_doc, degree)
+    query = "SELECT * FROM c WHERE c.type = @type AND c.university = @university"
+    parameters = [
+        {"name": "@type", "value": MODULE_STATS_TYPE},
+        {"name": "@university", "value": uni_doc["id"]}
+    ]
+    if degree is not None:
+        query += " AND c.degree = @degree"
+        parameters.append({"name": "@degree", "value": degree})
+    return list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+
+def find_module_stats(uni_doc: dict, degree: str, module_code: str = None, module_name: str = None):
+    """Statistics of one module of a degree, matched by code first and then by name."""
+    if "degrees" in uni_doc:
+        docs = _legacy_module_stats(uni_doc, degree)
+    else:
+        # Modules are keyed by code, or by name when they have none
+        for module_key in (module_code, module_name):
+            if not module_key:
+                continue
+            doc_id = module_stats_id(uni_doc["id"], degree, module_key)
+            try:
+                doc = _uni_container.read_item(item=doc_id, partition_key=doc_id)
+                return {key: value for key, value in doc.items() if key not in SYSTEM_PROPERTIES}
+            except CosmosResourceNotFoundError:
+                pass
+        docs = get_module_stats_docs(uni_doc, degree)
+
+    matches = [doc for doc in docs if module_code and module_code in (doc["module_key"], doc.get("code"))]
+    matches += [doc for doc in docs if module_name and doc.get("name") == module_name]
+    if not matches:
+        return None
+    return {key: value for key, value in matches[0].items() if key not in SYSTEM_PROPERTIES}
+
+def get_degree_summaries(uni_doc: dict) -> dict:
+    """{degree: {"modules_count": n}} for the degrees of a university that have module statistics."""
+    if "degrees" in uni_doc:
+        return {
+            degree: {"modules_count": len(degree_data["modules"])}
+            for degree, degree_data in uni_doc["degrees"].items()
+            if degree_data.get("modules")
+        }
+    return {
+        degree: summary
+        for degree, summary in uni_doc.get("degree_summaries", {}).items()
+        if summary.get("modules_count")
+    }
+
+def _count_degree_modules(university_id: str, degree: str) -> int:
+    query = "SELECT VALUE COUNT(1) FROM c WHERE c.type = @type AND c.university = @university AND c.degree = @degree"
+    parameters = [
+        {"name": "@type", "value": MODULE_STATS_TYPE},
+        {"name": "@university", "value": university_id},
+        {"name": "@degree", "value": degree}
+    ]
+    counts = list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+    return sum(counts)
+
+def _update_degree_summaries(university_id: str, modules_counts: dict, drop_embedded: bool = False):
+    def apply_counts(uni_doc):
+        if drop_embedded:
+            uni_doc.pop("degrees", None)
+        summaries = uni_doc.setdefault("degree_summaries", {})
+        for degree, count in modules_counts.items():
+            # Statistics documents are never deleted, so a lower count is a
+            # concurrent writer's older recount
+            current = summaries.get(degree, {}).get("modules_count", 0)
+            summaries[degree] = {"modules_count": max(current, count)}
+    uni_doc = optimistic_update(_uni_container, university_id, university_id, apply_counts)
+    # Called whenever module statistics documents were created
+    _university_catalog.invalidate()
+    _module_catalog.invalidate()
+    return uni_doc
+
+def split_university_document(uni_doc: dict) -> dict:
+    """
+    Move the module statistics embedded in a university document written before
+    the split into their own documents, leaving degree summaries behind.
+    Safe to repeat and to race: a statistics document that already exists was
+    written after an earlier split and is newer, so it is kept.
+    Returns the university document.
+    """
+    if "degrees" not in uni_doc:
+        return uni_doc
+
+    docs = {}
+    for doc in _legacy_module_stats(uni_doc):
+        if doc.get("module_id"):
+            # File review statistics under the module's code like its scores
+            module = find_document(doc["module_id"], "module") or {}
+            module_key = module.get("code") or module.get("name") or doc["module_key"]
+            default = _module_stats_doc(uni_doc["id"], doc["degree"], module_key, name=module.get("name", ""), code=module.get("code", ""))
+            target = docs.setdefault(default["id"], default)
+            target.update({key: doc[key] for key in ("module_id", "statistics", "last_updated") if key in doc})
+        else:
+            docs.setdefault(doc["id"], {}).update(doc)
+
+    for doc in docs.values():
+        try:
+            _uni_container.create_item(body=doc)
+        except CosmosResourceExistsError:
+            pass
+
+    degrees = {doc["degree"] for doc in docs.values()}
+    counts = {degree: _count_degree_modules(uni_doc["id"], degree) for degree in degrees}
+    return _update_degree_summaries(uni_doc["id"], counts, drop_embedded=True) or uni_doc
+
+def _fetch_module_stats_docs(since: int = None):
+    """Module statistics documents written at or after the _ts since (all of them when None)."""
+    query = "SELECT * FROM c WHERE c.type = @type"
+    parameters = [{"name": "@type", "value": MODULE_STATS_TYPE}]
+    if since is not None:
+        query += " AND c._ts >= @since"
+        parameters.append({"name": "@since", "value": since})
+    return list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+
+_module_catalog = UniversityCatalog(_fetch_module_stats_docs, on_refresh=_module_search_index.apply_module_stats)
+
+def search_modules(query: str = None, university: str = None, limit: int = 10) -> list:
+    """
+    Module statistics documents matching query by name or code, best first,
+    across every university or only the given one (see module_search.py).
+    """
+    # Bring both sources of the index up to date
+    _university_catalog.documents()
+    _module_catalog.documents()
+    return _module_search_index.search(query, university=university, limit=limit)
+
+def find_similar_module_stats(university_id: str, degree: str, name: str, code: str = None, exact: bool = False):
+    """
+    Statistics document of a near-duplicate of this module in the degree, or
+    None; with exact, only of a module with the same canonical name (see
+    module_search.py).
+    """
+    _university_catalog.documents()
+    _module_catalog.documents()
+    return _module_search_index.similar(university_id, degree, name, code, exact=exact)
+
+def resolve_module_stats(university_id: str, degree: str, name: str, code: str = None):
+    """
+    (id, document) of the statistics a module's scores are counted in: its
+    own document, else that of a module with the same canonical name
+    ("Programming 1" and "Programming I"), else its own id and None.
+    """
+    module_key = code or normalize_module_name(name)
+    stats_id = module_stats_id(university_id, degree, module_key)
+    try:
+        return stats_id, _uni_container.read_item(item=stats_id, partition_key=stats_id)
+    except CosmosResourceNotFoundError:
+        pass
+    same = find_similar_module_stats(university_id, degree, normalize_module_name(name), code, exact=True)
+    if same is None:
+        return stats_id, None
+    try:
+        return same["id"], _uni_container.read_item(item=same["id"], partition_key=same["id"])
+    except CosmosResourceNotFoundError:
+        return stats_id, None
+
 def get_modules_with_stats(university: str, degree: str):
     """Get modules with statistics for a specific university and degree"""
     try:
-        # Query for modules of this university and degree
         uni_doc = get_university_doc(university)
-        if not uni_doc or "degrees" not in uni_doc:
-            return []
-            
-        # Check if degree exists
-        if degree not in uni_doc["degrees"]:
-            return []
-            
-        # Get modules from the university document
-        degree_data = uni_doc["degrees"][degree]
-        if "modules" not in degree_data:
+        if not uni_doc:
             return []
             
         modules_data = []
-        for module_id, module in degree_data["modules"].items():
+        for module in get_module_stats_docs(uni_doc, degree):
             # Convert the grade distribution to a more frontend-friendly format
             grade_dist = []
             for range_key, count in module.get("grade_distribution", {}).items():
@@ -310,18 +904,24 @@ def get_modules_with_stats(university: str, degree: str):
         print(f"Error getting modules with stats: {str(e)}")
         return []
       
+_MODULE_REVIEWS_QUERY = "SELECT * FROM c WHERE c.type = 'module_review' AND c.module_id = @module_id"
+
 def get_module_reviews(module_id: str):
     """Get all reviews for a specific module"""
-    query = "SELECT * FROM c WHERE c.type = 'module_review' AND c.module_id = @module_id"
     parameters = [{"name": "@module_id", "value": module_id}]
     
     reviews = list(_container.query_items(
-        query=query,
+        query=_MODULE_REVIEWS_QUERY,
         parameters=parameters,
         enable_cross_partition_query=True
     ))
     return reviews
 
+def get_module_reviews_page(module_id: str, page_size: int, cursor: str = None):
+    """Return (reviews, next_cursor) for one page of a module's reviews"""
+    parameters = [{"name": "@module_id", "value": module_id}]
+    return _container.query_page(_MODULE_REVIEWS_QUERY, parameters, page_size, cursor, enable_cross_partition_query=True)
+
 def create_module_review(review_data: dict):
     """Create a new module review"""
     # Add metadata
@@ -333,47 +933,94 @@ def create_module_review(review_data: dict):
     # Create in database
     result = _container.create_item(body=review_data)
     
-    # Update module statistics
-    update_module_statistics(review_data["module_id"], review_data["university"], review_data["degree"])
+    # Count it in the module statistics
+    update_module_statistics(review_data["module_id"], review_data["university"], review_data["degree"], added=[review_data])
+    record_contribution(review_data["user_email"], reviews=1)
     
     return result
 
+_EDITABLE_REVIEW_FIELDS = ("difficulty_rating", "teaching_quality_rating", "recommended_rating", "comment", "grade_received", "anonymous")
+
+def update_module_review(review_id: str, user_email: str, updates: dict):
+    """Edit a module review (only by the creator); returns the updated review or None"""
+    review = read_document(review_id, user_email, "module_review")
+    if not review:
+        return None
+
+    changes = {key: value for key, value in updates.items() if key in _EDITABLE_REVIEW_FIELDS}
+    if not changes:
+        return review
+    changes["updated_at"] = datetime.utcnow().isoformat()
+    updated = patch_document(review_id, set_operations(changes), user_email, "module_review")
+    if not updated:
+        return None
+
+    # Swap the old ratings for the new ones
+    update_module_statistics(review["module_id"], review["university"], review["degree"], added=[updated], removed=[review])
+    return updated
+
 def delete_module_review(review_id: str, user_email: str):
     """Delete a module review (only by the creator)"""
-    query = "SELECT * FROM c WHERE c.id = @id AND c.user_email = @email AND c.type = 'module_review'"
-    parameters = [
-        {"name": "@id", "value": review_id},
-        {"name": "@email", "value": user_email}
-    ]
+    review = read_document(review_id, user_email, "module_review")
     
-    reviews = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-    
-    if not reviews:
+    if not review:
         return False
     
     # Get the module_id for updating statistics later
-    module_id = reviews[0].get("module_id")
-    university = reviews[0].get("university")
-    degree = reviews[0].get("degree")
+    module_id = review.get("module_id")
+    university = review.get("university")
+    degree = review.get("degree")
     
     # Delete the review
-    _container.delete_item(item=review_id, partition_key=review_id)
+    delete_document(review_id, user_email)
     
-    # Update module statistics
-    update_module_statistics(module_id, university, degree)
+    # Take it out of the module statistics
+    update_module_statistics(module_id, university, degree, removed=[review])
+    record_contribution(user_email, reviews=-1)
     
     return True
 
-def get_module_statistics(module_id: str, university: str, degree: str):
-    """Calculate statistics for a module"""
-    # Get all reviews for the module
-    reviews = get_module_reviews(module_id)
-    
-    if not reviews:
+# Review statistics are running totals in the module's statistics document,
+#
+#     "review_totals": {"count", "difficulty_sum", "teaching_quality_sum",
+#                       "recommended_sum", "grade_buckets": {grade range: n}}
+#
+# moved by each review created, edited or deleted, so a review write costs the
+# same however many reviews the module has. "statistics" (the averages served to
+# clients) is derived from them on every write. reconcile_review_statistics
+# recounts them from the reviews on a timer, correcting any that drifted.
+_REVIEW_RATING_SUMS = {
+    "difficulty_sum": "difficulty_rating",
+    "teaching_quality_sum": "teaching_quality_rating",
+    "recommended_sum": "recommended_rating"
+}
+
+def _empty_review_totals() -> dict:
+    return {"count": 0, **{key: 0 for key in _REVIEW_RATING_SUMS}, "grade_buckets": {}}
+
+def _add_review(totals: dict, review: dict, sign: int = 1) -> dict:
+    """Add a review to running totals in place (sign=-1 takes it out)."""
+    totals["count"] += sign
+    for key, field in _REVIEW_RATING_SUMS.items():
+        totals[key] += sign * (review.get(field) or 0)
+    if review.get("grade_received"):
+        grade_range = get_grade_range(review["grade_received"])
+        count = totals["grade_buckets"].get(grade_range, 0) + sign
+        if count > 0:
+            totals["grade_buckets"][grade_range] = count
+        else:
+            totals["grade_buckets"].pop(grade_range, None)
+    return totals
+
+def _review_totals(reviews) -> dict:
+    totals = _empty_review_totals()
+    for review in reviews:
+        _add_review(totals, review)
+    return totals
+
+def _statistics_from_totals(totals: dict) -> dict:
+    count = totals.get("count", 0)
+    if count <= 0:
         return {
             "difficulty_avg": 0,
             "teaching_quality_avg": 0,
@@ -381,153 +1028,251 @@ def get_module_statistics(module_id: str, university: str, degree: str):
             "total_reviews": 0,
             "grade_distribution": {}
         }
-    
-    # Calculate average ratings
-    total_difficulty = sum(r.get("difficulty_rating", 0) for r in reviews)
-    total_teaching = sum(r.get("teaching_quality_rating", 0) for r in reviews)
-    total_recommended = sum(r.get("recommended_rating", 0) for r in reviews)
-    
-    difficulty_avg = round(total_difficulty / len(reviews), 1) if reviews else 0
-    teaching_avg = round(total_teaching / len(reviews), 1) if reviews else 0
-    recommended_avg = round(total_recommended / len(reviews), 1) if reviews else 0
-    
-    # Calculate grade distribution
-    grade_distribution = {}
-    for review in reviews:
-        if "grade_received" in review and review["grade_received"]:
-            grade_range = get_grade_range(review["grade_received"])
-            if grade_range not in grade_distribution:
-                grade_distribution[grade_range] = 0
-            grade_distribution[grade_range] += 1
-    
     return {
-        "difficulty_avg": difficulty_avg,
-        "teaching_quality_avg": teaching_avg,
-        "recommended_avg": recommended_avg,
-        "total_reviews": len(reviews),
-        "grade_distribution": grade_distribution
+        "difficulty_avg": round(totals["difficulty_sum"] / count, 1),
+        "teaching_quality_avg": round(totals["teaching_quality_sum"] / count, 1),
+        "recommended_avg": round(totals["recommended_sum"] / count, 1),
+        "total_reviews": count,
+        "grade_distribution": dict(totals["grade_buckets"])
     }
 
-def update_module_statistics(module_id: str, university: str, degree: str):
-    """Update module statistics in the university document"""
+def _review_stats(university_id: str, degree: str, module: dict, module_id: str) -> tuple:
+    """
+    (id, document or None, module key) of the statistics a module's reviews are
+    counted in: the same document as its scores (see resolve_module_stats).
+    """
+    # Reviews reference the module document; its statistics are keyed by code
+    if module.get("code") or module.get("name"):
+        module_key = module.get("code") or normalize_module_name(module["name"])
+        return (*resolve_module_stats(university_id, degree, module.get("name", ""), module.get("code")), module_key)
+    stats_id = module_stats_id(university_id, degree, module_id)
     try:
-        # Get statistics for this module
-        stats = get_module_statistics(module_id, university, degree)
-        
-        # Now find the module in the university document
-        # First, get the university document
-        query = "SELECT * FROM c WHERE c.name = @university"
-        parameters = [{"name": "@university", "value": university}]
-        
-        universities = list(_uni_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        if not universities:
+        return stats_id, _uni_container.read_item(item=stats_id, partition_key=stats_id), module_id
+    except CosmosResourceNotFoundError:
+        return stats_id, None, module_id
+
+def get_module_statistics(module_id: str, university: str, degree: str):
+    """Review statistics of a module, read from its running totals"""
+    university_doc = _find_university_doc(university)
+    if university_doc and "degrees" not in university_doc:
+        module = find_document(module_id, "module") or {}
+        _, module_stats, _ = _review_stats(university_doc["id"], degree, module, module_id)
+        if module_stats is None:
+            # Every reviewed module has a statistics document
+            return _statistics_from_totals({})
+        if "review_totals" in module_stats:
+            return _statistics_from_totals(module_stats["review_totals"])
+
+    # Not counted incrementally yet
+    return _statistics_from_totals(_review_totals(get_module_reviews(module_id)))
+
+def _apply_review_totals(module_id: str, change, created: list = None):
+    """
+    optimistic_update mutation setting a statistics document's review totals to
+    change(current totals, statistics document), which returns None to leave it.
+    """
+    def apply_statistics(module_stats):
+        if created is not None:
+            created[0] = "_etag" not in module_stats
+        totals = change(module_stats.get("review_totals"), module_stats)
+        if totals is None:
             return False
-            
-        university_doc = universities[0]
-        
-        # Look for the degree and modules structure
-        if "degrees" not in university_doc:
-            university_doc["degrees"] = {}
-            
-        if degree not in university_doc["degrees"]:
-            university_doc["degrees"][degree] = {"modules": {}}
-            
-        if "modules" not in university_doc["degrees"][degree]:
-            university_doc["degrees"][degree]["modules"] = {}
-            
-        # Update module statistics
-        university_doc["degrees"][degree]["modules"][module_id] = {
-            "statistics": stats,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        # Save changes
-        _uni_container.upsert_item(university_doc)
+        module_stats["module_id"] = module_id
+        module_stats["review_totals"] = totals
+        module_stats["statistics"] = _statistics_from_totals(totals)
+        module_stats["last_updated"] = datetime.utcnow().isoformat()
+    return apply_statistics
+
+def update_module_statistics(module_id: str, university: str, degree: str, added=(), removed=(), change=None):
+    """
+    Move the review totals of a module by the reviews added and removed, in its
+    statistics document. Totals written before they were kept incrementally are
+    recounted once from the reviews, which already include this change.
+    change(current totals, statistics document) replaces the delta when given.
+    """
+    try:
+        university_doc = _find_university_doc(university)
+        if not university_doc:
+            return False
+        university_doc = split_university_document(university_doc)
+
+        module = find_document(module_id, "module") or {}
+        stats_id, module_stats, module_key = _review_stats(university_doc["id"], degree, module, module_id)
+        created = [False]
+
+        def apply_delta(totals, module_stats):
+            if totals is None:
+                if "_etag" in module_stats:
+                    return _review_totals(get_module_reviews(module_id))
+                totals = _empty_review_totals()
+            for review in added:
+                _add_review(totals, review)
+            for review in removed:
+                _add_review(totals, review, -1)
+            return totals
+
+        optimistic_update(
+            _uni_container,
+            stats_id,
+            stats_id,
+            _apply_review_totals(module_id, change or apply_delta, created),
+            create=lambda: _module_stats_doc(
+                university_doc["id"], degree, module_key,
+                name=module.get("name", ""), code=module.get("code", "")
+            ),
+            current=module_stats
+        )
+        if created[0]:
+            _update_degree_summaries(university_doc["id"], {degree: _count_degree_modules(university_doc["id"], degree)})
         
         return True
     except Exception as e:
         print(f"Error updating module statistics: {str(e)}")
         return False
 
+_REVIEW_TOTALS_QUERY = (
+    "SELECT c.module_id, c.university, c.degree, c.difficulty_rating, c.teaching_quality_rating, "
+    "c.recommended_rating, c.grade_received FROM c WHERE c.type = 'module_review'"
+)
+
+def reconcile_review_statistics() -> int:
+    """
+    Recount the review totals of every module from its reviews and correct the
+    statistics documents that drifted (a statistics write that failed after
+    its review was saved, or two first reviews of a module racing). A document
+    written since the recount started is left for the next run, since its
+    totals may include reviews the recount missed.
+    Returns the number of modules corrected.
+    """
+    started = int(time.time())
+    recounts = {}
+    scopes = {}
+    for review in _container.query_items(query=_REVIEW_TOTALS_QUERY, enable_cross_partition_query=True):
+        module_id = review.get("module_id")
+        if not module_id:
+            continue
+        _add_review(recounts.setdefault(module_id, _empty_review_totals()), review)
+        scopes.setdefault(module_id, (review.get("university"), review.get("degree")))
+
+    written = []
+
+    def set_recount(totals):
+        def change(current, module_stats):
+            if current == totals or module_stats.get("_ts", 0) >= started:
+                return None
+            written.append(module_stats["id"])
+            return totals
+        return change
+
+    query = "SELECT c.id, c.module_id, c.review_totals FROM c WHERE c.type = @type AND IS_DEFINED(c.module_id)"
+    parameters = [{"name": "@type", "value": MODULE_STATS_TYPE}]
+    for module_stats in list(_uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True)):
+        totals = recounts.pop(module_stats["module_id"], None) or _empty_review_totals()
+        if module_stats.get("review_totals") == totals:
+            continue
+        try:
+            optimistic_update(_uni_container, module_stats["id"], module_stats["id"],
+                              _apply_review_totals(module_stats["module_id"], set_recount(totals)))
+        except Exception as e:
+            print(f"Error reconciling review statistics of {module_stats['id']}: {str(e)}")
+
+    # Reviewed modules whose statistics document was never written
+    for module_id, totals in recounts.items():
+        university, degree = scopes[module_id]
+        update_module_statistics(module_id, university, degree, change=set_recount(totals))
+    return len(set(written))
+
 def get_university_modules_with_stats(university: str, degree: str = None):
     """Get all modules for a university with their statistics"""
-    # Query for the university
-    query = "SELECT * FROM c WHERE c.name = @university"
-    parameters = [{"name": "@university", "value": university}]
+    university_doc = _find_university_doc(university)
+    if not university_doc:
+        return []
     
-    universities = list(_uni_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
+    # Only modules that have been reviewed carry a module document to describe them
+    stats_docs = [doc for doc in get_module_stats_docs(university_doc, degree) if doc.get("module_id")]
+    modules = get_modules_by_ids_public(doc["module_id"] for doc in stats_docs)
     
-    if not universities:
+    modules_with_stats = []
+    for stats_doc in stats_docs:
+        module_info = modules.get(stats_doc["module_id"])
+        if module_info:
+            # Make a copy to avoid modifying the original
+            module_dict = dict(module_info)
+            if not degree:
+                # Add degree info when listing every degree
+                module_dict["degree"] = stats_doc["degree"]
+            module_dict["statistics"] = stats_doc.get("statistics", {})
+            modules_with_stats.append(module_dict)
+    
+    return modules_with_stats
+
+def get_degree_modules_with_stats(university: str, degree: str):
+    """Every module of a degree with its review statistics and score summary"""
+    university_doc = _find_university_doc(university)
+    if not university_doc:
         return []
-        
-    university_doc = universities[0]
     
-    # Get the modules from the university document
-    modules_with_stats = []
+    stats_docs = get_module_stats_docs(university_doc, degree)
+    modules = get_modules_by_ids_public(doc.get("module_id") for doc in stats_docs)
     
-    if "degrees" in university_doc:
-        if degree:
-            # Only get modules for the specified degree
-            if degree in university_doc["degrees"]:
-                degree_data = university_doc["degrees"][degree]
-                if "modules" in degree_data:
-                    for module_id, module_data in degree_data["modules"].items():
-                        # Get the base module data
-                        module_info = get_module_by_id_public(module_id)
-                        if module_info:
-                            # Make a copy to avoid modifying the original
-                            module_dict = dict(module_info)
-                            # Add statistics
-                            module_dict["statistics"] = module_data.get("statistics", {})
-                            modules_with_stats.append(module_dict)
-        else:
-            # Get modules for all degrees
-            for degree_name, degree_data in university_doc["degrees"].items():
-                if "modules" in degree_data:
-                    for module_id, module_data in degree_data["modules"].items():
-                        # Get the base module data
-                        module_info = get_module_by_id_public(module_id)
-                        if module_info:
-                            # Make a copy to avoid modifying the original
-                            module_dict = dict(module_info)
-                            # Add degree info and statistics
-                            module_dict["degree"] = degree_name
-                            module_dict["statistics"] = module_data.get("statistics", {})
-                            modules_with_stats.append(module_dict)
+    modules_with_stats = []
+    for stats_doc in stats_docs:
+        # Modules that only have scores are described by their statistics
+        module_dict = dict(modules.get(stats_doc.get("module_id")) or {
+            "name": stats_doc.get("name", ""),
+            "code": stats_doc.get("code", ""),
+            "university": university,
+            "degree": degree
+        })
+        module_dict["statistics"] = stats_doc.get("statistics", {})
+        module_dict["average_score"] = stats_doc.get("average_score", 0)
+        module_dict["student_count"] = stats_doc.get("student_counter", 0)
+        modules_with_stats.append(module_dict)
     
     return modules_with_stats
 
+# Fields of a module document shown to everyone
+_PUBLIC_MODULE_FIELDS = ["id", "name", "code", "credits", "year", "semester", "university", "degree", "description"]
+# Ids per batched lookup query
+MODULE_LOOKUP_BATCH = 100
+
+def _public_module(module: dict) -> dict:
+    return {field: module[field] for field in _PUBLIC_MODULE_FIELDS if field in module}
+
 def get_module_by_id_public(module_id: str):
     """Get a module by ID for public consumption (without user-specific data)"""
-    query = "SELECT c.id, c.name, c.code, c.credits, c.year, c.semester, c.university, c.degree, c.description FROM c WHERE c.id = @id AND c.type = 'module'"
-    parameters = [{"name": "@id", "value": module_id}]
-    
-    modules = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
+    module = find_document(module_id, "module")
+    if not module:
+        return None
     
-    # Return as a dictionary, not a module object
-    return dict(modules[0]) if modules else None
+    # Return only the public fields as a dictionary, not a module object
+    return _public_module(module)
+
+def get_modules_by_ids_public(module_ids) -> dict:
+    """
+    {module id: public module} for many modules, fetched with one
+    c.id IN (...) query per MODULE_LOOKUP_BATCH ids instead of a lookup each.
+    Missing ids are left out.
+    """
+    module_ids = list(dict.fromkeys(module_id for module_id in module_ids if module_id))
+    modules = {}
+    for start in range(0, len(module_ids), MODULE_LOOKUP_BATCH):
+        batch = module_ids[start:start + MODULE_LOOKUP_BATCH]
+        names = [f"@id{i}" for i in range(len(batch))]
+        query = f"SELECT * FROM c WHERE c.type = 'module' AND c.id IN ({', '.join(names)})"
+        parameters = [{"name": name, "value": module_id} for name, module_id in zip(names, batch)]
+        for module in _container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+            modules[module["id"]] = _public_module(module)
+    return modules
 
 def update_university_module_data(module_data):
     """
-    Update module statistics in university analytics container
+    Update a module's statistics document in the university analytics container
     module_data should contain: university, degree, name, code, score
     """
     university_name = module_data.get("university")
     degree_name = module_data.get("degree")
-    module_name = module_data.get("name")
+    module_name = normalize_module_name(module_data.get("name"))
     module_code = module_data.get("code", "")
     score = module_data.get("score", 0)
     
@@ -535,72 +1280,39 @@ def update_university_module_data(module_data):
         print(f"Missing required fields for analytics update: university={university_name}, degree={degree_name}, name={module_name}")
         return False
     
-    try:
-        # Get the university document
-        query = "SELECT * FROM c WHERE c.name = @name"
-        parameters = [{"name": "@name", "value": university_name}]
-        
-        items = list(_uni_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        if items:
-            uni_doc = items[0]
-        else:
-            # Create a new university document
-            uni_doc = {
-                "id": university_name,  # Use name as ID
-                "name": university_name,
-                "counter": 0,
-                "majors": []
-            }
-        
-        # Ensure degrees structure exists
-        if "degrees" not in uni_doc:
-            uni_doc["degrees"] = {}
-        
-        # Ensure this degree exists
-        if degree_name not in uni_doc["degrees"]:
-            uni_doc["degrees"][degree_name] = {"modules": {}}
-        
-        # Ensure modules structure exists
-        if "modules" not in uni_doc["degrees"][degree_name]:
-            uni_doc["degrees"][degree_name]["modules"] = {}
-        
-        # Get grade range for distribution
-        grade_range = get_grade_range(score)
-        
-        # Check if module exists (prioritize code if available)
-        module_key = module_code if module_code else module_name
-        
-        if module_key in uni_doc["degrees"][degree_name]["modules"]:
-            # Update existing module
-            module_stats = uni_doc["degrees"][degree_name]["modules"][module_key]
-            
+    # Get grade range for distribution
+    grade_range = get_grade_range(score)
+    module_key = module_code if module_code else module_name
+
+    created = [False]
+
+    def apply_score(module_stats):
+        created[0] = "_etag" not in module_stats
+
+        # Check if the module already has scores (a review may have created it)
+        if "student_counter" in module_stats:
             # Calculate new average
             old_avg = module_stats.get("average_score", 0)
             old_count = module_stats.get("student_counter", 0)
-            
+        
             # Check if we're updating an existing score
             is_update = module_data.get("is_update", False)
             old_score = module_data.get("old_score", 0)
-            
+        
             if is_update and old_count > 0:
                 # Get old grade range
                 old_grade_range = get_grade_range(old_score)
-                
+            
                 # Adjust the grade distribution
                 if "grade_distribution" in module_stats:
                     if old_grade_range in module_stats["grade_distribution"]:
                         module_stats["grade_distribution"][old_grade_range] -= 1
-                    
+                
                     if grade_range not in module_stats["grade_distribution"]:
                         module_stats["grade_distribution"][grade_range] = 0
-                    
-                    module_stats["grade_distribution"][grade_range] += 1
                 
+                    module_stats["grade_distribution"][grade_range] += 1
+            
                 # Recalculate average
                 total = old_avg * old_count
                 total = total - old_score + score
@@ -611,31 +1323,56 @@ def update_university_module_data(module_data):
                 new_avg = ((old_avg * old_count) + score) / new_count
                 module_stats["average_score"] = round(new_avg, 1)
                 module_stats["student_counter"] = new_count
-                
+            
                 # Update grade distribution
                 if "grade_distribution" not in module_stats:
                     module_stats["grade_distribution"] = {}
-                
+            
                 if grade_range not in module_stats["grade_distribution"]:
                     module_stats["grade_distribution"][grade_range] = 0
-                
+            
                 module_stats["grade_distribution"][grade_range] += 1
+
+            sketch = module_stats.get("score_sketch")
+            if sketch is not None:
+                if is_update and old_count > 0:
+                    score_sketch.add(sketch, old_score, -1)
+                score_sketch.add(sketch, score)
+                if sketch["count"] == module_stats["student_counter"]:
+                    # The sketch holds every score: exact average, buckets from its bins
+                    module_stats["average_score"] = round(score_sketch.mean(sketch), 1)
+                    module_stats["grade_distribution"] = score_sketch.grade_distribution(sketch, get_grade_range)
         else:
-            # Create new module statistics entry
-            module_stats = {
-                "name": module_name,
-                "code": module_code,
+            # First score for this module
+            module_stats.update({
+                "name": module_stats.get("name") or module_name,
+                "code": module_stats.get("code") or module_code,
                 "average_score": score,
                 "student_counter": 1,
                 "grade_distribution": {
                     grade_range: 1
-                }
-            }
-            
-            uni_doc["degrees"][degree_name]["modules"][module_key] = module_stats
-        
-        # Update the university document
-        _uni_container.upsert_item(uni_doc)
+                },
+                "score_sketch": score_sketch.add(score_sketch.empty(), score)
+            })
+
+    try:
+        uni_doc = _ensure_university_doc(university_name)
+        uni_doc = split_university_document(uni_doc)
+
+        stats_id, current = resolve_module_stats(uni_doc["id"], degree_name, module_name, module_code)
+
+        # Only this module's statistics document is rewritten; concurrent scores
+        # for it are applied under its ETag and re-applied if we lose
+        optimistic_update(
+            _uni_container,
+            stats_id,
+            stats_id,
+            apply_score,
+            create=lambda: _module_stats_doc(uni_doc["id"], degree_name, module_key),
+            current=current
+        )
+        if created[0]:
+            _update_degree_summaries(uni_doc["id"], {degree_name: _count_degree_modules(uni_doc["id"], degree_name)})
         return True
     except Exception as e:
         print(f"Error updating module statistics: {str(e)}")
@@ -659,6 +1396,78 @@ def get_grade_range(score):
     return ranges[index]
 
 
+def module_score_sketch(module_stats: dict):
+    """
+    The score sketch of a module statistics document, or None unless it holds
+    every score of the module (modules scored before sketches were kept have
+    none until rebuild_score_sketches.py runs).
+    """
+    sketch = module_stats.get("score_sketch")
+    if not sketch or sketch.get("count") != module_stats.get("student_counter", 0):
+        return None
+    return sketch
+
+def module_score_summary(module_stats: dict) -> dict:
+    """Median and percentiles of a module's scores (None/empty without a complete sketch)."""
+    sketch = module_score_sketch(module_stats)
+    if sketch is None:
+        return {"median": None, "percentiles": {}}
+    return score_sketch.summary(sketch)
+
+def merged_score_summary(stats_docs) -> dict:
+    """
+    Median and percentiles of every score in the given modules, from their
+    merged sketches (None/empty unless each scored module has a complete sketch).
+    """
+    sketches = [module_score_sketch(doc) for doc in stats_docs if doc.get("student_counter", 0) > 0]
+    if not sketches or None in sketches:
+        return {"median": None, "percentiles": {}}
+    return score_sketch.summary(score_sketch.merge(sketches))
+
+
+COHORT_MIN_SIZE = int(os.environ.get("COHORT_MIN_SIZE", "5"))
+
+def get_module_cohort(module: dict):
+    """
+    Where a student's module score sits among the scores recorded for the same
+    module at their university and degree, as {"percentile": share of the
+    cohort scoring below it, "cohort_size": n}: the module's statistics
+    document, found as the score was counted (resolve_module_stats), ranked in
+    memory against its score sketch.
+    None without a score, a complete sketch, or a cohort of COHORT_MIN_SIZE
+    (smaller cohorts would give away classmates' scores).
+    """
+    return get_module_cohorts([module])[0]
+
+def get_module_cohorts(modules: list) -> list:
+    """get_module_cohort of each module, reading each university document once for the listing"""
+    universities = {}
+    cohorts = []
+    for module in modules:
+        university = module.get("university")
+        if module.get("score") is None or not university or not module.get("degree"):
+            cohorts.append(None)
+            continue
+        if university not in universities:
+            universities[university] = _find_university_doc(university)
+        cohorts.append(_module_cohort(module, universities[university]))
+    return cohorts
+
+def _module_cohort(module: dict, uni_doc: dict):
+    if uni_doc is None:
+        return None
+    _, module_stats = resolve_module_stats(uni_doc["id"], module["degree"], module.get("name"), module.get("code"))
+    if module_stats is None:
+        return None
+    sketch = module_score_sketch(module_stats)
+    if sketch is None or sketch["count"] < COHORT_MIN_SIZE:
+        return None
+    return {
+        "percentile": score_sketch.percentile_rank(sketch, module["score"]),
+        "cohort_size": sketch["count"]
+    }
+
+
 def get_module_analytics(university, degree, module_code=None, module_name=None):
     """Get analytics for a specific module"""
     try:
@@ -668,93 +1477,30 @@ def get_module_analytics(university, degree, module_code=None, module_name=None)
         if not uni_doc:
             return None
             
-        # Check if degree exists
-        if "degrees" not in uni_doc or degree not in uni_doc["degrees"]:
-            return None
-            
-        # Check if modules structure exists
-        if "modules" not in uni_doc["degrees"][degree]:
-            return None
-            
-        modules = uni_doc["degrees"][degree]["modules"]
-        
         # Find the module by code or name
-        if module_code and module_code in modules:
-            return modules[module_code]
-        
-        if module_name:
-            for key, module_data in modules.items():
-                if module_data.get("name") == module_name:
-                    return module_data
-        
-        return None
+        return find_module_stats(uni_doc, degree, module_code, module_name)
     except Exception as e:
         print(f"Error getting module analytics: {str(e)}")
         return None
 
 def search_modules_for_university(university, query=None, limit=10):
-    """Search for modules at a specific university by name or code"""
+    """Search for modules at a specific university (every university when None) by name or code"""
     try:
-        # Get the university document
-        from database import get_university_doc
-        uni_doc = get_university_doc(university)
-        
-        if not uni_doc or "degrees" not in uni_doc:
-            print(f"University not found or has no degrees: {university}")
-            return []
-        
-        print(f"University found: {university}")
-        print(f"Number of degrees: {len(uni_doc.get('degrees', {}))} degrees")
-        
         results = []
-        query_lower = query.lower() if query else None
-        
-        # Search through each degree
-        for degree_name, degree_data in uni_doc.get("degrees", {}).items():
-            print(f"Checking degree: {degree_name}")
-            
-            if "modules" not in degree_data:
-                print(f"No modules found in degree: {degree_name}")
-                continue
-                
-            modules = degree_data.get("modules", {})
-            print(f"Found {len(modules)} modules in this degree")
-            
-            # Search through each module in this degree
-            for module_code, module_data in modules.items():
-                module_name = module_data.get("name", "")
-                print(f"Checking module: {module_name} ({module_code})")
-                
-                # Skip if there's a query and it doesn't match name or code
-                if query_lower:
-                    name_match = query_lower in module_name.lower()
-                    code_match = module_data.get("code", "") and query_lower in module_data.get("code", "").lower()
-                    
-                    if not (name_match or code_match):
-                        continue
-                
-                # Create module info with proper fields
-                module_info = {
-                    "id": module_code,  # Use module_code as ID
-                    "name": module_name,
-                    "code": module_data.get("code", ""),
-                    "credits": 15,  # Default credits value
-                    "year": module_data.get("year", "Year 1"),  # Default to Year 1
-                    "semester": module_data.get("semester", 1),  # Default to semester 1
-                    "university": university,
-                    "degree": degree_name,
-                    "description": "",  # No description in your data structure
-                    "average_score": module_data.get("average_score", 0)
-                }
-                
-                results.append(module_info)
-                print(f"Added module to results: {module_name}")
-                
-                if len(results) >= limit:
-                    print(f"Reached limit of {limit} results")
-                    return results
-        
-        print(f"Returning {len(results)} results")
+        for module_data in search_modules(query, university=university, limit=limit):
+            # Create module info with proper fields
+            results.append({
+                "id": module_data["module_key"],  # Use module_code as ID
+                "name": module_data.get("name", ""),
+                "code": module_data.get("code", ""),
+                "credits": 15,  # Default credits value
+                "year": module_data.get("year", "Year 1"),  # Default to Year 1
+                "semester": module_data.get("semester", 1),  # Default to semester 1
+                "university": module_data["university"],
+                "degree": module_data["degree"],
+                "description": "",  # No description in your data structure
+                "average_score": module_data.get("average_score", 0)
+            })
         return results
     except Exception as e:
         import traceback
@@ -762,30 +1508,194 @@ def search_modules_for_university(university, query=None, limit=10):
         print(traceback.format_exc())
         return []
     
-def check_similar_module_exists(university, degree, name, code):
-    """Check if a similar module already exists in the university's data"""
+def check_similar_module_exists(university, degree, name, code, exact=True):
+    """
+    Check if the same module already exists in the university's data: by code
+    if provided, then by name, then by canonical name. Without exact, a module
+    with a merely similar name is returned too, for warnings.
+    """
     try:
         uni_doc = get_university_doc(university)
         
-        if not uni_doc or "degrees" not in uni_doc or degree not in uni_doc["degrees"]:
+        if not uni_doc:
             return None
             
-        modules = uni_doc["degrees"][degree].get("modules", {})
-        
-        # First check by code if provided
-        if code and code in modules:
-            return modules[code]
-            
-        # Then check by name
-        for module_key, module_data in modules.items():
-            if module_data.get("name") == name:
-                return module_data
-                
-        return None
+        existing = find_module_stats(uni_doc, degree, code, name)
+        if existing is None and name:
+            existing = find_similar_module_stats(uni_doc["id"], degree, name, code, exact=exact)
+        if existing is None:
+            return None
+        return {key: value for key, value in existing.items() if key not in SYSTEM_PROPERTIES}
     except Exception as e:
         print(f"Error checking for similar module: {str(e)}")
         return None
 
 def normalize_module_name(name):
-    """Normalize module name for better matching"""
-    return name.strip() if name else ""
\ No newline at end of file
+    """Normalize module name for storage and display: trimmed, single-spaced"""
+    return " ".join(name.split()) if name else ""
+
+# Leaderboards on public pages are kept up to date as data changes, so serving
+# them never scans the dataset:
+#
+#   - top universities by students: a sorted snapshot derived once per version
+#     of the university catalog, which catches up with counter compaction
+#   - top GradeRadar contributors: user documents count their reviews and
+#     created modules (graderadar_contributions), and one leaderboard document
+#     in the universities container keeps the CONTRIBUTOR_LEADERBOARD_SIZE best
+#     scores. It is only rewritten when a contribution puts a user on it or
+#     moves them on it, and rebuilt daily by rebuild_contributor_leaderboard
+TOP_UNIVERSITIES_MAX = int(os.environ.get("TOP_UNIVERSITIES_MAX", "100"))
+CONTRIBUTOR_LEADERBOARD_SIZE = int(os.environ.get("CONTRIBUTOR_LEADERBOARD_SIZE", "50"))
+CONTRIBUTOR_LEADERBOARD_ID = "leaderboard:contributors"
+REVIEW_POINTS = 5
+MODULE_POINTS = 10
+
+def _build_top_universities(universities: list) -> list:
+    entries = []
+    for uni in universities:
+        degrees = get_degree_summaries(uni)
+        if degrees:  # Only include universities with degree data
+            entries.append({
+                "name": uni.get("name", ""),
+                "students_count": uni.get("counter", 0),
+                "degrees_count": len(degrees)
+            })
+    entries.sort(key=lambda entry: entry["students_count"], reverse=True)
+    return entries[:TOP_UNIVERSITIES_MAX]
+
+def get_top_universities(limit: int = 10) -> list:
+    """Universities with module statistics, most students first (at most TOP_UNIVERSITIES_MAX)"""
+    return _university_catalog.derive("top_universities", _build_top_universities)[:max(limit, 0)]
+
+def contribution_score(contributions: dict) -> int:
+    """Reviews are worth 5 points, created modules 10"""
+    return contributions.get("reviews", 0) * REVIEW_POINTS + contributions.get("modules", 0) * MODULE_POINTS
+
+def _count_contributions(user_email: str) -> dict:
+    parameters = [{"name": "@email", "value": user_email}]
+    reviews = _container.query_items(
+        query="SELECT VALUE COUNT(1) FROM c WHERE c.type = 'module_review' AND c.user_email = @email",
+        parameters=parameters,
+        partition_key=user_email
+    )
+    modules = _container.query_items(
+        query="SELECT VALUE COUNT(1) FROM c WHERE c.type = 'module' AND c.created_by = @email",
+        parameters=parameters,
+        enable_cross_partition_query=True
+    )
+    return {"reviews": sum(reviews), "modules": sum(modules)}
+
+def get_contributions(user_email: str) -> dict:
+    """
+    {"reviews": n, "modules": n} a user has contributed to GradeRadar, from
+    their user document. Users who contributed before it was kept are counted
+    once and the counts stored.
+    """
+    user_doc = get_user_by_email(user_email) or {}
+    if "graderadar_contributions" in user_doc:
+        return user_doc["graderadar_contributions"]
+    contributions = _count_contributions(user_email)
+    patch_document(
+        user_email,
+        set_operations({"graderadar_contributions": contributions}),
+        condition="NOT IS_DEFINED(c.graderadar_contributions)"
+    )
+    return contributions
+
+def record_contribution(user_email: str, reviews: int = 0, modules: int = 0):
+    """Count reviews and modules a user added (negative when removed) and update the contributor leaderboard"""
+    try:
+        operations = [
+            {"op": "incr", "path": patch_path("graderadar_contributions", name), "value": delta}
+            for name, delta in (("reviews", reviews), ("modules", modules)) if delta
+        ]
+        user_doc = patch_document(user_email, operations, condition="IS_DEFINED(c.graderadar_contributions)")
+        if user_doc is None:
+            # Not counted yet; the count includes this contribution
+            contributions = get_contributions(user_email)
+            user_doc = get_user_by_email(user_email) or {}
+        else:
+            contributions = user_doc["graderadar_contributions"]
+        _update_contributor_leaderboard(user_email, user_doc, contribution_score(contributions))
+    except Exception as e:
+        print(f"Error recording contribution: {str(e)}")
+
+def _leaderboard_entry(user_email: str, user_doc: dict, score: int) -> dict:
+    return {
+        "user": user_email,
+        "display_name": user_doc.get("graderadar_display_name", user_doc.get("firstName", "")),
+        "university": user_doc.get("university", ""),
+        "score": score
+    }
+
+def _update_contributor_leaderboard(user_email: str, user_doc: dict, score: int):
+    try:
+        board = _uni_container.read_item(item=CONTRIBUTOR_LEADERBOARD_ID, partition_key=CONTRIBUTOR_LEADERBOARD_ID)
+    except CosmosResourceNotFoundError:
+        board = None
+
+    entries = board.get("entries", []) if board else []
+    on_board = any(entry["user"] == user_email for entry in entries)
+    if not on_board and len(entries) >= CONTRIBUTOR_LEADERBOARD_SIZE and score <= entries[-1]["score"]:
+        # Most contributions don't reach the board and cost no write
+        return
+
+    def apply_score(doc):
+        entries = [entry for entry in doc.get("entries", []) if entry["user"] != user_email]
+        if score > 0:
+            entries.append(_leaderboard_entry(user_email, user_doc, score))
+        entries.sort(key=lambda entry: entry["score"], reverse=True)
+        doc["entries"] = entries[:CONTRIBUTOR_LEADERBOARD_SIZE]
+        doc["updated_at"] = datetime.utcnow().isoformat()
+
+    optimistic_update(
+        _uni_container,
+        CONTRIBUTOR_LEADERBOARD_ID,
+        CONTRIBUTOR_LEADERBOARD_ID,
+        apply_score,
+        create=lambda: {"id": CONTRIBUTOR_LEADERBOARD_ID, "type": "leaderboard", "entries": []},
+        current=board
+    )
+
+def get_top_contributors(limit: int = 10) -> list:
+    """The GradeRadar contributors with the highest scores, without their emails"""
+    try:
+        board = _uni_container.read_item(item=CONTRIBUTOR_LEADERBOARD_ID, partition_key=CONTRIBUTOR_LEADERBOARD_ID)
+    except CosmosResourceNotFoundError:
+        return []
+    return [
+        {key: value for key, value in entry.items() if key != "user"}
+        for entry in board.get("entries", [])[:max(limit, 0)]
+    ]
+
+def rebuild_contributor_leaderboard() -> int:
+    """
+    Recount every user's contributions and rewrite the leaderboard, for users
+    who contributed before it was kept and entries left behind by failed
+    updates. Returns the number of entries.
+    """
+    scores = collections.Counter()
+    reviews = "SELECT VALUE c.user_email FROM c WHERE c.type = 'module_review'"
+    for user_email in _container.query_items(query=reviews, enable_cross_partition_query=True):
+        scores[user_email] += REVIEW_POINTS
+    modules = "SELECT VALUE c.created_by FROM c WHERE c.type = 'module' AND IS_DEFINED(c.created_by)"
+    for user_email in _container.query_items(query=modules, enable_cross_partition_query=True):
+        scores[user_email] += MODULE_POINTS
+
+    entries = []
+    for user_email, score in scores.most_common(CONTRIBUTOR_LEADERBOARD_SIZE):
+        if user_email and score > 0:
+            entries.append(_leaderboard_entry(user_email, get_user_by_email(user_email) or {}, score))
+
+    def replace_entries(doc):
+        doc["entries"] = entries
+        doc["updated_at"] = datetime.utcnow().isoformat()
+
+    optimistic_update(
+        _uni_container,
+        CONTRIBUTOR_LEADERBOARD_ID,
+        CONTRIBUTOR_LEADERBOARD_ID,
+        replace_entries,
+        create=lambda: {"id": CONTRIBUTOR_LEADERBOARD_ID, "type": "leaderboard"}
+    )
+    return len(entries)
@@ -1,4 +1,6 @@
 import azure.functions as func
+import asyncio
+import importlib
 import json
 import sys
 import os
@@ -8,60 +10,130 @@ import logging
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 
-from user_routes import (
-    register_user,
-    login_user,
-    protected_resource,
-    get_universities_endpoint,
-    get_university_endpoint,
-    search_universities_endpoint,
-    update_calculator_config,
-    get_calculator_config
-)
-from google_auth import google_login_redirect, google_auth_callback
-from calendar_routes import get_events, create_event, update_event, delete_event
-from user_profile_routes import get_user_profile, update_user_profile, get_avatar_upload_url
-from account_routes import change_password, get_settings, update_settings
-from module_routes import (
-    get_all_modules,
-    get_module,
-    create_module,
-    update_module,
-    delete_module,
-    get_modules_by_year_semester,
-    get_module_suggestions
-)
-from dashboard_routes import (
-    get_dashboard_data,
-    update_dashboard_config,
-    add_activity,
-    update_goals,
-    get_insights
-)
-from university_routes import (
-    get_university_modules,
-    get_degree_requirements,
-    import_template_modules,
-    get_module_analytics,
-)
-
-from study_routes import (
-    get_schedules, create_schedule_manual, create_schedule_ai, update_schedule_route, delete_schedule_route,
-    get_active_schedule_route, activate_schedule_route, create_calendar_events_route,
-    get_sessions, start_session, complete_session, reschedule_session,
-    get_achievements, get_streak,
-    get_analytics,
-    get_tips, accept_tip, reject_tip,
-    get_completion_analytics_route, get_completion_insights_route,
-    rate_ai_schedule, analyze_schedule_modifications, get_schedule_explanations
-)
-
-from user_routes import verify_session, logout_user
+from user_routes import verify_session
 from database import get_user_by_email, _container
-from onboarding_routes import get_onboarding_status, save_onboarding_questionnaire
-from module_routes import get_module_analytics
-from password_reset_routes import request_password_reset, reset_password, verify_token
-from reminder_routes import create_reminder, get_reminders, delete_reminder, process_reminders, create_event_reminder
+from request_cache import request_scoped
+import data_metrics
+
+
+def _lazy(module_name: str, name: str):
+    """
+    Stand-in for a route handler that imports its module on first call.
+
+    Route modules pull in openai, azure.storage.blob, passlib and the pydantic
+    models; deferring them keeps cold starts down to what the first request uses.
+    """
+    handler = None
+
+    def call(*args, **kwargs):
+        nonlocal handler
+        if handler is None:
+            handler = getattr(importlib.import_module(module_name), name)
+        return handler(*args, **kwargs)
+
+    call.__name__ = name
+    return call
+
+# user_routes
+register_user = _lazy("user_routes", "register_user")
+login_user = _lazy("user_routes", "login_user")
+protected_resource = _lazy("user_routes", "protected_resource")
+get_universities_endpoint = _lazy("user_routes", "get_universities_endpoint")
+get_university_endpoint = _lazy("user_routes", "get_university_endpoint")
+get_majors_endpoint = _lazy("user_routes", "get_majors_endpoint")
+search_universities_endpoint = _lazy("user_routes", "search_universities_endpoint")
+update_calculator_config = _lazy("user_routes", "update_calculator_config")
+get_calculator_config = _lazy("user_routes", "get_calculator_config")
+logout_user = _lazy("user_routes", "logout_user")
+
+# google_auth
+google_login_redirect = _lazy("google_auth", "google_login_redirect")
+google_auth_callback = _lazy("google_auth", "google_auth_callback")
+
+# calendar_routes
+get_events = _lazy("calendar_routes", "get_events")
+create_event = _lazy("calendar_routes", "create_event")
+update_event = _lazy("calendar_routes", "update_event")
+delete_event = _lazy("calendar_routes", "delete_event")
+
+# user_profile_routes
+get_user_profile = _lazy("user_profile_routes", "get_user_profile")
+update_user_profile = _lazy("user_profile_routes", "update_user_profile")
+get_avatar_upload_url = _lazy("user_profile_routes", "get_avatar_upload_url")
+
+# account_routes
+change_password = _lazy("account_routes", "change_password")
+get_settings = _lazy("account_routes", "get_settings")
+update_settings = _lazy("account_routes", "update_settings")
+
+# module_routes
+get_all_modules = _lazy("module_routes", "get_all_modules")
+get_module = _lazy("module_routes", "get_module")
+create_module = _lazy("module_routes", "create_module")
+update_module = _lazy("module_routes", "update_module")
+delete_module = _lazy("module_routes", "delete_module")
+get_modules_by_year_semester = _lazy("module_routes", "get_modules_by_year_semester")
+get_module_suggestions = _lazy("module_routes", "get_module_suggestions")
+get_module_analytics = _lazy("module_routes", "get_module_analytics")
+
+# dashboard_routes
+get_dashboard_data = _lazy("dashboard_routes", "get_dashboard_data")
+update_dashboard_config = _lazy("dashboard_routes", "update_dashboard_config")
+add_activity = _lazy("dashboard_routes", "add_activity")
+update_goals = _lazy("dashboard_routes", "update_goals")
+get_insights = _lazy("dashboard_routes", "get_insights")
+
+# university_routes
+get_university_modules = _lazy("university_routes", "get_university_modules")
+get_degree_requirements = _lazy("university_routes", "get_degree_requirements")
+import_template_modules = _lazy("university_routes", "import_template_modules")
+
+# study_routes
+get_schedules = _lazy("study_routes", "get_schedules")
+create_schedule_manual = _lazy("study_routes", "create_schedule_manual")
+create_schedule_ai = _lazy("study_routes", "create_schedule_ai")
+update_schedule_route = _lazy("study_routes", "update_schedule_route")
+delete_schedule_route = _lazy("study_routes", "delete_schedule_route")
+get_active_schedule_route = _lazy("study_routes", "get_active_schedule_route")
+activate_schedule_route = _lazy("study_routes", "activate_schedule_route")
+create_calendar_events_route = _lazy("study_routes", "create_calendar_events_route")
+get_sessions = _lazy("study_routes", "get_sessions")
+start_session = _lazy("study_routes", "start_session")
+complete_session = _lazy("study_routes", "complete_session")
+reschedule_session = _lazy("study_routes", "reschedule_session")
+get_achievements = _lazy("study_routes", "get_achievements")
+get_streak = _lazy("study_routes", "get_streak")
+get_analytics = _lazy("study_routes", "get_analytics")
+get_tips = _lazy("study_routes", "get_tips")
+accept_tip = _lazy("study_routes", "accept_tip")
+reject_tip = _lazy("study_routes", "reject_tip")
+get_completion_analytics_route = _lazy("study_routes", "get_completion_analytics_route")
+get_completion_insights_route = _lazy("study_routes", "get_completion_insights_route")
+rate_ai_schedule = _lazy("study_routes", "rate_ai_schedule")
+analyze_schedule_modifications = _lazy("study_routes", "analyze_schedule_modifications")
+get_schedule_explanations = _lazy("study_routes", "get_schedule_explanations")
+get_current_sessions = _lazy("study_routes", "get_current_sessions")
+get_sidebar_data_route = _lazy("study_routes", "get_sidebar_data_route")
+mark_session_completed = _lazy("study_routes", "mark_session_completed")
+mark_session_missed = _lazy("study_routes", "mark_session_missed")
+update_session_statuses = _lazy("study_routes", "update_session_statuses")
+
+# onboarding_routes
+get_onboarding_status = _lazy("onboarding_routes", "get_onboarding_status")
+save_onboarding_questionnaire = _lazy("onboarding_routes", "save_onboarding_questionnaire")
+
+# password_reset_routes
+request_password_reset = _lazy("password_reset_routes", "request_password_reset")
+reset_password = _lazy("password_reset_routes", "reset_password")
+verify_token = _lazy("password_reset_routes", "verify_token")
+
+# reminder_routes
+create_reminder = _lazy("reminder_routes", "create_reminder")
+get_reminders = _lazy("reminder_routes", "get_reminders")
+delete_reminder = _lazy("reminder_routes", "delete_reminder")
+process_reminders = _lazy("reminder_routes", "process_reminders")
+create_event_reminder = _lazy("reminder_routes", "create_event_reminder")
+
 
 
 # Configure CORS settings - UPDATED FOR MULTIPLE ENVIRONMENTS
@@ -105,6 +177,7 @@ def add_cors_headers(response: func.HttpResponse, req: func.HttpRequest = None)
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 @app.route(route="register", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def register_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -112,6 +185,7 @@ def register_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="login", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def login_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -119,6 +193,7 @@ def login_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="protected", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def protected_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -126,6 +201,7 @@ def protected_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="stats/universities", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def stats_universities(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -133,13 +209,23 @@ def stats_universities(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="stats/university", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def stats_university(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
     response = get_university_endpoint(req)
     return add_cors_headers(response, req)
 
+@app.route(route="stats/majors", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
+def stats_majors(req: func.HttpRequest) -> func.HttpResponse:
+    if req.method == "OPTIONS":
+        return cors_preflight_response(req)
+    response = get_majors_endpoint(req)
+    return add_cors_headers(response, req)
+
 @app.route(route="auth/google", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def google_login(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -147,6 +233,7 @@ def google_login(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="auth/google/callback", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def google_callback(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -154,6 +241,7 @@ def google_callback(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="calculator", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def get_calculator(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -161,6 +249,7 @@ def get_calculator(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="calculator/update", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def update_calculator(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -168,6 +257,7 @@ def update_calculator(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="universities/search", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def search_universities_route(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -175,6 +265,7 @@ def search_universities_route(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="user/config", methods=["GET", "PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def user_config_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     # Handle CORS preflight
     if req.method == "OPTIONS":
@@ -229,6 +320,7 @@ def user_config_endpoint(req: func.HttpRequest) -> func.HttpResponse:
         return add_cors_headers(response, req)
 
 @app.route(route="calendar/events", methods=["GET", "POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def calendar_events(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -247,6 +339,7 @@ def calendar_events(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="calendar/events/{id}", methods=["PUT", "DELETE", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def calendar_event_by_id(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -265,6 +358,7 @@ def calendar_event_by_id(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="user/profile", methods=["GET", "PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def user_profile(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -283,6 +377,7 @@ def user_profile(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="user/avatar-upload", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def avatar_upload(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -290,6 +385,7 @@ def avatar_upload(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="user/password", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def password_change(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -297,6 +393,7 @@ def password_change(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="user/settings", methods=["GET", "PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def settings_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -315,6 +412,7 @@ def settings_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="modules", methods=["GET", "POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -333,6 +431,7 @@ def modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="modules/{id}", methods=["GET", "PUT", "DELETE", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def module_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -353,14 +452,15 @@ def module_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="dashboard", methods=["GET", "PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
-def dashboard_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+@request_scoped
+async def dashboard_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
 
     if req.method == "GET":
-        response = get_dashboard_data(req)
+        response = await get_dashboard_data(req)
     elif req.method == "PUT":
-        response = update_dashboard_config(req)
+        response = await asyncio.to_thread(update_dashboard_config, req)
     else:
         response = func.HttpResponse(
             json.dumps({"error": f"Method {req.method} not allowed"}),
@@ -371,6 +471,7 @@ def dashboard_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="dashboard/activity", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def activity_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -387,6 +488,7 @@ def activity_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="dashboard/goals", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def goals_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -403,6 +505,7 @@ def goals_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="modules/by-year-semester", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def modules_by_year_semester_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -410,6 +513,7 @@ def modules_by_year_semester_endpoint(req: func.HttpRequest) -> func.HttpRespons
     return add_cors_headers(response, req)
 
 @app.route(route="university/modules", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def university_modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -417,6 +521,7 @@ def university_modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="university/degree-requirements", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def degree_requirements_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -424,6 +529,7 @@ def degree_requirements_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="university/import-modules", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def import_modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -433,14 +539,16 @@ def import_modules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 # New dashboard insights route
 
 @app.route(route="dashboard/insights", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
-def insights_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+@request_scoped
+async def insights_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
-    response = get_insights(req)
+    response = await get_insights(req)
     return add_cors_headers(response, req)
 
 
 @app.route(route="onboarding/status", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def onboarding_status_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -448,6 +556,7 @@ def onboarding_status_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="onboarding/save", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def save_onboarding_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -456,6 +565,7 @@ def save_onboarding_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="modules/analytics", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def module_analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -463,6 +573,7 @@ def module_analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="logout", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def logout_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -471,6 +582,7 @@ def logout_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 
 # Password reset routes
 @app.route(route="password/forgot", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def forgot_password_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -478,6 +590,7 @@ def forgot_password_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="password/reset", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def reset_password_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -485,6 +598,7 @@ def reset_password_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="password/verify-token", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def verify_token_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -493,6 +607,7 @@ def verify_token_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 
 # Reminder routes
 @app.route(route="reminders", methods=["GET", "POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def reminders_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -511,6 +626,7 @@ def reminders_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="reminders/{id}", methods=["DELETE", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def reminder_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -527,6 +643,7 @@ def reminder_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="reminders/process", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def process_reminders_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -534,6 +651,7 @@ def process_reminders_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="reminders/event", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def create_event_reminder_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -542,6 +660,7 @@ def create_event_reminder_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="study/schedules", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def study_schedules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -549,6 +668,7 @@ def study_schedules_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/active", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def active_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -556,6 +676,7 @@ def active_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/create", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def create_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -563,6 +684,7 @@ def create_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/generate", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def generate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -570,6 +692,7 @@ def generate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/{id}", methods=["PUT", "DELETE", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def schedule_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -588,6 +711,7 @@ def schedule_by_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/{id}/activate", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def activate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -595,6 +719,7 @@ def activate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/{id}/create-events", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def create_events_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -602,6 +727,7 @@ def create_events_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def study_sessions_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -609,6 +735,7 @@ def study_sessions_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/{id}/start", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def start_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -616,6 +743,7 @@ def start_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/{id}/complete", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def complete_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -623,6 +751,7 @@ def complete_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/{id}/reschedule", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def reschedule_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -630,6 +759,7 @@ def reschedule_session_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/achievements", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def achievements_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -637,6 +767,7 @@ def achievements_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/streak", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def streak_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -644,13 +775,15 @@ def streak_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/analytics", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
-def analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+@request_scoped
+async def analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
-    response = get_analytics(req)
+    response = await get_analytics(req)
     return add_cors_headers(response, req)
 
 @app.route(route="study/tips", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def tips_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -658,6 +791,7 @@ def tips_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/tips/{id}/accept", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def accept_tip_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -665,6 +799,7 @@ def accept_tip_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/tips/{id}/reject", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def reject_tip_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -672,15 +807,10 @@ def reject_tip_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 
-from study_routes import (
-    get_current_sessions, get_sidebar_data_route, 
-    mark_session_completed, mark_session_missed,
-    update_session_statuses
-)
-
 # Add these routes to the existing function_app.py routes
 
 @app.route(route="study/sessions/current", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def current_sessions_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -688,6 +818,7 @@ def current_sessions_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sidebar-data", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def sidebar_data_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -695,6 +826,7 @@ def sidebar_data_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/{id}/complete/done", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def mark_session_completed_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -702,6 +834,7 @@ def mark_session_completed_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/{id}/miss", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def mark_session_missed_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -709,6 +842,7 @@ def mark_session_missed_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/sessions/update-statuses", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def update_statuses_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -717,6 +851,7 @@ def update_statuses_endpoint(req: func.HttpRequest) -> func.HttpResponse:
 
 # Also add the timer trigger for the session tracker
 @app.schedule(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=True)
+@request_scoped
 def session_tracker_timer(timer: func.TimerRequest) -> None:
     """Timer trigger that runs every 5 minutes to update session statuses"""
     from session_tracker import main as session_tracker_main
@@ -724,6 +859,7 @@ def session_tracker_timer(timer: func.TimerRequest) -> None:
 
 
 @app.route(route="study/analytics/completion", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def completion_analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -731,6 +867,7 @@ def completion_analytics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/insights/completion", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def completion_insights_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -738,6 +875,7 @@ def completion_insights_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/{id}/rate", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def rate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -745,6 +883,7 @@ def rate_schedule_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/analyze-modifications", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def analyze_modifications_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -752,6 +891,7 @@ def analyze_modifications_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="study/schedules/{id}/explanations", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def schedule_explanations_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
@@ -759,8 +899,41 @@ def schedule_explanations_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     return add_cors_headers(response, req)
 
 @app.route(route="modules/suggestions", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@request_scoped
 def module_suggestions_endpoint(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return cors_preflight_response(req)
     response = get_module_suggestions(req)
-    return add_cors_headers(response, req)
\ No newline at end of file
+    return add_cors_headers(response, req)
+
+@app.route(route="metrics/data", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def data_metrics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    """Data access cost per endpoint since this instance started; requires a function key"""
+    if req.params.get("format") == "prometheus":
+        return func.HttpResponse(data_metrics.export_prometheus(), status_code=200, mimetype="text/plain")
+    summary = data_metrics.summary(req.params.get("endpoint"))
+    return func.HttpResponse(json.dumps(summary), status_code=200, mimetype="application/json")
+
+@app.schedule(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+@request_scoped
+def compact_counters(timer: func.TimerRequest) -> None:
+    """Fold sharded registration counts into the university documents"""
+    from database import compact_university_counters
+    updated = compact_university_counters()
+    logging.info(f"Compacted registration counters for {updated} universities")
+
+@app.schedule(schedule="0 30 3 * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+@request_scoped
+def reconcile_reviews(timer: func.TimerRequest) -> None:
+    """Recount module review statistics kept incrementally by review writes"""
+    from database import reconcile_review_statistics
+    corrected = reconcile_review_statistics()
+    logging.info(f"Reconciled review statistics, {corrected} modules corrected")
+
+@app.schedule(schedule="0 45 3 * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+@request_scoped
+def rebuild_leaderboards(timer: func.TimerRequest) -> None:
+    """Recount the GradeRadar contributor leaderboard kept incrementally by contributions"""
+    from database import rebuild_contributor_leaderboard
+    entries = rebuild_contributor_leaderboard()
+    logging.info(f"Rebuilt contributor leaderboard with {entries} entries")
@@ -1,13 +1,7 @@
 # grade_calculator.py
 import json
 from typing import List, Dict, Any, Optional
-from database import get_user_by_email, _container
-
-def get_user_modules(email: str) -> List[Dict[str, Any]]:
-    """Retrieve modules for a user"""
-    query = f"SELECT * FROM c WHERE c.type = 'module' AND c.user_email = '{email}'"
-    modules = list(_container.query_items(query=query, enable_cross_partition_query=True))
-    return modules
+from database import get_user_by_email, get_user_modules
 
 def get_modules_by_year_semester(email: str) -> Dict[str, Dict[int, List[Dict[str, Any]]]]:
     """Get modules organized by year and semester"""
@@ -8,42 +8,40 @@ from user_routes import verify_session
 from models import ModuleReview
 from database import (
     get_module_reviews, 
+    get_module_reviews_page,
     create_module_review, 
+    update_module_review,
     delete_module_review,
     get_module_statistics,
     get_university_modules_with_stats,
     get_degree_modules_with_stats,
     get_module_by_id_public,
+    get_modules_by_ids_public,
+    find_document,
     _container
 )
+from storage import page_params
 
 def get_universities_with_data(req: func.HttpRequest) -> func.HttpResponse:
     """Get list of universities that have modules with reviews"""
     try:
-        from database import get_all_universities_docs
+        from database import get_all_universities_docs, get_degree_summaries
         university_docs = get_all_universities_docs()
         
         # Filter to include only universities with degrees that have modules
         universities_with_data = []
         
         for uni in university_docs:
-            if "degrees" in uni and uni["degrees"]:
-                # Check if any degree has modules
-                has_modules = False
-                for degree_data in uni["degrees"].values():
-                    if "modules" in degree_data and degree_data["modules"]:
-                        has_modules = True
-                        break
-                
-                if has_modules:
-                    # Create a simplified response object
-                    uni_data = {
-                        "name": uni.get("name", ""),
-                        "id": uni.get("id", ""),
-                        "students_count": uni.get("counter", 0),
-                        "degrees_count": len(uni.get("degrees", {}))
-                    }
-                    universities_with_data.append(uni_data)
+            degrees = get_degree_summaries(uni)
+            if degrees:
+                # Create a simplified response object
+                uni_data = {
+                    "name": uni.get("name", ""),
+                    "id": uni.get("id", ""),
+                    "students_count": uni.get("counter", 0),
+                    "degrees_count": len(degrees)
+                }
+                universities_with_data.append(uni_data)
         
         return func.HttpResponse(
             json.dumps(universities_with_data),
@@ -69,7 +67,7 @@ def get_university_degrees(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        from database import get_university_doc
+        from database import get_university_doc, get_degree_summaries, with_live_counts, get_major_count
         university_doc = get_university_doc(university_name)
         
         if not university_doc:
@@ -78,27 +76,23 @@ def get_university_degrees(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=404,
                 mimetype="application/json"
             )
+
+        # Student counts straight from the registration counters
+        university_doc = with_live_counts(university_doc)
         
         # Get degrees with module counts
         degrees_data = []
         
-        if "degrees" in university_doc:
-            for degree_name, degree_data in university_doc["degrees"].items():
-                module_count = len(degree_data.get("modules", {}))
-                
-                # Get student count from majors
-                student_count = 0
-                for major in university_doc.get("majors", []):
-                    if major.get("major_name") == degree_name:
-                        student_count = major.get("counter", 0)
-                        break
-                
-                if module_count > 0:  # Only include degrees with modules
-                    degrees_data.append({
-                        "name": degree_name,
-                        "modules_count": module_count,
-                        "students_count": student_count
-                    })
+        # Only degrees with modules have a summary
+        for degree_name, summary in get_degree_summaries(university_doc).items():
+            # Get student count from majors
+            student_count = get_major_count(university_doc, degree_name)
+            
+            degrees_data.append({
+                "name": degree_name,
+                "modules_count": summary["modules_count"],
+                "students_count": student_count
+            })
         
         # Add total student count from university
         university_data = {
@@ -163,6 +157,15 @@ def get_module_details(req: func.HttpRequest) -> func.HttpResponse:
             status_code=400,
             mimetype="application/json"
         )
+
+    try:
+        page_size, cursor = page_params(req.params)
+    except ValueError as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
     
     try:
         # Get module base data
@@ -182,8 +185,12 @@ def get_module_details(req: func.HttpRequest) -> func.HttpResponse:
             module.get("degree", "")
         )
         
-        # Get anonymized reviews
-        reviews = get_module_reviews(module_id)
+        # Get anonymized reviews, one page at a time when the client asks for it
+        next_cursor = None
+        if page_size:
+            reviews, next_cursor = get_module_reviews_page(module_id, page_size, cursor)
+        else:
+            reviews = get_module_reviews(module_id)
         
         # Anonymize reviews
         anonymous_reviews = []
@@ -210,6 +217,8 @@ def get_module_details(req: func.HttpRequest) -> func.HttpResponse:
             "statistics": statistics,
             "reviews": anonymous_reviews
         }
+        if page_size:
+            response["next_cursor"] = next_cursor
         
         return func.HttpResponse(
             json.dumps(response),
@@ -289,6 +298,69 @@ def create_module_review_route(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
+def update_module_review_route(req: func.HttpRequest) -> func.HttpResponse:
+    """Edit a module review - requires authentication and must be review owner"""
+    is_valid, identity = verify_session(req)
+    if not is_valid:
+        return func.HttpResponse(
+            json.dumps({"error": "Authentication required"}),
+            status_code=401,
+            mimetype="application/json"
+        )
+    
+    review_id = req.route_params.get("id")
+    if not review_id:
+        return func.HttpResponse(
+            json.dumps({"error": "Review ID is required"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    try:
+        try:
+            updates = req.get_json()
+        except ValueError:
+            updates = None
+        if not isinstance(updates, dict):
+            return func.HttpResponse(
+                json.dumps({"error": "Invalid JSON body"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        # Only the ratings, comment, grade and anonymity can change; the
+        # module statistics swap the old ratings for the new ones
+        updated_review = update_module_review(review_id, identity, updates)
+        
+        if updated_review:
+            return func.HttpResponse(
+                json.dumps({
+                    "id": updated_review.get("id"),
+                    "module_id": updated_review.get("module_id"),
+                    "difficulty_rating": updated_review.get("difficulty_rating"),
+                    "teaching_quality_rating": updated_review.get("teaching_quality_rating"),
+                    "recommended_rating": updated_review.get("recommended_rating"),
+                    "comment": updated_review.get("comment"),
+                    "grade_received": updated_review.get("grade_received"),
+                    "created_at": updated_review.get("created_at"),
+                    "updated_at": updated_review.get("updated_at")
+                }),
+                status_code=200,
+                mimetype="application/json"
+            )
+        else:
+            return func.HttpResponse(
+                json.dumps({"error": "Review not found or you don't have permission to edit it"}),
+                status_code=404,
+                mimetype="application/json"
+            )
+    except Exception as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+
 def delete_module_review_route(req: func.HttpRequest) -> func.HttpResponse:
     """Delete a module review - requires authentication and must be review owner"""
     is_valid, identity = verify_session(req)
@@ -349,14 +421,15 @@ def get_user_reviews(req: func.HttpRequest) -> func.HttpResponse:
         reviews = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=identity
         ))
         
-        # Get module info for each review
+        # Get module info for all reviews in one lookup
+        modules = get_modules_by_ids_public(review.get("module_id") for review in reviews)
         enhanced_reviews = []
         
         for review in reviews:
-            module = get_module_by_id_public(review.get("module_id"))
+            module = modules.get(review.get("module_id"))
             
             if module:
                 # Combine review and module data
@@ -405,31 +478,9 @@ def search_modules(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        # Query for modules matching criteria
+        # Query for modules matching criteria, within one university or across all of them
         from database import search_modules_for_university
-        results = []
-        
-        if university:
-            # If university is specified, search within that university
-            results = search_modules_for_university(university, query, limit)
-        else:
-            # If no university specified, search across top universities
-            from database import get_all_universities_docs
-            universities = get_all_universities_docs()
-            # Limit to top 5 universities for performance
-            top_universities = sorted(universities, key=lambda u: u.get("counter", 0), reverse=True)[:5]
-            
-            for uni in top_universities:
-                uni_results = search_modules_for_university(uni.get("name", ""), query, limit // 5)
-                results.extend(uni_results)
-                # Break early if we have enough results
-                if len(results) >= limit:
-                    break
-            
-            # Sort by relevance
-            results = sorted(results, key=lambda m: 
-                0 if query.lower() in (m.get("name", "") + m.get("code", "")).lower() else 1
-            )[:limit]
+        results = search_modules_for_university(university or None, query, limit)
         
         return func.HttpResponse(
             json.dumps(results),
@@ -462,7 +513,7 @@ def create_module(req: func.HttpRequest) -> func.HttpResponse:
                     mimetype="application/json"
                 )
         
-        # Check if similar module already exists
+        # Check if the same module already exists
         from database import check_similar_module_exists
         existing_module = check_similar_module_exists(
             module_data.get("university"),
@@ -481,6 +532,16 @@ def create_module(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
+        # A module with a merely similar name ("Organic Chemistry" next to
+        # "Inorganic Chemistry") is created, with the other one pointed out
+        similar_module = check_similar_module_exists(
+            module_data.get("university"),
+            module_data.get("degree"),
+            module_data.get("name"),
+            module_data.get("code"),
+            exact=False
+        )
+        
         # Normalize module name
         from database import normalize_module_name
         module_data["name"] = normalize_module_name(module_data.get("name", ""))
@@ -500,7 +561,12 @@ def create_module(req: func.HttpRequest) -> func.HttpResponse:
         # Update university module data
         from module_routes import update_university_module_data
         update_university_module_data(module_data)
+
+        from database import record_contribution
+        record_contribution(identity, modules=1)
         
+        if similar_module:
+            result = dict(result, similar_module=similar_module)
         return func.HttpResponse(
             json.dumps(result),
             status_code=201,
@@ -531,24 +597,15 @@ def update_module(req: func.HttpRequest) -> func.HttpResponse:
         module_data = req.get_json()
         
         # Get existing module
-        query = "SELECT * FROM c WHERE c.id = @id AND c.type = 'module'"
-        parameters = [{"name": "@id", "value": module_id}]
+        existing_module = find_document(module_id, "module")
         
-        modules = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        if not modules:
+        if not existing_module:
             return func.HttpResponse(
                 json.dumps({"error": "Module not found"}),
                 status_code=404,
                 mimetype="application/json"
             )
         
-        existing_module = modules[0]
-        
         # Check if user is authorized to update this module
         # Only creator or admin can update
         if existing_module.get("created_by") != identity:
@@ -699,41 +756,18 @@ def update_user_profile(req: func.HttpRequest) -> func.HttpResponse:
 def get_user_review_count(user_email: str) -> int:
     """Get the number of reviews created by a user"""
     try:
-        query = "SELECT COUNT(1) as count FROM c WHERE c.type = 'module_review' AND c.user_email = @email"
-        parameters = [{"name": "@email", "value": user_email}]
-        
-        results = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        return results[0].get("count", 0) if results else 0
+        from database import get_contributions
+        return get_contributions(user_email).get("reviews", 0)
     except Exception:
         return 0
 
 def calculate_contribution_score(user_email: str) -> int:
     """Calculate the user's contribution score based on activity"""
     try:
-        # Get user's review count
-        review_count = get_user_review_count(user_email)
-        
-        # Get count of modules created by user
-        query = "SELECT COUNT(1) as count FROM c WHERE c.type = 'module' AND c.created_by = @email"
-        parameters = [{"name": "@email", "value": user_email}]
-        
-        results = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        module_count = results[0].get("count", 0) if results else 0
-        
-        # Calculate score: reviews are worth 5 points, modules are worth 10 points
-        score = (review_count * 5) + (module_count * 10)
-        
-        return score
+        # Reviews are worth 5 points, modules are worth 10 points; the counts
+        # are kept on the user document
+        from database import get_contributions, contribution_score
+        return contribution_score(get_contributions(user_email))
     except Exception:
         return 0
 
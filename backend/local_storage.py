@@ -0,0 +1,915 @@
+# local_storage.py
+
+"""
+In-process stand-in for Cosmos DB containers.
+
+Implements the container methods used by the data layer and the SQL subset our
+queries rely on: SELECT * / projections / VALUE / TOP, WHERE with AND/OR/NOT,
+comparisons, IN, BETWEEN, the string/array/type functions we call, aggregates
+(COUNT/SUM/AVG/MIN/MAX), ORDER BY and OFFSET/LIMIT. Comparisons follow Cosmos
+semantics: anything involving an undefined property or mismatched types is
+undefined and filtered out.
+
+Documents live in memory; when a file path is given they are also written
+through to SQLite so a seeded dataset survives restarts.
+"""
+
+import contextlib
+import copy
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from storage import apply_patch_operations, PATCH_OPERATION_LIMIT
+
+
+class _Undefined:
+    """Marker for properties that do not exist on a document."""
+
+    def __repr__(self):
+        return "undefined"
+
+
+UNDEFINED = _Undefined()
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<param>@[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=|>=|!=|<>|\|\||[=<>(),.\[\]*+\-/%{}:])
+""", re.VERBOSE)
+
+_KEYWORDS = {
+    "SELECT", "VALUE", "TOP", "FROM", "WHERE", "AND", "OR", "NOT", "IN",
+    "BETWEEN", "ORDER", "BY", "ASC", "DESC", "OFFSET", "LIMIT", "AS",
+    "TRUE", "FALSE", "NULL", "UNDEFINED", "DISTINCT",
+}
+
+_AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+
+
+def _unescape(raw: str) -> str:
+    body = raw[1:-1]
+    return re.sub(
+        r"\\(u[0-9a-fA-F]{4}|.)",
+        lambda m: chr(int(m.group(1)[1:], 16)) if len(m.group(1)) == 5
+        else {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(m.group(1), m.group(1)),
+        body,
+    )
+
+
+def _tokenize(query: str):
+    tokens = []
+    pos = 0
+    while pos < len(query):
+        match = _TOKEN_RE.match(query, pos)
+        if not match:
+            raise ValueError(f"Unsupported query syntax near: {query[pos:pos + 20]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "ws":
+            continue
+        if kind == "ident" and text.upper() in _KEYWORDS:
+            tokens.append(("kw", text.upper()))
+        elif kind == "number":
+            tokens.append(("literal", float(text) if any(ch in text for ch in ".eE") else int(text)))
+        elif kind == "string":
+            tokens.append(("literal", _unescape(text)))
+        else:
+            tokens.append((kind, text))
+    tokens.append(("eof", None))
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# Parser: produces a small tuple-based AST
+# ---------------------------------------------------------------------------
+
+class _Parser:
+    def __init__(self, query: str):
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            raise ValueError(f"Expected {value or kind}, found {self.peek()[1]!r}")
+        return token
+
+    def parse_query(self):
+        self.expect("kw", "SELECT")
+        query = {"top": None, "value": False, "distinct": False, "select": None,
+                 "alias": None, "where": None, "order_by": [], "offset": None, "limit": None}
+
+        if self.accept("kw", "DISTINCT"):
+            query["distinct"] = True
+        if self.accept("kw", "TOP"):
+            query["top"] = self.parse_primary()
+        if self.accept("kw", "VALUE"):
+            query["value"] = True
+            query["select"] = [(self.parse_expr(), None)]
+        elif self.accept("op", "*"):
+            query["select"] = "*"
+        else:
+            query["select"] = [self.parse_select_item()]
+            while self.accept("op", ","):
+                query["select"].append(self.parse_select_item())
+
+        self.expect("kw", "FROM")
+        query["alias"] = self.expect("ident")[1]
+        if self.peek()[0] == "ident":
+            query["alias"] = self.next()[1]
+
+        if self.accept("kw", "WHERE"):
+            query["where"] = self.parse_expr()
+        if self.accept("kw", "ORDER"):
+            self.expect("kw", "BY")
+            while True:
+                expr = self.parse_expr()
+                descending = False
+                if self.accept("kw", "DESC"):
+                    descending = True
+                else:
+                    self.accept("kw", "ASC")
+                query["order_by"].append((expr, descending))
+                if not self.accept("op", ","):
+                    break
+        if self.accept("kw", "OFFSET"):
+            query["offset"] = self.parse_primary()
+            self.expect("kw", "LIMIT")
+            query["limit"] = self.parse_primary()
+
+        self.expect("eof")
+        return query
+
+    def parse_select_item(self):
+        expr = self.parse_expr()
+        alias = None
+        if self.accept("kw", "AS"):
+            alias = self.expect("ident")[1]
+        elif self.peek()[0] == "ident":
+            alias = self.next()[1]
+        return expr, alias
+
+    def parse_expr(self):
+        left = self.parse_and()
+        while self.accept("kw", "OR"):
+            left = ("or", left, self.parse_and())
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.accept("kw", "AND"):
+            left = ("and", left, self.parse_not())
+        return left
+
+    def parse_not(self):
+        if self.accept("kw", "NOT"):
+            return ("not", self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_additive()
+        token = self.peek()
+        if token[0] == "op" and token[1] in ("=", "!=", "<>", "<", "<=", ">", ">="):
+            self.next()
+            op = "!=" if token[1] == "<>" else token[1]
+            return ("cmp", op, left, self.parse_additive())
+        negate = False
+        if token == ("kw", "NOT") and self.peek(1) in (("kw", "IN"), ("kw", "BETWEEN")):
+            self.next()
+            negate = True
+        if self.accept("kw", "IN"):
+            self.expect("op", "(")
+            items = [self.parse_expr()]
+            while self.accept("op", ","):
+                items.append(self.parse_expr())
+            self.expect("op", ")")
+            node = ("in", left, items)
+            return ("not", node) if negate else node
+        if self.accept("kw", "BETWEEN"):
+            low = self.parse_additive()
+            self.expect("kw", "AND")
+            high = self.parse_additive()
+            node = ("between", left, low, high)
+            return ("not", node) if negate else node
+        return left
+
+    def parse_additive(self):
+        left = self.parse_multiplicative()
+        while self.peek()[0] == "op" and self.peek()[1] in ("+", "-", "||"):
+            op = self.next()[1]
+            left = ("arith", op, left, self.parse_multiplicative())
+        return left
+
+    def parse_multiplicative(self):
+        left = self.parse_unary()
+        while self.peek()[0] == "op" and self.peek()[1] in ("*", "/", "%"):
+            op = self.next()[1]
+            left = ("arith", op, left, self.parse_unary())
+        return left
+
+    def parse_unary(self):
+        if self.accept("op", "-"):
+            return ("arith", "-", ("literal", 0), self.parse_unary())
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        while True:
+            if self.accept("op", "."):
+                node = ("prop", node, self.expect("ident")[1])
+            elif self.accept("op", "["):
+                index = self.parse_expr()
+                self.expect("op", "]")
+                node = ("index", node, index)
+            else:
+                return node
+
+    def parse_primary(self):
+        token = self.next()
+        kind, value = token
+        if kind == "literal":
+            return ("literal", value)
+        if kind == "param":
+            return ("param", value)
+        if kind == "kw" and value in ("TRUE", "FALSE"):
+            return ("literal", value == "TRUE")
+        if kind == "kw" and value == "NULL":
+            return ("literal", None)
+        if kind == "kw" and value == "UNDEFINED":
+            return ("literal", UNDEFINED)
+        if kind == "op" and value == "(":
+            expr = self.parse_expr()
+            self.expect("op", ")")
+            return expr
+        if kind == "op" and value == "[":
+            items = []
+            if not self.accept("op", "]"):
+                items.append(self.parse_expr())
+                while self.accept("op", ","):
+                    items.append(self.parse_expr())
+                self.expect("op", "]")
+            return ("array", items)
+        if kind == "ident":
+            if self.accept("op", "("):
+                args = []
+                if not self.accept("op", ")"):
+                    args.append(self.parse_expr())
+                    while self.accept("op", ","):
+                        args.append(self.parse_expr())
+                    self.expect("op", ")")
+                return ("call", value.upper(), args)
+            return ("root", value)
+        raise ValueError(f"Unexpected token {value!r}")
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _comparable(left, right):
+    if left is UNDEFINED or right is UNDEFINED:
+        return False
+    if _is_number(left) and _is_number(right):
+        return True
+    return type(left) is type(right)
+
+
+def _compare(op, left, right):
+    if not _comparable(left, right):
+        return UNDEFINED
+    if op in ("<", "<=", ">", ">=") and not (
+        _is_number(left) or isinstance(left, str)
+    ):
+        return UNDEFINED
+    if op == "=":
+        return left == right
+    if op == "!=":
+        return left != right
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    return left >= right
+
+
+def _sort_key(value):
+    """Cross-type ordering used by ORDER BY (undefined < null < bool < number < string)."""
+    if value is UNDEFINED:
+        return (0, 0)
+    if value is None:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if _is_number(value):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, json.dumps(value, sort_keys=True))
+
+
+def _str_args(*values):
+    return all(isinstance(v, str) for v in values)
+
+
+def _call(name, args):
+    if name == "IS_DEFINED":
+        return args[0] is not UNDEFINED
+    if name == "IS_NULL":
+        return args[0] is None
+    if name == "IS_STRING":
+        return isinstance(args[0], str)
+    if name == "IS_NUMBER":
+        return _is_number(args[0])
+    if name == "IS_BOOL":
+        return isinstance(args[0], bool)
+    if name == "IS_ARRAY":
+        return isinstance(args[0], list)
+    if name == "IS_OBJECT":
+        return isinstance(args[0], dict)
+    if name in ("LOWER", "UPPER", "LTRIM", "RTRIM", "TRIM", "LENGTH"):
+        if not isinstance(args[0], str):
+            return UNDEFINED
+        return {
+            "LOWER": str.lower, "UPPER": str.upper, "LTRIM": str.lstrip,
+            "RTRIM": str.rstrip, "TRIM": str.strip, "LENGTH": len,
+        }[name](args[0])
+    if name in ("CONTAINS", "STARTSWITH", "ENDSWITH"):
+        if not _str_args(args[0], args[1]):
+            return UNDEFINED
+        haystack, needle = args[0], args[1]
+        if len(args) > 2 and args[2] is True:
+            haystack, needle = haystack.lower(), needle.lower()
+        if name == "CONTAINS":
+            return needle in haystack
+        if name == "STARTSWITH":
+            return haystack.startswith(needle)
+        return haystack.endswith(needle)
+    if name == "INDEX_OF":
+        if not _str_args(args[0], args[1]):
+            return UNDEFINED
+        return args[0].find(args[1])
+    if name == "SUBSTRING":
+        if not isinstance(args[0], str):
+            return UNDEFINED
+        return args[0][args[1]:args[1] + args[2]]
+    if name == "CONCAT":
+        if not all(isinstance(arg, str) for arg in args):
+            return UNDEFINED
+        return "".join(args)
+    if name == "ARRAY_LENGTH":
+        return len(args[0]) if isinstance(args[0], list) else UNDEFINED
+    if name == "ARRAY_CONTAINS":
+        if not isinstance(args[0], list):
+            return UNDEFINED
+        needle = args[1]
+        partial = len(args) > 2 and args[2] is True
+        for element in args[0]:
+            if partial and isinstance(needle, dict) and isinstance(element, dict):
+                if all(element.get(k, UNDEFINED) == v for k, v in needle.items()):
+                    return True
+            elif _compare("=", element, needle) is True:
+                return True
+        return False
+    if name in ("ABS", "FLOOR", "CEILING", "ROUND"):
+        if not _is_number(args[0]):
+            return UNDEFINED
+        return {"ABS": abs, "FLOOR": math.floor, "CEILING": math.ceil, "ROUND": round}[name](args[0])
+    raise ValueError(f"Unsupported function: {name}")
+
+
+def _evaluate(node, doc, alias, params):
+    kind = node[0]
+    if kind == "literal":
+        return node[1]
+    if kind == "param":
+        if node[1] not in params:
+            raise ValueError(f"Missing query parameter {node[1]}")
+        return params[node[1]]
+    if kind == "root":
+        if node[1] != alias:
+            raise ValueError(f"Unknown identifier {node[1]!r}")
+        return doc
+    if kind == "prop":
+        target = _evaluate(node[1], doc, alias, params)
+        if isinstance(target, dict):
+            return target.get(node[2], UNDEFINED)
+        return UNDEFINED
+    if kind == "index":
+        target = _evaluate(node[1], doc, alias, params)
+        key = _evaluate(node[2], doc, alias, params)
+        if isinstance(target, dict) and isinstance(key, str):
+            return target.get(key, UNDEFINED)
+        if isinstance(target, list) and _is_number(key) and 0 <= int(key) < len(target):
+            return target[int(key)]
+        return UNDEFINED
+    if kind == "array":
+        return [_evaluate(item, doc, alias, params) for item in node[1]]
+    if kind == "cmp":
+        return _compare(node[1], _evaluate(node[2], doc, alias, params),
+                        _evaluate(node[3], doc, alias, params))
+    if kind == "and":
+        left = _evaluate(node[1], doc, alias, params)
+        if left is False:
+            return False
+        right = _evaluate(node[2], doc, alias, params)
+        if right is False:
+            return False
+        if left is True and right is True:
+            return True
+        return UNDEFINED
+    if kind == "or":
+        left = _evaluate(node[1], doc, alias, params)
+        if left is True:
+            return True
+        right = _evaluate(node[2], doc, alias, params)
+        if right is True:
+            return True
+        if left is False and right is False:
+            return False
+        return UNDEFINED
+    if kind == "not":
+        value = _evaluate(node[1], doc, alias, params)
+        return (not value) if isinstance(value, bool) else UNDEFINED
+    if kind == "in":
+        value = _evaluate(node[1], doc, alias, params)
+        if value is UNDEFINED:
+            return UNDEFINED
+        candidates = [_evaluate(item, doc, alias, params) for item in node[2]]
+        return any(_compare("=", value, candidate) is True for candidate in candidates)
+    if kind == "between":
+        value = _evaluate(node[1], doc, alias, params)
+        low = _compare(">=", value, _evaluate(node[2], doc, alias, params))
+        high = _compare("<=", value, _evaluate(node[3], doc, alias, params))
+        if low is UNDEFINED or high is UNDEFINED:
+            return UNDEFINED
+        return low and high
+    if kind == "arith":
+        left = _evaluate(node[2], doc, alias, params)
+        right = _evaluate(node[3], doc, alias, params)
+        if node[1] == "||":
+            return left + right if _str_args(left, right) else UNDEFINED
+        if not (_is_number(left) and _is_number(right)):
+            return UNDEFINED
+        if node[1] == "+":
+            return left + right
+        if node[1] == "-":
+            return left - right
+        if node[1] == "*":
+            return left * right
+        if right == 0:
+            return UNDEFINED
+        return left / right if node[1] == "/" else left % right
+    if kind == "call":
+        if node[1] in _AGGREGATES:
+            raise ValueError(f"Aggregate {node[1]} is only supported in the SELECT clause")
+        return _call(node[1], [_evaluate(arg, doc, alias, params) for arg in node[2]])
+    raise ValueError(f"Unsupported expression: {kind}")
+
+
+def _is_aggregate(node):
+    return node[0] == "call" and node[1] in _AGGREGATES
+
+
+def _aggregate(node, docs, alias, params):
+    name = node[1]
+    if name == "COUNT":
+        return sum(1 for doc in docs if _evaluate(node[2][0], doc, alias, params) is not UNDEFINED)
+    values = [_evaluate(node[2][0], doc, alias, params) for doc in docs]
+    values = [value for value in values if _is_number(value)]
+    if name == "SUM":
+        return sum(values)
+    if not values:
+        return UNDEFINED
+    if name == "AVG":
+        return sum(values) / len(values)
+    return min(values) if name == "MIN" else max(values)
+
+
+def _default_alias(node, position):
+    if node[0] == "prop":
+        return node[2]
+    if node[0] == "root":
+        return node[1]
+    return f"${position + 1}"
+
+
+class _CompiledQuery:
+    """A parsed query that can be run against a sequence of documents."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.ast = _Parser(text).parse_query()
+
+    def run(self, docs, parameters=None):
+        ast = self.ast
+        alias = ast["alias"]
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+
+        matched = [
+            doc for doc in docs
+            if ast["where"] is None or _evaluate(ast["where"], doc, alias, params) is True
+        ]
+
+        select = ast["select"]
+        if select != "*" and any(_is_aggregate(expr) for expr, _ in select):
+            if ast["value"]:
+                value = _aggregate(select[0][0], matched, alias, params)
+                return [] if value is UNDEFINED else [value]
+            row = {}
+            for position, (expr, name) in enumerate(select):
+                value = _aggregate(expr, matched, alias, params)
+                if value is not UNDEFINED:
+                    row[name or f"${position + 1}"] = value
+            return [row]
+
+        for expr, descending in reversed(ast["order_by"]):
+            matched.sort(key=lambda doc: _sort_key(_evaluate(expr, doc, alias, params)),
+                         reverse=descending)
+
+        rows = []
+        for doc in matched:
+            if select == "*":
+                rows.append(copy.deepcopy(doc))
+            elif ast["value"]:
+                value = _evaluate(select[0][0], doc, alias, params)
+                if value is not UNDEFINED:
+                    rows.append(copy.deepcopy(value))
+            else:
+                row = {}
+                for position, (expr, name) in enumerate(select):
+                    value = _evaluate(expr, doc, alias, params)
+                    if value is not UNDEFINED:
+                        row[name or _default_alias(expr, position)] = copy.deepcopy(value)
+                rows.append(row)
+
+        if ast["distinct"]:
+            seen = set()
+            unique = []
+            for row in rows:
+                key = json.dumps(row, sort_keys=True, default=str)
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(row)
+            rows = unique
+
+        if ast["offset"] is not None:
+            offset = _evaluate(ast["offset"], {}, alias, params)
+            limit = _evaluate(ast["limit"], {}, alias, params)
+            rows = rows[offset:offset + limit]
+        if ast["top"] is not None:
+            rows = rows[:_evaluate(ast["top"], {}, alias, params)]
+        return rows
+
+
+_query_cache = {}
+
+
+def compile_query(text: str) -> _CompiledQuery:
+    """Parse a query once and reuse the plan for later calls with the same text."""
+    compiled = _query_cache.get(text)
+    if compiled is None:
+        compiled = _CompiledQuery(text)
+        _query_cache[text] = compiled
+    return compiled
+
+
+# ---------------------------------------------------------------------------
+# Containers
+# ---------------------------------------------------------------------------
+
+class _PageIterator:
+    """Yields pages of a materialized result; tokens are plain row offsets."""
+
+    def __init__(self, rows: list, page_size: int, continuation_token=None):
+        self._rows = rows
+        self._page_size = page_size
+        try:
+            self._position = int(continuation_token or 0)
+        except ValueError:
+            raise CosmosHttpResponseError(status_code=400, message="Invalid continuation token")
+        self.continuation_token = continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position >= len(self._rows):
+            raise StopIteration
+        end = self._position + self._page_size
+        page = self._rows[self._position:end]
+        self._position = end
+        self.continuation_token = str(end) if end < len(self._rows) else None
+        return iter(page)
+
+
+class _QueryResult(list):
+    """Query results that can also be read page by page, like Cosmos ItemPaged."""
+
+    def __init__(self, rows, max_item_count=None):
+        super().__init__(rows)
+        self._max_item_count = max_item_count
+
+    def by_page(self, continuation_token=None):
+        page_size = self._max_item_count if self._max_item_count and self._max_item_count > 0 else max(len(self), 1)
+        return _PageIterator(list(self), page_size, continuation_token)
+
+
+def _partition_value(body: dict, path: str):
+    value = body
+    for part in path.strip("/").split("/"):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _key(partition_key) -> str:
+    return json.dumps(partition_key)
+
+
+def _check_condition(doc, kwargs):
+    """Honour etag/match_condition the way Cosmos does for conditional writes."""
+    etag = kwargs.get("etag")
+    condition = kwargs.get("match_condition")
+    if etag is None or condition is None:
+        return
+    current = doc.get("_etag") if doc is not None else None
+    if condition == MatchConditions.IfNotModified and current != etag:
+        raise CosmosAccessConditionFailedError(
+            status_code=412,
+            message="Operation cannot be performed because one of the specified precondition is not met",
+        )
+
+
+class LocalContainer:
+    """Container backed by a dict of documents keyed by (partition key, id)."""
+
+    def __init__(self, database, name: str, partition_key_path: str = "/id"):
+        self.database = database
+        self.id = name
+        self.partition_key_path = partition_key_path
+        self._items = {}
+
+    def _stamp(self, body: dict) -> dict:
+        if "id" not in body:
+            raise ValueError("Document is missing the required 'id' property")
+        doc = copy.deepcopy(body)
+        doc["_etag"] = f'"{uuid.uuid4()}"'
+        doc["_ts"] = int(time.time())
+        return doc
+
+    def _store(self, doc: dict):
+        key = (_key(_partition_value(doc, self.partition_key_path)), doc["id"])
+        self._items[key] = doc
+        self.database._persist(self.id, key, doc)
+
+    def _lookup(self, item, partition_key):
+        item_id = item["id"] if isinstance(item, dict) else item
+        key = (_key(partition_key), item_id)
+        doc = self._items.get(key)
+        if doc is None:
+            raise CosmosResourceNotFoundError(
+                status_code=404,
+                message=f"Entity with the specified id does not exist: {item_id}",
+            )
+        return key, doc
+
+    def read_item(self, item, partition_key, **kwargs):
+        with self.database.lock:
+            _, doc = self._lookup(item, partition_key)
+            return copy.deepcopy(doc)
+
+    def create_item(self, body: dict, **kwargs):
+        with self.database.lock:
+            doc = self._stamp(body)
+            key = (_key(_partition_value(doc, self.partition_key_path)), doc["id"])
+            if key in self._items:
+                raise CosmosResourceExistsError(
+                    status_code=409,
+                    message=f"Entity with the specified id already exists: {doc['id']}",
+                )
+            self._store(doc)
+            return copy.deepcopy(doc)
+
+    def upsert_item(self, body: dict, **kwargs):
+        with self.database.lock:
+            doc = self._stamp(body)
+            _check_condition(self._items.get((_key(_partition_value(doc, self.partition_key_path)), doc["id"])), kwargs)
+            self._store(doc)
+            return copy.deepcopy(doc)
+
+    def replace_item(self, item, body: dict, **kwargs):
+        with self.database.lock:
+            doc = self._stamp(body)
+            _, existing = self._lookup(item, _partition_value(doc, self.partition_key_path))
+            _check_condition(existing, kwargs)
+            self._store(doc)
+            return copy.deepcopy(doc)
+
+    def delete_item(self, item, partition_key, **kwargs):
+        with self.database.lock:
+            key, existing = self._lookup(item, partition_key)
+            _check_condition(existing, kwargs)
+            del self._items[key]
+            self.database._remove(self.id, key)
+
+    def patch_item(self, item, partition_key, patch_operations, filter_predicate=None, **kwargs):
+        if len(patch_operations) > PATCH_OPERATION_LIMIT:
+            raise CosmosHttpResponseError(
+                status_code=400,
+                message=f"Patch accepts at most {PATCH_OPERATION_LIMIT} operations",
+            )
+        with self.database.lock:
+            _, doc = self._lookup(item, partition_key)
+            _check_condition(doc, kwargs)
+            if filter_predicate and not compile_query(f"SELECT * {filter_predicate}").run([doc]):
+                raise CosmosAccessConditionFailedError(
+                    status_code=412,
+                    message="Precondition on the patch request is not met",
+                )
+            updated = copy.deepcopy(doc)
+            try:
+                apply_patch_operations(updated, patch_operations)
+            except (ValueError, TypeError, KeyError, IndexError) as e:
+                raise CosmosHttpResponseError(status_code=400, message=str(e))
+            if _partition_value(updated, self.partition_key_path) != partition_key or updated.get("id") != doc["id"]:
+                raise CosmosHttpResponseError(
+                    status_code=400,
+                    message="Patch cannot change the id or partition key",
+                )
+            updated = self._stamp(updated)
+            self._store(updated)
+            return copy.deepcopy(updated)
+
+    def query_items(self, query: str, parameters=None, partition_key=None, max_item_count=None, **kwargs):
+        compiled = compile_query(query)
+        with self.database.lock:
+            if partition_key is None:
+                docs = list(self._items.values())
+            else:
+                wanted = _key(partition_key)
+                docs = [doc for key, doc in self._items.items() if key[0] == wanted]
+            return _QueryResult(compiled.run(docs, parameters), max_item_count)
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        """Apply a transactional batch: every operation succeeds or none does."""
+        handlers = {
+            "create": lambda body: self.create_item(body),
+            "upsert": lambda body: self.upsert_item(body),
+            "replace": lambda item, body: self.replace_item(item, body),
+            "read": lambda item: self.read_item(item, partition_key),
+            "delete": lambda item: self.delete_item(item, partition_key),
+            "patch": lambda item, operations, **options: self.patch_item(item, partition_key, operations, **options),
+        }
+        with self.database.transaction():
+            snapshot = dict(self._items)
+            try:
+                results = []
+                for operation in batch_operations:
+                    name, args = operation[0], operation[1]
+                    options = dict(operation[2]) if len(operation) > 2 else {}
+                    if name in ("create", "upsert", "replace"):
+                        body = args[-1]
+                        if _partition_value(body, self.partition_key_path) != partition_key:
+                            raise ValueError("Batch operation targets a different partition key")
+                    if name == "patch":
+                        resource = handlers[name](*args, filter_predicate=options.get("filter_predicate"))
+                    else:
+                        resource = handlers[name](*args)
+                    results.append({"statusCode": 200, "resourceBody": resource})
+                return results
+            except Exception:
+                self._items = snapshot
+                raise
+
+    def bulk_write(self, operation: str, docs: list) -> list:
+        """Fast path for storage.ContainerClient bulk writes: one lock, one commit."""
+        write = self.create_item if operation == "create" else self.upsert_item
+        with self.database.transaction():
+            snapshot = dict(self._items)
+            try:
+                return [write(doc) for doc in docs]
+            except Exception:
+                self._items = snapshot
+                raise
+
+    def read_all_items(self, **kwargs):
+        with self.database.lock:
+            return [copy.deepcopy(doc) for doc in self._items.values()]
+
+
+class LocalDatabase:
+    """Holds local containers and, for file paths, their SQLite persistence."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.lock = threading.RLock()
+        self._containers = {}
+        self._conn = None
+        self._transaction_depth = 0
+        if path and path != ":memory:":
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "container TEXT NOT NULL, pk TEXT NOT NULL, id TEXT NOT NULL, "
+                "body TEXT NOT NULL, PRIMARY KEY (container, pk, id))"
+            )
+            self._conn.commit()
+
+    def get_container_client(self, name: str, partition_key_path: str = "/id") -> LocalContainer:
+        with self.lock:
+            container = self._containers.get(name)
+            if container is None:
+                container = LocalContainer(self, name, partition_key_path)
+                self._containers[name] = container
+                self._load(container)
+            return container
+
+    def _load(self, container: LocalContainer):
+        if self._conn is None:
+            return
+        rows = self._conn.execute(
+            "SELECT pk, id, body FROM documents WHERE container = ?", (container.id,)
+        )
+        for pk, doc_id, body in rows:
+            container._items[(pk, doc_id)] = json.loads(body)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes into one SQLite commit (rolled back if the block raises)."""
+        with self.lock:
+            self._transaction_depth += 1
+            try:
+                yield
+            except Exception:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0 and self._conn is not None:
+                    self._conn.rollback()
+                raise
+            self._transaction_depth -= 1
+            self._commit()
+
+    def _commit(self):
+        if self._conn is not None and self._transaction_depth == 0:
+            self._conn.commit()
+
+    def _persist(self, container_name: str, key, doc: dict):
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents (container, pk, id, body) VALUES (?, ?, ?, ?)",
+            (container_name, key[0], key[1], json.dumps(doc)),
+        )
+        self._commit()
+
+    def _remove(self, container_name: str, key):
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "DELETE FROM documents WHERE container = ? AND pk = ? AND id = ?",
+            (container_name, key[0], key[1]),
+        )
+        self._commit()
@@ -0,0 +1,206 @@
+# migrate_layout.py
+
+"""
+Online migration of the main container to the user-partitioned layout
+(see storage_layout.py).
+
+    1. Create the user-partitioned container (partition key /pk) and deploy
+       with STORAGE_LAYOUT=dual, so every write from then on reaches both.
+    2. python migrate_layout.py copy
+       Copies every legacy document that isn't in the new container yet. The
+       position is checkpointed after each page, so an interrupted run
+       resumes where it stopped (--restart starts over).
+    3. python migrate_layout.py verify --fix
+       Compares both containers, repairs differences, and marks every user
+       whose documents match. Marked users are served from the new container
+       immediately; the rest stay on the legacy one. Re-run until it reports
+       no problems.
+    4. Deploy with STORAGE_LAYOUT=user. The legacy container is no longer
+       written and can be dropped once you no longer need to roll back.
+
+python migrate_layout.py status shows the checkpoint and migrated users.
+"""
+
+import argparse
+import contextvars
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
+
+from database import _container
+from storage import BULK_CONCURRENCY, MAX_PAGE_SIZE
+from storage_layout import MARKER_TYPE, SYSTEM_PROPERTIES, owner_key, to_legacy, to_partitioned
+
+CHECKPOINT_ID = "layout_migration"
+CHECKPOINT_TYPE = "layout_checkpoint"
+BOOKKEEPING_TYPES = (MARKER_TYPE, CHECKPOINT_TYPE)
+# Keyed by their own id and always copied along; not users to cut over
+UNOWNED_TYPES = ("session", "reset_token")
+
+_legacy = _container.legacy
+_partitioned = _container.partitioned
+
+
+def _content(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key not in SYSTEM_PROPERTIES and key != "pk"}
+
+
+def _pages(container, query: str, page_size: int, cursor=None):
+    """Yield (documents, cursor after them) for a cross-partition query."""
+    while True:
+        docs, cursor = container.query_page(query, None, page_size, cursor, enable_cross_partition_query=True)
+        yield docs, cursor
+        if not cursor:
+            return
+
+
+def _parallel(work, items):
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as executor:
+        return list(executor.map(lambda item: contextvars.copy_context().run(work, item), items))
+
+
+def load_checkpoint() -> dict:
+    try:
+        return _partitioned.read_item(item=CHECKPOINT_ID, partition_key=CHECKPOINT_ID)
+    except CosmosResourceNotFoundError:
+        return {"id": CHECKPOINT_ID, "pk": CHECKPOINT_ID, "type": CHECKPOINT_TYPE, "cursor": None, "copied": 0, "skipped": 0}
+
+
+def migrated_users() -> set:
+    query = f"SELECT c.pk FROM c WHERE c.type = '{MARKER_TYPE}'"
+    return {row["pk"] for row in _partitioned.query_items(query=query, enable_cross_partition_query=True)}
+
+
+def copy_documents(page_size: int, restart: bool = False) -> dict:
+    """
+    Copy legacy documents into the user-partitioned container.
+
+    Documents already there are left alone: in the dual phase they were written
+    by the application after the copy started and are newer than ours.
+    """
+    checkpoint = load_checkpoint()
+    if restart or checkpoint.get("completed_at"):
+        checkpoint.update(cursor=None, copied=0, skipped=0, completed_at=None)
+
+    def copy_one(doc):
+        try:
+            _partitioned.create_item(body=to_partitioned(doc))
+            return True
+        except CosmosResourceExistsError:
+            return False
+
+    for docs, cursor in _pages(_legacy, "SELECT * FROM c", page_size, checkpoint.get("cursor")):
+        created = _parallel(copy_one, docs)
+        checkpoint["copied"] += sum(created)
+        checkpoint["skipped"] += len(created) - sum(created)
+        checkpoint["cursor"] = cursor
+        checkpoint["updated_at"] = datetime.datetime.utcnow().isoformat()
+        if not cursor:
+            checkpoint["completed_at"] = checkpoint["updated_at"]
+        checkpoint = _partitioned.upsert_item(body=checkpoint)
+        print(f"Copied {checkpoint['copied']} documents ({checkpoint['skipped']} already present)")
+    return checkpoint
+
+
+def verify(page_size: int, fix: bool = False) -> dict:
+    """
+    Compare both containers and mark the users whose documents match.
+
+    For users already marked the user-partitioned container is authoritative
+    (it takes their writes first), otherwise the legacy container is; with fix
+    the other side is repaired from it.
+    """
+    marked = migrated_users()
+    owners = set()
+    problems = set()
+    report = {"checked": 0, "missing": 0, "different": 0, "extra": 0, "repaired": 0}
+
+    def check_legacy(doc):
+        owner = owner_key(doc)
+        try:
+            copy = _partitioned.read_item(item=doc["id"], partition_key=owner)
+        except CosmosResourceNotFoundError:
+            copy = None
+        if doc.get("type") in UNOWNED_TYPES:
+            owner = None
+        if copy is not None and _content(copy) == _content(doc):
+            return owner, None
+        problem = "missing" if copy is None else "different"
+        if fix:
+            if owner in marked and copy is not None:
+                _legacy.upsert_item(body=to_legacy(copy))
+            else:
+                _partitioned.upsert_item(body=to_partitioned(doc))
+        return owner, problem
+
+    def check_partitioned(doc):
+        owner = owner_key(doc)
+        try:
+            _legacy.read_item(item=doc["id"], partition_key=doc["id"])
+            return owner, None
+        except CosmosResourceNotFoundError:
+            pass
+        if fix:
+            if owner in marked:
+                _legacy.upsert_item(body=to_legacy(doc))
+            else:
+                _partitioned.delete_item(item=doc["id"], partition_key=owner)
+        return owner, "extra"
+
+    for docs, _ in _pages(_legacy, "SELECT * FROM c", page_size):
+        for owner, problem in _parallel(check_legacy, docs):
+            if owner is not None:
+                owners.add(owner)
+            report["checked"] += 1
+            if problem:
+                report[problem] += 1
+                if fix:
+                    report["repaired"] += 1
+                else:
+                    problems.add(owner)
+
+    for docs, _ in _pages(_partitioned, "SELECT * FROM c", page_size):
+        docs = [doc for doc in docs if doc.get("type") not in BOOKKEEPING_TYPES]
+        for owner, problem in _parallel(check_partitioned, docs):
+            if problem:
+                report[problem] += 1
+                if fix:
+                    report["repaired"] += 1
+                else:
+                    problems.add(owner)
+
+    newly_marked = list(owners - problems - marked)
+    _parallel(_container.mark_migrated, newly_marked)
+    report["users"] = len(owners)
+    report["newly_migrated"] = len(newly_marked)
+    report["unverified"] = len(problems)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the main container to the user-partitioned layout")
+    parser.add_argument("command", choices=["copy", "verify", "status"])
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument("--restart", action="store_true", help="copy: ignore the checkpoint and start over")
+    parser.add_argument("--fix", action="store_true", help="verify: repair differences before marking users")
+    args = parser.parse_args()
+
+    if _container.layout != "dual":
+        print(f"Warning: STORAGE_LAYOUT is '{_container.layout}'; run the migration while the app uses 'dual'")
+
+    if args.command == "copy":
+        checkpoint = copy_documents(args.page_size, args.restart)
+        print(f"Copy complete: {checkpoint['copied']} copied, {checkpoint['skipped']} already present")
+    elif args.command == "verify":
+        report = verify(args.page_size, args.fix)
+        print(", ".join(f"{key}={value}" for key, value in report.items()))
+    else:
+        checkpoint = load_checkpoint()
+        print(f"Copy: {checkpoint['copied']} copied, {checkpoint['skipped']} skipped, "
+              f"{'complete at ' + checkpoint['completed_at'] if checkpoint.get('completed_at') else 'in progress'}")
+        print(f"Migrated users: {len(migrated_users())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# migrate_majors.py
+
+"""
+Replace the "majors" list embedded in university documents written before the
+majors dictionary (every major with its counter, mostly zero) with sparse
+major_counts keyed by dictionary id (see database.major_id).
+
+Compaction converts a university whenever its counters change; this converts
+the rest. Safe to run while the app is serving and to re-run.
+
+    python migrate_majors.py            convert every remaining university
+    python migrate_majors.py --dry-run  only count them
+"""
+
+import argparse
+
+from database import _uni_container, _university_catalog, major_id, optimistic_update
+
+_EMBEDDED_QUERY = "SELECT c.id FROM c WHERE NOT IS_DEFINED(c.type) AND IS_DEFINED(c.majors)"
+
+
+def convert(uni_doc: dict):
+    """Fold a university document's majors list into its major_counts, in place."""
+    if "majors" not in uni_doc:
+        return False
+    major_counts = uni_doc.setdefault("major_counts", {})
+    for major in uni_doc.pop("majors"):
+        if major.get("counter"):
+            key = major_id(major["major_name"], create=True)
+            major_counts[key] = major_counts.get(key, 0) + major["counter"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace embedded majors lists with sparse major counts")
+    parser.add_argument("--dry-run", action="store_true", help="only report the universities left to convert")
+    args = parser.parse_args()
+
+    universities = [row["id"] for row in _uni_container.query_items(query=_EMBEDDED_QUERY, enable_cross_partition_query=True)]
+    print(f"{len(universities)} universities still embed a majors list")
+    if args.dry_run:
+        return
+
+    for university_id in universities:
+        optimistic_update(_uni_container, university_id, university_id, convert)
+    _university_catalog.invalidate()
+    print(f"Converted {len(universities)} universities")
+
+
+if __name__ == "__main__":
+    main()
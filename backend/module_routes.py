@@ -1,12 +1,14 @@
 import json
 import azure.functions as func
-from database import get_user_by_email, _container, get_university_doc, get_user_modules
+from database import get_user_by_email, _container, get_university_doc, get_user_modules, read_document, delete_document
 from user_routes import verify_session
 from database import update_university_module_data, search_modules_for_university, get_user_by_email, get_user_modules
 from models import Module, Assessment, Examination
 import uuid
 from datetime import datetime
-from database import increment_university_and_major_counter, get_modules_with_stats
+from database import increment_university_and_major_counter, get_modules_with_stats, push_recent_activity, normalize_module_name, get_module_cohorts
+from storage import page_params
+from resilience import non_critical
 
 
 
@@ -17,11 +19,17 @@ def get_all_modules(req: func.HttpRequest) -> func.HttpResponse:
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
 
+    try:
+        page_size, cursor = page_params(req.params)
+    except ValueError as e:
+        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+
     try:
         # Get optional query parameters for filtering
         year = req.params.get('year')
         semester = req.params.get('semester')
         status = req.params.get('status')
+        with_cohort = req.params.get('cohort') == 'true'
 
         # Start with base query
         query = "SELECT * FROM c WHERE c.type = 'module' AND c.user_email = @email"
@@ -40,12 +48,20 @@ def get_all_modules(req: func.HttpRequest) -> func.HttpResponse:
             query += " AND c.status = @status"
             parameters.append({"name": "@status", "value": status})
 
+        if page_size:
+            modules, next_cursor = _container.query_page(query, parameters, page_size, cursor, partition_key=identity)
+            if with_cohort:
+                add_cohorts(modules)
+            return func.HttpResponse(json.dumps({"items": modules, "next_cursor": next_cursor}), status_code=200)
+
         # Execute query
         modules = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=identity
         ))
+        if with_cohort:
+            add_cohorts(modules)
 
         return func.HttpResponse(json.dumps(modules), status_code=200)
     except Exception as e:
@@ -62,23 +78,14 @@ def get_module(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(json.dumps({"error": "Module ID is required"}), status_code=400)
 
     try:
-        # Query specifically with partition key and user check
-        query = "SELECT * FROM c WHERE c.id = @id AND c.user_email = @email AND c.type = 'module'"
-        parameters = [
-            {"name": "@id", "value": module_id},
-            {"name": "@email", "value": identity}
-        ]
+        # Point read by id, then check ownership
+        module = read_document(module_id, identity, "module")
 
-        modules = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-
-        if not modules:
+        if not module:
             return func.HttpResponse(json.dumps({"error": "Module not found or access denied"}), status_code=404)
 
-        return func.HttpResponse(json.dumps(modules[0]), status_code=200)
+        add_cohorts([module])
+        return func.HttpResponse(json.dumps(module), status_code=200)
     except Exception as e:
         return func.HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
@@ -94,50 +101,37 @@ def delete_module(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         # Verify ownership and get module details before deletion
-        query = "SELECT * FROM c WHERE c.id = @id AND c.user_email = @email AND c.type = 'module'"
-        parameters = [
-            {"name": "@id", "value": module_id},
-            {"name": "@email", "value": identity}
-        ]
+        module_to_delete = read_document(module_id, identity, "module")
 
-        existing_modules = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-
-        if not existing_modules:
+        if not module_to_delete:
             return func.HttpResponse(json.dumps({"error": "Module not found or access denied"}), status_code=404)
         
-        module_to_delete = existing_modules[0]
-        
         # Add activity for module deletion
         module_obj = Module(**module_to_delete)
         add_module_activity(identity, module_obj, "Module Deleted")
 
         # Delete from database
-        _container.delete_item(item=module_id, partition_key=module_id)
+        delete_document(module_id, identity)
         
         return func.HttpResponse(json.dumps({"message": "Module deleted successfully"}), status_code=200)
     except Exception as e:
         return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
 
+def add_cohorts(modules):
+    """Add each module's percentile against its cohort (see database.get_module_cohort)"""
+    try:
+        # None when shed
+        cohorts = non_critical(get_module_cohorts)(modules) or [None] * len(modules)
+    except Exception as e:
+        print(f"Error getting module cohorts: {str(e)}")
+        cohorts = [None] * len(modules)
+    for module, cohort in zip(modules, cohorts):
+        module["cohort"] = cohort
+
+@non_critical
 def add_module_activity(user_email, module, activity_type):
     """Add an activity related to module changes to the user's dashboard"""
     try:
-        user_doc = get_user_by_email(user_email)
-        
-        if not user_doc:
-            return
-            
-        # Initialize dashboardConfig if it doesn't exist
-        if "dashboardConfig" not in user_doc:
-            user_doc["dashboardConfig"] = {}
-            
-        # Initialize recentActivities if it doesn't exist
-        if "recentActivities" not in user_doc["dashboardConfig"]:
-            user_doc["dashboardConfig"]["recentActivities"] = []
-            
         # Create activity item
         activity = {
             "type": "grade",  # grade type for module-related activities
@@ -146,15 +140,8 @@ def add_module_activity(user_email, module, activity_type):
             "time": "Just now"
         }
         
-        # Insert activity at the beginning of the list
-        user_doc["dashboardConfig"]["recentActivities"].insert(0, activity)
-        
-        # Limit list to 10 most recent activities
-        user_doc["dashboardConfig"]["recentActivities"] = \
-            user_doc["dashboardConfig"]["recentActivities"][:10]
-            
-        # Update user document
-        _container.upsert_item(user_doc)
+        # Insert activity at the beginning of the list (kept to the 10 most recent)
+        push_recent_activity(user_email, activity)
         
     except Exception as e:
         print(f"Error adding module activity: {str(e)}")
@@ -174,7 +161,7 @@ def get_modules_by_year_semester(req: func.HttpRequest) -> func.HttpResponse:
         modules = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=identity
         ))
 
         # Organize modules by year and semester
@@ -354,6 +341,8 @@ def create_module(req: func.HttpRequest) -> func.HttpResponse:
 
         # Get module data from request
         module_data = req.get_json()
+        if "name" in module_data:
+            module_data["name"] = normalize_module_name(module_data["name"])
 
         module_data["user_email"] = identity
         module_data["type"] = "module"
@@ -445,22 +434,10 @@ def update_module(req: func.HttpRequest) -> func.HttpResponse:
         module_data = req.get_json()
 
         # Verify ownership
-        query = "SELECT * FROM c WHERE c.id = @id AND c.user_email = @email AND c.type = 'module'"
-        parameters = [
-            {"name": "@id", "value": module_id},
-            {"name": "@email", "value": identity}
-        ]
+        existing_module = read_document(module_id, identity, "module")
 
-        existing_modules = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-
-        if not existing_modules:
+        if not existing_module:
             return func.HttpResponse(json.dumps({"error": "Module not found or access denied"}), status_code=404)
-
-        existing_module = existing_modules[0]
         
         # Store old score for analytics updates
         old_score = existing_module.get("score", 0)
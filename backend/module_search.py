@@ -0,0 +1,262 @@
+# module_search.py
+
+"""
+Inverted index over the module statistics documents of every university, for
+GradeRadar module search.
+
+Each module is indexed by the trigrams of its normalized name and code (see
+university_search.normalize), plus the university it belongs to. A query
+is split into words. Candidates are the modules holding every trigram of
+each word of three or more characters, and every word must occur in the
+name or code. Modules are then ranked:
+
+    code equals the query, code starts with it, name equals it, name starts
+    with it, a word of the name starts with it, it occurs in the name, then
+    modules that only match word by word
+
+Ties go to the module with more students, then alphabetically. Only the top
+limit results are ranked in full.
+
+The same index finds near-duplicates within a (university, degree) for
+module creation (similar): names are reduced to a canonical form (see
+canonical_name), candidates are the modules of that degree sharing a trigram
+with it, and the best one whose trigram Jaccard similarity reaches
+MODULE_SIMILARITY_THRESHOLD is returned. "Programming 1" and "Programming I"
+are the same module, "Programming 1" and "Programming 2" are not, nor are "Physics A"
+and "Physics B". Only modules whose canonical forms are equal (exact=True)
+are the same module; looser matches are only worth pointing out.
+
+The index is kept up to date incrementally: the module statistics catalog
+hands it the documents changed since its last refresh (apply_module_stats),
+and the university catalog hands it changed university documents, whose
+module statistics are indexed until they are split into their own documents
+(apply_universities).
+"""
+
+import collections
+import heapq
+import os
+import threading
+
+from university_search import GRAM, grams, normalize
+
+CODE_EXACT, CODE_PREFIX, NAME_EXACT, NAME_PREFIX, WORD_PREFIX, SUBSTRING, WORDS = range(7)
+
+MODULE_SIMILARITY_THRESHOLD = float(os.environ.get("MODULE_SIMILARITY_THRESHOLD", "0.7"))
+
+_NUMERALS = {
+    "i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5", "vi": "6", "vii": "7", "viii": "8", "ix": "9", "x": "10",
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10"
+}
+_STOPWORDS = {"a", "an", "and", "for", "in", "of", "the", "to", "with"}
+
+
+def canonical_name(name: str) -> tuple:
+    """
+    (words, qualifiers) of a module name: normalized words without stopwords,
+    and its qualifiers - numbers (roman numerals and number words spelled as
+    digits), single letters and letter-digit tokens such as "1a". Modules that
+    differ in their qualifiers are different modules.
+    """
+    words = []
+    qualifiers = []
+    tokens = normalize(name).split()
+    for position, word in enumerate(tokens):
+        word = _NUMERALS.get(word, word)
+        if word.isdigit():
+            qualifiers.append(str(int(word)))
+        elif len(word) == 1 and word.isalpha():
+            # "a" followed by another word is the article, not "Physics A"
+            if word != "a" or position == len(tokens) - 1:
+                qualifiers.append(word)
+        elif word.isalnum() and any(c.isdigit() for c in word):
+            qualifiers.append(word)
+        elif word not in _STOPWORDS:
+            words.append(word)
+    return " ".join(words), tuple(sorted(qualifiers))
+
+
+def _similarity_grams(words: str) -> set:
+    # Names shorter than a trigram are compared whole
+    return grams(words) or {words}
+
+
+class _Entry:
+    __slots__ = ("doc", "name", "code", "text", "legacy", "scope", "words", "qualifiers", "similarity_grams")
+
+    def __init__(self, doc: dict, legacy: bool):
+        self.doc = doc
+        self.name = normalize(doc.get("name", ""))
+        self.code = normalize(doc.get("code", ""))
+        self.text = f"{self.name} {self.code}"
+        self.legacy = legacy
+        self.scope = (doc.get("university"), doc.get("degree"))
+        self.words, self.qualifiers = canonical_name(doc.get("name", ""))
+        self.similarity_grams = _similarity_grams(self.words)
+
+
+class ModuleSearchIndex:
+    def __init__(self, legacy_docs=None):
+        """
+        legacy_docs(university_doc) returns the module statistics embedded in a
+        university document written before the split, as documents.
+        """
+        self._legacy_docs = legacy_docs
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._postings = {}
+        self._by_university = {}
+        # (university, degree) -> canonical name trigram -> ids
+        self._similarity = {}
+        # university -> ids indexed from its embedded statistics
+        self._legacy = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        for gram in grams(entry.text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+        members = self._by_university.get(entry.doc.get("university"))
+        if members is not None:
+            members.discard(doc_id)
+        scope = self._similarity.get(entry.scope, {})
+        for gram in entry.similarity_grams:
+            posting = scope.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del scope[gram]
+
+    def _put(self, doc: dict, legacy: bool = False):
+        self._remove(doc["id"])
+        entry = _Entry(doc, legacy)
+        self._entries[doc["id"]] = entry
+        for gram in grams(entry.text):
+            self._postings.setdefault(gram, set()).add(doc["id"])
+        self._by_university.setdefault(doc.get("university"), set()).add(doc["id"])
+        scope = self._similarity.setdefault(entry.scope, {})
+        for gram in entry.similarity_grams:
+            scope.setdefault(gram, set()).add(doc["id"])
+
+    def apply_module_stats(self, changed: list, full: bool):
+        """Index module statistics documents changed since the last refresh (all of them when full)."""
+        with self._lock:
+            if full:
+                for doc_id in [doc_id for doc_id, entry in self._entries.items() if not entry.legacy]:
+                    self._remove(doc_id)
+            for doc in changed:
+                self._put(doc)
+
+    def apply_universities(self, changed: list, full: bool):
+        """Index the embedded module statistics of changed university documents."""
+        with self._lock:
+            for uni_doc in changed:
+                docs = {doc["id"]: doc for doc in self._legacy_docs(uni_doc)} if "degrees" in uni_doc else {}
+                for doc_id in self._legacy.pop(uni_doc["id"], set()) - set(docs):
+                    entry = self._entries.get(doc_id)
+                    # Once split, the module's own document has taken the id over
+                    if entry is not None and entry.legacy:
+                        self._remove(doc_id)
+                for doc_id, doc in docs.items():
+                    entry = self._entries.get(doc_id)
+                    if entry is None or entry.legacy:
+                        self._put(doc, legacy=True)
+                if docs:
+                    self._legacy[uni_doc["id"]] = set(docs)
+
+    def _candidates(self, words: list, university: str = None):
+        sets = []
+        if university is not None:
+            sets.append(self._by_university.get(university, set()))
+        for word in words:
+            if len(word) < GRAM:
+                continue
+            for gram in grams(word):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    return set()
+                sets.append(posting)
+        if not sets:
+            return self._entries.keys()
+        sets.sort(key=len)
+        candidates = set(sets[0])
+        for other in sets[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                break
+        return candidates
+
+    @staticmethod
+    def _rank(query: str, words: list, entry: _Entry):
+        if not all(word in entry.text for word in words):
+            return None
+        if entry.code and entry.code == query:
+            return CODE_EXACT
+        if entry.code.startswith(query):
+            return CODE_PREFIX
+        if entry.name == query:
+            return NAME_EXACT
+        if entry.name.startswith(query):
+            return NAME_PREFIX
+        if f" {query}" in entry.name:
+            return WORD_PREFIX
+        if query in entry.name:
+            return SUBSTRING
+        return WORDS
+
+    def search(self, query: str = None, university: str = None, limit: int = 10) -> list:
+        """
+        Module statistics documents matching query (every module when empty),
+        optionally of one university, best first.
+        """
+        if limit <= 0:
+            return []
+        query = normalize(query)
+        words = query.split()
+        with self._lock:
+            ranked = []
+            for doc_id in self._candidates(words, university):
+                entry = self._entries[doc_id]
+                rank = self._rank(query, words, entry) if words else WORDS
+                if rank is not None:
+                    ranked.append((rank, -entry.doc.get("student_counter", 0), entry.name, doc_id))
+            return [self._entries[doc_id].doc for *_, doc_id in heapq.nsmallest(limit, ranked)]
+
+    def similar(self, university: str, degree: str, name: str, code: str = None,
+                threshold: float = MODULE_SIMILARITY_THRESHOLD, exact: bool = False):
+        """
+        The module statistics document of the degree most similar to a module
+        with this name and code, or None; with exact, only one with the same
+        canonical name. Modules whose codes are both given and differ are
+        never similar.
+        """
+        words, qualifiers = canonical_name(name)
+        query_grams = _similarity_grams(words)
+        code = normalize(code)
+        with self._lock:
+            scope = self._similarity.get((university, degree))
+            if not scope:
+                return None
+            shared = collections.Counter()
+            for gram in query_grams:
+                shared.update(scope.get(gram, ()))
+
+            best, best_score = None, threshold
+            for doc_id, count in shared.items():
+                entry = self._entries[doc_id]
+                if entry.qualifiers != qualifiers or (code and entry.code and entry.code != code):
+                    continue
+                if exact and entry.words != words:
+                    continue
+                score = count / (len(query_grams) + len(entry.similarity_grams) - count)
+                if score >= best_score:
+                    best, best_score = entry.doc, score
+            return best
@@ -24,7 +24,7 @@ def get_onboarding_status(req: func.HttpRequest) -> func.HttpResponse:
         
         # Check if has any modules
         query = f"SELECT COUNT(1) as count FROM c WHERE c.type = 'module' AND c.user_email = '{identity}'"
-        results = list(_container.query_items(query=query, enable_cross_partition_query=True))
+        results = list(_container.query_items(query=query, partition_key=identity))
         has_modules = results[0]['count'] > 0 if results else False
 
         # Determine actual completion status - a user might have skipped the formal onboarding
@@ -0,0 +1,85 @@
+# rebuild_score_sketches.py
+
+"""
+Build the score sketches (see score_sketch.py) of modules scored before they
+were kept.
+
+Sketches are updated with every score from then on, but a module's statistics
+document only gains one when the scores it already counts are recounted from
+the students' modules. A sketch is written only when the recount matches the
+document's student_counter at the time of the write, so the script is safe to
+run while the app is serving and to re-run; modules that don't match (scores
+deleted since, or counted under a near-duplicate name) are reported and keep
+serving averages without percentiles.
+
+    python rebuild_score_sketches.py            write the missing sketches
+    python rebuild_score_sketches.py --dry-run  only report them
+"""
+
+import argparse
+
+import score_sketch
+from database import (
+    _container,
+    _uni_container,
+    _find_university_doc,
+    get_grade_range,
+    module_stats_id,
+    normalize_module_name,
+    optimistic_update,
+    MODULE_STATS_TYPE,
+)
+
+_SCORES_QUERY = "SELECT c.university, c.degree, c.name, c.code, c.score FROM c WHERE c.type = 'module' AND IS_DEFINED(c.score)"
+_UNSKETCHED_QUERY = "SELECT c.id, c.student_counter FROM c WHERE c.type = @type AND NOT IS_DEFINED(c.score_sketch)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build score sketches for modules scored before they were kept")
+    parser.add_argument("--dry-run", action="store_true", help="only report the modules without a sketch")
+    args = parser.parse_args()
+
+    parameters = [{"name": "@type", "value": MODULE_STATS_TYPE}]
+    unsketched = {
+        doc["id"]: doc.get("student_counter", 0)
+        for doc in _uni_container.query_items(query=_UNSKETCHED_QUERY, parameters=parameters, enable_cross_partition_query=True)
+    }
+    print(f"{len(unsketched)} modules have no score sketch")
+    if args.dry_run or not unsketched:
+        return
+
+    universities = {}
+    sketches = {}
+    for module in _container.query_items(query=_SCORES_QUERY, enable_cross_partition_query=True):
+        if not module.get("university") or not module.get("degree") or module.get("score") is None:
+            continue
+        if module["university"] not in universities:
+            universities[module["university"]] = _find_university_doc(module["university"])
+        uni_doc = universities[module["university"]]
+        if not uni_doc:
+            continue
+        module_key = module.get("code") or normalize_module_name(module.get("name"))
+        stats_id = module_stats_id(uni_doc["id"], module["degree"], module_key)
+        if stats_id in unsketched:
+            score_sketch.add(sketches.setdefault(stats_id, score_sketch.empty()), module["score"])
+
+    written = 0
+    for stats_id in unsketched:
+        sketch = sketches.get(stats_id, score_sketch.empty())
+
+        def set_sketch(module_stats, sketch=sketch):
+            if "score_sketch" in module_stats or module_stats.get("student_counter", 0) != sketch["count"]:
+                return False
+            module_stats["score_sketch"] = sketch
+            module_stats["grade_distribution"] = score_sketch.grade_distribution(sketch, get_grade_range)
+
+        stored = optimistic_update(_uni_container, stats_id, stats_id, set_sketch)
+        if stored and "score_sketch" in stored:
+            written += 1
+        else:
+            print(f"Skipped {stats_id}: {sketch['count']} scores found, {unsketched[stats_id]} counted")
+    print(f"Wrote {written} score sketches")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,9 @@
 import azure.functions as func
 import json
 from datetime import datetime, timedelta
-from database import _container
+from database import _container, read_document, delete_document
 from user_routes import verify_session
+from storage import page_params
 from email_service import send_reminder_email
 
 def create_reminder(req: func.HttpRequest) -> func.HttpResponse:
@@ -49,15 +50,24 @@ def get_reminders(req: func.HttpRequest) -> func.HttpResponse:
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
     
+    try:
+        page_size, cursor = page_params(req.params)
+    except ValueError as e:
+        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+
     try:
         # Query reminders for the user
         query = "SELECT * FROM c WHERE c.type = 'reminder' AND c.user_email = @email"
         parameters = [{"name": "@email", "value": identity}]
         
+        if page_size:
+            reminders, next_cursor = _container.query_page(query, parameters, page_size, cursor, partition_key=identity)
+            return func.HttpResponse(json.dumps({"items": reminders, "next_cursor": next_cursor}), status_code=200)
+
         reminders = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=identity
         ))
         
         return func.HttpResponse(json.dumps(reminders), status_code=200)
@@ -76,23 +86,13 @@ def delete_reminder(req: func.HttpRequest) -> func.HttpResponse:
     
     try:
         # First verify the reminder belongs to the user
-        query = "SELECT * FROM c WHERE c.id = @id AND c.user_email = @email AND c.type = 'reminder'"
-        parameters = [
-            {"name": "@id", "value": reminder_id},
-            {"name": "@email", "value": identity}
-        ]
+        reminder = read_document(reminder_id, identity, "reminder")
         
-        reminders = list(_container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-        
-        if not reminders:
+        if not reminder:
             return func.HttpResponse(json.dumps({"error": "Reminder not found or access denied"}), status_code=404)
         
         # Delete the reminder
-        _container.delete_item(item=reminder_id, partition_key=reminder_id)
+        delete_document(reminder_id, identity)
         
         return func.HttpResponse(json.dumps({"message": "Reminder deleted successfully"}), status_code=200)
     except Exception as e:
@@ -170,7 +170,7 @@ def create_event_reminder(req: func.HttpRequest) -> func.HttpResponse:
         events = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=identity
         ))
         
         if not events:
@@ -0,0 +1,168 @@
+# request_cache.py
+
+"""
+Per-request identity map for the hot read paths.
+
+Functions decorated with @memoize_per_request return the same result for the
+same arguments within one HTTP invocation instead of going back to Cosmos, e.g.
+the dashboard reads the user document and module list several times per call.
+Outside a request scope (timers, scripts) the decorator is a no-op.
+
+Writes go through storage.ContainerClient, which calls invalidate_document()
+so a request that mutates a document sees fresh data on its next read.
+"""
+
+import contextvars
+import copy
+import functools
+import inspect
+import threading
+
+from azure.functions import HttpRequest
+
+import data_metrics
+import resilience
+
+_current_scope = contextvars.ContextVar("request_cache_scope", default=None)
+
+
+class _RequestScope:
+    def __init__(self):
+        self.lock = threading.RLock()
+        # owner (user email) -> {cache key: value}
+        self.entries = {}
+        # (owner, cache key) -> _Flight for reads currently running
+        self.inflight = {}
+        # Bumped by every invalidation so a read that overlapped a write isn't cached
+        self.generation = 0
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+def request_scoped(handler):
+    """
+    Run a function handler with a fresh request cache, attributing its data access
+    metrics to the handler and answering 503 when the data store is unavailable.
+    """
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            token = _current_scope.set(_RequestScope())
+            metrics_token = data_metrics.begin_request(handler.__name__)
+            resilience_token = resilience.begin_request()
+            response = None
+            try:
+                response = await handler(*args, **kwargs)
+            except resilience.DataUnavailableError as e:
+                if not _is_http(args, kwargs):
+                    raise
+                response = resilience.unavailable_response(e)
+            finally:
+                response = resilience.end_request(resilience_token, response)
+                data_metrics.end_request(metrics_token)
+                _current_scope.reset(token)
+            return response
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        token = _current_scope.set(_RequestScope())
+        metrics_token = data_metrics.begin_request(handler.__name__)
+        resilience_token = resilience.begin_request()
+        response = None
+        try:
+            response = handler(*args, **kwargs)
+        except resilience.DataUnavailableError as e:
+            if not _is_http(args, kwargs):
+                raise
+            response = resilience.unavailable_response(e)
+        finally:
+            response = resilience.end_request(resilience_token, response)
+            data_metrics.end_request(metrics_token)
+            _current_scope.reset(token)
+        return response
+    return wrapper
+
+
+def _is_http(args, kwargs) -> bool:
+    return any(isinstance(arg, HttpRequest) for arg in list(args) + list(kwargs.values()))
+
+
+def memoize_per_request(func):
+    """
+    Cache a read function per request. The first argument must be the owning user's email.
+
+    Concurrent callers (async handlers fan reads out to threads) share a single
+    in-flight read instead of each issuing the same query.
+    """
+    @functools.wraps(func)
+    def wrapper(owner, *args, **kwargs):
+        scope = _current_scope.get()
+        if scope is None:
+            return func(owner, *args, **kwargs)
+
+        key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+        with scope.lock:
+            cached = scope.entries.get(owner, {})
+            if key in cached:
+                return copy.deepcopy(cached[key])
+            flight = scope.inflight.get((owner, key))
+            leader = flight is None
+            if leader:
+                flight = scope.inflight[(owner, key)] = _Flight()
+                generation = scope.generation
+
+        if not leader:
+            flight.done.wait()
+            if not flight.failed:
+                return copy.deepcopy(flight.result)
+            # The leader's read failed; try on our own so the error surfaces here too
+            return func(owner, *args, **kwargs)
+
+        try:
+            result = func(owner, *args, **kwargs)
+        except BaseException:
+            flight.failed = True
+            raise
+        else:
+            flight.result = copy.deepcopy(result)
+            with scope.lock:
+                if scope.generation == generation:
+                    scope.entries.setdefault(owner, {})[key] = flight.result
+            return result
+        finally:
+            with scope.lock:
+                scope.inflight.pop((owner, key), None)
+            flight.done.set()
+    return wrapper
+
+
+def invalidate(owner=None):
+    """Drop cached reads for one user, or everything when owner is None."""
+    scope = _current_scope.get()
+    if scope is None:
+        return
+    with scope.lock:
+        scope.generation += 1
+        if owner is None:
+            scope.entries.clear()
+        else:
+            scope.entries.pop(owner, None)
+
+
+def invalidate_document(body=None):
+    """Invalidate whatever a written document could affect."""
+    if _current_scope.get() is None:
+        return
+    if body is None:
+        # Deletes by id alone don't tell us the owner
+        invalidate()
+        return
+    owner = body.get("user_email") or body.get("email")
+    if owner:
+        invalidate(owner)
@@ -0,0 +1,297 @@
+# resilience.py
+
+"""
+Retry, deadline and circuit-breaker policy for data calls.
+
+Every container call made through storage.ContainerClient runs under
+execute(). Transient failures are retried with exponential backoff and full
+jitter, waiting at least as long as Cosmos asks in x-ms-retry-after-ms, until
+the attempt budget or the operation's deadline runs out. At that point a
+DataUnavailableError is raised instead of the raw Cosmos error, and
+request_scoped turns it into a 503 with Retry-After.
+
+Writes are only retried on statuses that guarantee nothing was applied (429,
+449, 503, or a request that never reached the service); a timed-out write may
+have succeeded, so it is reported rather than repeated.
+
+One circuit breaker per container sheds load in two stages:
+
+    degraded  - several throttles within SHED_WINDOW_SECONDS: work marked
+                @non_critical (activity feeds, analytics documents) is skipped
+                instead of competing with user-facing requests
+    open      - FAILURE_THRESHOLD consecutive failures: every call fails fast
+                (non-critical work is skipped) for RECOVERY_SECONDS, then a
+                single probe decides whether to close
+"""
+
+import collections
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import azure.functions as func
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.environ.get("RESILIENCE_MAX_ATTEMPTS", "5"))
+BASE_BACKOFF_SECONDS = float(os.environ.get("RESILIENCE_BASE_BACKOFF_MS", "100")) / 1000
+MAX_BACKOFF_SECONDS = float(os.environ.get("RESILIENCE_MAX_BACKOFF_MS", "2000")) / 1000
+
+# Total time an operation may spend including retries
+DEADLINE_SECONDS = {
+    "read": float(os.environ.get("RESILIENCE_READ_DEADLINE_SECONDS", "5")),
+    "query": float(os.environ.get("RESILIENCE_QUERY_DEADLINE_SECONDS", "10")),
+    "write": float(os.environ.get("RESILIENCE_WRITE_DEADLINE_SECONDS", "10")),
+}
+
+FAILURE_THRESHOLD = int(os.environ.get("RESILIENCE_FAILURE_THRESHOLD", "10"))
+RECOVERY_SECONDS = float(os.environ.get("RESILIENCE_RECOVERY_SECONDS", "15"))
+SHED_THROTTLE_THRESHOLD = int(os.environ.get("RESILIENCE_SHED_THROTTLES", "3"))
+SHED_WINDOW_SECONDS = float(os.environ.get("RESILIENCE_SHED_WINDOW_SECONDS", "10"))
+
+# Statuses that are safe to retry for any operation: the request was rejected
+# before it was applied
+THROTTLED = 429
+RETRY_ANY_STATUS = {THROTTLED, 449, 503}
+# Statuses where a write may or may not have been applied; only reads retry
+RETRY_READ_STATUS = {408, 500, 502, 504}
+
+
+class DataUnavailableError(Exception):
+    """The data store could not serve the call within its retry budget."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LoadShedError(DataUnavailableError):
+    """A non-critical call was skipped to leave capacity for user-facing requests."""
+
+
+_non_critical = contextvars.ContextVar("resilience_non_critical", default=False)
+# Errors raised while serving the current invocation (see request_cache.request_scoped)
+_request_errors = contextvars.ContextVar("resilience_request_errors", default=None)
+# Handlers fan reads out to threads that share the invocation's list
+_request_errors_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._throttles = collections.deque()
+
+    def before_call(self, critical: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                remaining = RECOVERY_SECONDS - (now - self._opened_at)
+                if not critical:
+                    # Skipped like under throttling; never the probe either
+                    raise LoadShedError(f"{self.name} circuit open; shedding non-critical work",
+                                        retry_after=max(remaining, 1.0))
+                if remaining > 0 or self._probing:
+                    raise DataUnavailableError(f"{self.name} circuit open", retry_after=max(remaining, 1.0))
+                # Half-open: this call is the probe
+                self._probing = True
+                return
+
+            if not critical:
+                while self._throttles and now - self._throttles[0] > SHED_WINDOW_SECONDS:
+                    self._throttles.popleft()
+                if len(self._throttles) >= SHED_THROTTLE_THRESHOLD:
+                    raise LoadShedError(f"{self.name} is throttling; shedding non-critical work")
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self, throttled: bool):
+        now = time.monotonic()
+        with self._lock:
+            self._consecutive_failures += 1
+            if throttled:
+                self._throttles.append(now)
+            if self._probing or (self._opened_at is None and self._consecutive_failures >= FAILURE_THRESHOLD):
+                logger.warning(f"Circuit for {self.name} opened after {self._consecutive_failures} failures")
+                self._opened_at = now
+                self._probing = False
+
+    def abandon_probe(self):
+        with self._lock:
+            self._probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _classify(error: Exception, kind: str):
+    """Return (retryable, throttled, retry_after_seconds) for a failed call."""
+    if isinstance(error, CosmosHttpResponseError):
+        status = error.status_code
+        retry_after = None
+        headers = getattr(error, "headers", None) or {}
+        if headers.get("x-ms-retry-after-ms"):
+            try:
+                retry_after = float(headers["x-ms-retry-after-ms"]) / 1000
+            except (TypeError, ValueError):
+                pass
+        if status in RETRY_ANY_STATUS:
+            return True, status == THROTTLED, retry_after
+        if status in RETRY_READ_STATUS and kind != "write":
+            return True, False, retry_after
+        return False, False, None
+    if isinstance(error, ServiceRequestError):
+        # The request never reached the service
+        return True, False, None
+    if isinstance(error, ServiceResponseError):
+        return kind != "write", False, None
+    return False, False, None
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** (attempt - 1))))
+
+
+def _unavailable(error: DataUnavailableError) -> DataUnavailableError:
+    errors = _request_errors.get()
+    if errors is not None:
+        with _request_errors_lock:
+            errors.append(error)
+    return error
+
+
+def execute(kind: str, call, breaker_name: str):
+    """
+    Run call() under the retry policy for its kind ("read", "query" or "write").
+
+    Non-retryable errors (404, 409, 412, ...) pass through unchanged; exhausted
+    retries and open circuits raise DataUnavailableError.
+    """
+    breaker = get_breaker(breaker_name)
+    critical = not _non_critical.get()
+    deadline = time.monotonic() + DEADLINE_SECONDS.get(kind, DEADLINE_SECONDS["write"])
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            breaker.before_call(critical)
+        except DataUnavailableError as e:
+            raise _unavailable(e)
+
+        try:
+            result = call()
+        except Exception as e:
+            retryable, throttled, retry_after = _classify(e, kind)
+            if not retryable:
+                # The service answered; the failure is about the request itself
+                if isinstance(e, CosmosHttpResponseError):
+                    breaker.record_success()
+                else:
+                    breaker.abandon_probe()
+                raise
+            breaker.record_failure(throttled)
+
+            if throttled and not critical:
+                raise _unavailable(LoadShedError(f"{breaker_name} throttled a non-critical call")) from e
+
+            delay = _backoff(attempt)
+            if retry_after is not None:
+                # Never retry sooner than the service asked; jitter spreads the herd
+                delay = max(delay, retry_after * random.uniform(1.0, 1.2))
+            if attempt >= MAX_ATTEMPTS or time.monotonic() + delay > deadline:
+                logger.warning(f"{kind} on {breaker_name} failed after {attempt} attempts: {e}")
+                raise _unavailable(DataUnavailableError(
+                    f"{breaker_name} unavailable: {e}",
+                    retry_after=max(retry_after or 0, 1.0)
+                )) from e
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
+
+
+def non_critical(work):
+    """
+    Mark the data calls made by work as sheddable.
+
+    While the store is throttling they are skipped rather than retried and work
+    returns None, so side effects like activity feeds and derived analytics never
+    compete with the request the user is waiting for.
+    """
+    @functools.wraps(work)
+    def wrapper(*args, **kwargs):
+        token = _non_critical.set(True)
+        try:
+            return work(*args, **kwargs)
+        except LoadShedError as e:
+            logger.warning(f"Skipped {work.__qualname__}: {e}")
+            return None
+        finally:
+            _non_critical.reset(token)
+            # Shedding is the intended outcome, not a failure of the request,
+            # even when work caught the error itself
+            errors = _request_errors.get()
+            if errors:
+                with _request_errors_lock:
+                    errors[:] = [e for e in errors if not isinstance(e, LoadShedError)]
+    return wrapper
+
+
+def begin_request():
+    """Start collecting data availability errors for the current invocation."""
+    return _request_errors.set([])
+
+
+def unavailable_response(error: DataUnavailableError, headers: dict = None) -> func.HttpResponse:
+    """503 telling the client when to retry."""
+    headers = dict(headers or {})
+    headers["Retry-After"] = str(max(1, int(error.retry_after + 0.999)))
+    return func.HttpResponse(
+        json.dumps({"error": "The service is busy. Please try again shortly."}),
+        status_code=503,
+        headers=headers,
+        mimetype="application/json"
+    )
+
+
+def end_request(token, response=None):
+    """
+    Finish an invocation started with begin_request.
+
+    Route handlers catch every exception and answer 500; when that 500 was
+    caused by the data store being unavailable, it is replaced by a 503 with
+    Retry-After so clients back off instead of treating it as a bug.
+    """
+    errors = _request_errors.get() or []
+    _request_errors.reset(token)
+    if not errors or not isinstance(response, func.HttpResponse) or response.status_code != 500:
+        return response
+    worst = max(errors, key=lambda e: e.retry_after)
+    return unavailable_response(worst, response.headers)
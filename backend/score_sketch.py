@@ -0,0 +1,116 @@
+# score_sketch.py
+
+"""
+Mergeable summaries of module scores.
+
+A sketch is a fixed-resolution histogram of percentage scores with the exact
+count and sum, stored as plain JSON in the module statistics documents:
+
+    {"count": 42, "sum": 2731.5, "bins": {"63": 4, "64": 2, ...}}
+
+Bin b holds the scores in [b, b + 1); scores are clamped to 0-100, so a sketch
+never has more than 101 bins. Adding or removing a score is O(1), sketches of
+modules, degrees or universities merge by adding their bins, and quantiles and
+percentile ranks are read from the bins, interpolating within one, so they are
+within half a point of the exact answer. The mean is exact.
+
+The 10-bucket grade distributions (database.get_grade_range) are derived from
+the bins: their edges fall on bin edges.
+"""
+
+import math
+
+MIN_SCORE = 0
+MAX_SCORE = 100
+
+
+def empty() -> dict:
+    return {"count": 0, "sum": 0, "bins": {}}
+
+
+def _bin(score) -> int:
+    return int(math.floor(min(MAX_SCORE, max(MIN_SCORE, score))))
+
+
+def add(sketch: dict, score, weight: int = 1) -> dict:
+    """Add a score to the sketch in place (weight=-1 removes it); returns the sketch."""
+    key = str(_bin(score))
+    sketch["count"] += weight
+    sketch["sum"] += weight * score
+    count = sketch["bins"].get(key, 0) + weight
+    if count > 0:
+        sketch["bins"][key] = count
+    else:
+        sketch["bins"].pop(key, None)
+    return sketch
+
+
+def merge(sketches) -> dict:
+    """A new sketch of every score in the given sketches."""
+    merged = empty()
+    for sketch in sketches:
+        if not sketch:
+            continue
+        merged["count"] += sketch.get("count", 0)
+        merged["sum"] += sketch.get("sum", 0)
+        for key, count in sketch.get("bins", {}).items():
+            merged["bins"][key] = merged["bins"].get(key, 0) + count
+    return merged
+
+
+def mean(sketch: dict):
+    return sketch["sum"] / sketch["count"] if sketch and sketch.get("count", 0) > 0 else None
+
+
+def _sorted_bins(sketch: dict) -> list:
+    return sorted((int(key), count) for key, count in sketch.get("bins", {}).items() if count > 0)
+
+
+def quantile(sketch: dict, q: float):
+    """The score below which a fraction q of the scores fall, or None for an empty sketch."""
+    bins = _sorted_bins(sketch or {})
+    total = sum(count for _, count in bins)
+    if not total:
+        return None
+    target = min(max(q, 0.0), 1.0) * total
+    seen = 0
+    for low, count in bins:
+        if seen + count >= target:
+            width = 0 if low == MAX_SCORE else 1
+            return round(low + width * (target - seen) / count, 1)
+        seen += count
+    return float(bins[-1][0])
+
+
+def percentile_rank(sketch: dict, score):
+    """Percentage (0-100) of the scores below score, or None for an empty sketch."""
+    bins = _sorted_bins(sketch or {})
+    total = sum(count for _, count in bins)
+    if not total:
+        return None
+    score = min(MAX_SCORE, max(MIN_SCORE, score))
+    below = 0.0
+    for low, count in bins:
+        if low + 1 <= score:
+            below += count
+        elif low <= score:
+            # Scores of the bin are taken as evenly spread over it
+            below += count * (score - low)
+    return round(100 * below / total, 1)
+
+
+def summary(sketch: dict) -> dict:
+    """Median and quartiles of the sketch, for analytics responses."""
+    return {
+        "median": quantile(sketch, 0.5),
+        "percentiles": {str(p): quantile(sketch, p / 100) for p in (10, 25, 50, 75, 90)}
+    }
+
+
+def grade_distribution(sketch: dict, grade_range) -> dict:
+    """{grade range: count} of the scores, with grade_range(score) naming the range of a score."""
+    distribution = {}
+    for low, count in _sorted_bins(sketch or {}):
+        key = grade_range(low)
+        distribution[key] = distribution.get(key, 0) + count
+    return distribution
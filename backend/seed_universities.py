@@ -0,0 +1,170 @@
+# seed_universities.py
+
+"""
+Load the university catalog and the majors dictionary from the CSV files in
+filter/ into the universities container.
+
+    python seed_universities.py                     universities.csv
+    python seed_universities.py --countries GB,US   world-universities.csv, only those countries
+    python seed_universities.py --countries all     every university in world-universities.csv
+
+The majors of majors-list.csv are merged into the majors dictionary under
+their FOD1P codes (see database.major_id); universities start without major
+counts, which only ever hold majors with students. Rows are read lazily and
+written page by page with up to STORAGE_BULK_CONCURRENCY creates in flight,
+so memory stays constant however large the file. Universities that already
+exist are left alone (their counts and module statistics are live data), which
+makes re-running or adding a country safe. The position in the file is
+checkpointed after each page, so an interrupted run resumes where it stopped
+(--restart starts over).
+"""
+
+import argparse
+import contextvars
+import csv
+import datetime
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
+
+from database import _uni_container, MAJORS_DICTIONARY_ID
+from storage import BULK_CONCURRENCY, optimistic_update
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "filter")
+CHECKPOINT_TYPE = "seed_checkpoint"
+PAGE_SIZE = 500
+
+# Cosmos ids may not contain these; the university name is its id
+_INVALID_ID_CHARACTERS = set("/\\?#")
+
+
+def read_majors(path: str) -> dict:
+    """{FOD1P code: major name} from majors-list.csv."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["FOD1P"].strip(): row["Major"].strip() for row in csv.DictReader(f) if row.get("Major", "").strip()}
+
+
+def merge_majors(majors: dict) -> int:
+    """Add the majors missing from the dictionary; returns how many were added."""
+    added = []
+
+    def add_missing(doc):
+        # Re-applied from scratch when another writer got in first
+        added.clear()
+        dictionary = doc.setdefault("majors", {})
+        names = {name.lower() for name in dictionary.values()}
+        for major, name in majors.items():
+            if major not in dictionary and name.lower() not in names:
+                dictionary[major] = name
+                added.append(major)
+        if not added:
+            return False
+
+    optimistic_update(
+        _uni_container,
+        MAJORS_DICTIONARY_ID,
+        MAJORS_DICTIONARY_ID,
+        add_missing,
+        create=lambda: {"id": MAJORS_DICTIONARY_ID, "type": "majors_dictionary", "majors": {}}
+    )
+    return len(added)
+
+
+def read_universities(path: str, countries: set = None):
+    """
+    Yield {"name", ...} per university row. world-universities.csv rows are
+    (country, name, website) and are filtered by countries (None keeps all).
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) >= 3:
+                if countries is None or row[0] in countries:
+                    yield {"name": row[1].strip(), "country": row[0], "website": row[2].strip()}
+            elif row and row[0].strip():
+                yield {"name": row[0].strip()}
+
+
+def university_document(university: dict) -> dict:
+    doc = {
+        "id": university["name"],  # Use name as ID
+        "name": university["name"],
+        "counter": 0,
+        "major_counts": {}
+    }
+    doc.update({key: value for key, value in university.items() if key not in doc and value})
+    return doc
+
+
+def load_checkpoint(checkpoint_id: str) -> dict:
+    try:
+        return _uni_container.read_item(item=checkpoint_id, partition_key=checkpoint_id)
+    except CosmosResourceNotFoundError:
+        return {"id": checkpoint_id, "type": CHECKPOINT_TYPE, "rows": 0, "created": 0, "skipped": 0}
+
+
+def _parallel(work, items):
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as executor:
+        return list(executor.map(lambda item: contextvars.copy_context().run(work, item), items))
+
+
+def seed(path: str, countries: set = None, restart: bool = False, page_size: int = PAGE_SIZE) -> dict:
+    source = os.path.basename(path)
+    checkpoint_id = f"{CHECKPOINT_TYPE}:{source}:{','.join(sorted(countries)) if countries else 'all'}"
+    checkpoint = load_checkpoint(checkpoint_id)
+    if restart or checkpoint.get("completed_at"):
+        checkpoint.update(rows=0, created=0, skipped=0, completed_at=None)
+
+    def create_one(university):
+        if not university["name"] or _INVALID_ID_CHARACTERS & set(university["name"]):
+            return None
+        try:
+            _uni_container.create_item(body=university_document(university))
+            return True
+        except CosmosResourceExistsError:
+            return False
+
+    rows = itertools.islice(read_universities(path, countries), checkpoint["rows"], None)
+    while True:
+        page = list(itertools.islice(rows, page_size))
+        if page:
+            created = _parallel(create_one, page)
+            checkpoint["rows"] += len(page)
+            checkpoint["created"] += created.count(True)
+            checkpoint["skipped"] += len(page) - created.count(True)
+            for university, result in zip(page, created):
+                if result is None:
+                    print(f"Skipped {university['name']!r}: not a valid university id")
+        checkpoint["updated_at"] = datetime.datetime.utcnow().isoformat()
+        if len(page) < page_size:
+            checkpoint["completed_at"] = checkpoint["updated_at"]
+        checkpoint = _uni_container.upsert_item(body=checkpoint)
+        print(f"Read {checkpoint['rows']} universities: {checkpoint['created']} created, {checkpoint['skipped']} skipped")
+        if checkpoint.get("completed_at"):
+            return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load universities and majors into the universities container")
+    parser.add_argument("--countries", help="comma-separated country codes from world-universities.csv, or 'all'")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory holding the CSV files")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and read the file from the start")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    majors = read_majors(os.path.join(args.data_dir, "majors-list.csv"))
+    print(f"Added {merge_majors(majors)} of {len(majors)} majors to the majors dictionary")
+    if args.countries:
+        path = os.path.join(args.data_dir, "world-universities.csv")
+        countries = None if args.countries == "all" else {code.strip().upper() for code in args.countries.split(",")}
+    else:
+        path = os.path.join(args.data_dir, "universities.csv")
+        countries = None
+
+    print(f"Loading {os.path.basename(path)}")
+    seed(path, countries, restart=args.restart, page_size=args.page_size)
+
+
+if __name__ == "__main__":
+    main()
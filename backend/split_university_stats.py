@@ -0,0 +1,39 @@
+# split_university_stats.py
+
+"""
+Move the module statistics embedded in university documents into their own
+documents (see database.split_university_document).
+
+Universities are split on their next module score or review anyway; this
+finishes the ones nobody has written to since, so readers stop falling back to
+the embedded shape. Safe to run while the app is serving and to re-run.
+
+    python split_university_stats.py            split every remaining university
+    python split_university_stats.py --dry-run  only count them
+"""
+
+import argparse
+
+from database import _uni_container, split_university_document
+
+_EMBEDDED_QUERY = "SELECT * FROM c WHERE NOT IS_DEFINED(c.type) AND IS_DEFINED(c.degrees)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split embedded module statistics out of university documents")
+    parser.add_argument("--dry-run", action="store_true", help="only report the universities left to split")
+    args = parser.parse_args()
+
+    universities = list(_uni_container.query_items(query=_EMBEDDED_QUERY, enable_cross_partition_query=True))
+    print(f"{len(universities)} universities still embed module statistics")
+    if args.dry_run:
+        return
+
+    for uni_doc in universities:
+        modules = sum(len(degree.get("modules", {})) for degree in uni_doc["degrees"].values())
+        split_university_document(uni_doc)
+        print(f"Split {uni_doc['id']}: {modules} module entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+# storage.py
+
+"""
+Storage backend selection for the data layer.
+
+The data modules only talk to container objects through the subset of the
+Cosmos ContainerProxy API they already use (query_items, read_item,
+create_item, upsert_item, replace_item, patch_item, delete_item), wrapped in
+ContainerClient, which also reports every call to data_metrics.
+STORAGE_BACKEND picks the implementation:
+
+    cosmos  - Azure Cosmos DB (default, production)
+    local   - in-process engine from local_storage.py, optionally persisted
+              to the SQLite file named by LOCAL_STORAGE_PATH
+"""
+
+import base64
+import binascii
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+import data_metrics
+import request_cache
+import resilience
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "cosmos").lower()
+LOCAL_STORAGE_PATH = os.environ.get("LOCAL_STORAGE_PATH", ":memory:")
+
+COSMOS_ENDPOINT = os.environ.get("COSMOS_ENDPOINT")
+COSMOS_KEY = os.environ.get("COSMOS_KEY")
+COSMOS_DBNAME = os.environ.get("COSMOS_DBNAME")
+
+# Cosmos transactional batches hold at most 100 operations on one partition key
+BATCH_SIZE = 100
+# and a single patch request at most 10 operations
+PATCH_OPERATION_LIMIT = 10
+BULK_CONCURRENCY = int(os.environ.get("STORAGE_BULK_CONCURRENCY", "16"))
+
+# Lost races tolerated by optimistic_update, and the base of its jittered backoff
+OPTIMISTIC_MAX_ATTEMPTS = int(os.environ.get("STORAGE_OPTIMISTIC_MAX_ATTEMPTS", "8"))
+OPTIMISTIC_BACKOFF_SECONDS = 0.005
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def _get_database():
+    """Return the process-wide database handle, creating the client on first use."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                if STORAGE_BACKEND == "local":
+                    from local_storage import LocalDatabase
+                    _database = LocalDatabase(LOCAL_STORAGE_PATH)
+                elif STORAGE_BACKEND == "cosmos":
+                    from azure.cosmos import CosmosClient
+                    # resilience.execute owns retries; keep the SDK's own
+                    # throttle retries short so the two do not multiply
+                    client = CosmosClient(
+                        COSMOS_ENDPOINT,
+                        credential=COSMOS_KEY,
+                        retry_total=1,
+                        retry_backoff_max=1
+                    )
+                    _database = client.get_database_client(COSMOS_DBNAME)
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _database
+
+
+def _open_container(name: str, partition_key_path: str):
+    database = _get_database()
+    if STORAGE_BACKEND == "local":
+        return database.get_container_client(name, partition_key_path)
+    return database.get_container_client(name)
+
+
+def get_container(name: str, partition_key_path: str = "/id"):
+    """
+    Return a container client for the configured backend.
+
+    Nothing is connected until the first call on the client, so modules can
+    create their containers at import without slowing down cold starts.
+    partition_key_path must match the container's partition key definition;
+    the local backend stores documents by it and bulk writes group by it.
+    """
+    return ContainerClient(partition_key_path=partition_key_path, opener=lambda: _open_container(name, partition_key_path))
+
+
+def partition_key_value(body: dict, partition_key_path: str):
+    """Extract the partition key value of a document."""
+    value = body
+    for part in partition_key_path.strip("/").split("/"):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def patch_path(*segments) -> str:
+    """Build a JSON Pointer path for patch operations, escaping '~' and '/'."""
+    return "/" + "/".join(str(segment).replace("~", "~0").replace("/", "~1") for segment in segments)
+
+
+def encode_cursor(continuation_token):
+    """Wrap a backend continuation token in an opaque, URL-safe cursor."""
+    if continuation_token is None:
+        return None
+    return base64.urlsafe_b64encode(continuation_token.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Recover the continuation token from a cursor; raises ValueError if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def page_params(params) -> tuple:
+    """
+    Read page_size/cursor from request query parameters.
+
+    Returns (None, None) when the caller didn't ask for paging, so endpoints can
+    keep returning the plain list to existing clients. Raises ValueError on bad input.
+    """
+    page_size = params.get("page_size")
+    cursor = params.get("cursor")
+    if page_size is None and not cursor:
+        return None, None
+    try:
+        page_size = int(page_size) if page_size is not None else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        raise ValueError("page_size must be an integer")
+    if page_size < 1:
+        raise ValueError("page_size must be positive")
+    decode_cursor(cursor)
+    return min(page_size, MAX_PAGE_SIZE), cursor
+
+
+def _split_path(path: str) -> list:
+    return [part.replace("~1", "/").replace("~0", "~") for part in path.lstrip("/").split("/")]
+
+
+def _resolve_parent(doc, parts, create_parents):
+    target = doc
+    for position, part in enumerate(parts[:-1]):
+        if isinstance(target, dict):
+            if part not in target:
+                if not create_parents:
+                    raise ValueError(f"Path /{'/'.join(parts)} has no parent node")
+                child = parts[position + 1]
+                target[part] = [] if child == "-" or child.isdigit() else {}
+            target = target[part]
+        elif isinstance(target, list) and part.isdigit() and int(part) < len(target):
+            target = target[int(part)]
+        else:
+            raise ValueError(f"Path /{'/'.join(parts)} has no parent node")
+    if not isinstance(target, (dict, list)):
+        raise ValueError(f"Path /{'/'.join(parts)} has no parent node")
+    return target
+
+
+def apply_patch_operations(doc: dict, operations: list, create_parents: bool = False) -> dict:
+    """
+    Apply Cosmos partial document update operations to a document in place.
+
+    Mirrors the server semantics (set/add/replace/remove/incr/move) so the
+    local backend and read-modify-write fallbacks behave like Cosmos. With
+    create_parents, missing intermediate objects are created instead of failing.
+    """
+    for operation in operations:
+        op = operation["op"].lower()
+        parts = _split_path(operation["path"])
+        parent = _resolve_parent(doc, parts, create_parents)
+        leaf = parts[-1]
+        value = operation.get("value")
+
+        if isinstance(parent, list):
+            if leaf == "-":
+                index = len(parent)
+            elif leaf.isdigit():
+                index = int(leaf)
+            else:
+                raise ValueError(f"Invalid array index in {operation['path']}")
+            exists = index < len(parent)
+            if op == "add":
+                if index > len(parent):
+                    raise ValueError(f"Array index out of range in {operation['path']}")
+                parent.insert(index, value)
+            elif op in ("set", "replace", "incr"):
+                if not exists and not (op == "set" and index == len(parent)):
+                    raise ValueError(f"Array index out of range in {operation['path']}")
+                if op == "incr":
+                    parent[index] = parent[index] + value
+                elif exists:
+                    parent[index] = value
+                else:
+                    parent.append(value)
+            elif op == "remove":
+                if not exists:
+                    raise ValueError(f"Array index out of range in {operation['path']}")
+                parent.pop(index)
+            elif op == "move":
+                source = _split_path(operation["from"])
+                source_parent = _resolve_parent(doc, source, False)
+                moved = source_parent.pop(source[-1] if isinstance(source_parent, dict) else int(source[-1]))
+                parent.insert(index, moved)
+            else:
+                raise ValueError(f"Unsupported patch operation: {op}")
+            continue
+
+        if op in ("set", "add"):
+            parent[leaf] = value
+        elif op == "replace":
+            if leaf not in parent:
+                raise ValueError(f"Path {operation['path']} does not exist")
+            parent[leaf] = value
+        elif op == "remove":
+            if leaf not in parent:
+                raise ValueError(f"Path {operation['path']} does not exist")
+            del parent[leaf]
+        elif op == "incr":
+            current = parent.get(leaf, 0)
+            if isinstance(current, bool) or not isinstance(current, (int, float)):
+                raise ValueError(f"Path {operation['path']} is not a number")
+            parent[leaf] = current + value
+        elif op == "move":
+            source = _split_path(operation["from"])
+            source_parent = _resolve_parent(doc, source, False)
+            if isinstance(source_parent, dict):
+                if source[-1] not in source_parent:
+                    raise ValueError(f"Path {operation['from']} does not exist")
+                parent[leaf] = source_parent.pop(source[-1])
+            else:
+                parent[leaf] = source_parent.pop(int(source[-1]))
+        else:
+            raise ValueError(f"Unsupported patch operation: {op}")
+    return doc
+
+
+class ConcurrentUpdateError(Exception):
+    """An ETag-guarded update kept losing to concurrent writers."""
+
+
+def optimistic_update(container, item: str, partition_key, mutate, create=None, current: dict = None,
+                      max_attempts: int = OPTIMISTIC_MAX_ATTEMPTS):
+    """
+    Read-modify-write a document, guarded by its ETag.
+
+    mutate(doc) changes the document in place; returning False skips the write.
+    When another writer got in first (412), the document is re-read and mutate
+    is applied again to the fresh copy, so it must express a delta against
+    whatever it is given rather than a precomputed result. If the document
+    doesn't exist, create() supplies a new one that is mutated and created
+    (losing that race retries the same way). current may be a copy read just
+    before, saving the first read.
+
+    Returns the stored document, or None if it is missing and create is None.
+    Raises ConcurrentUpdateError after max_attempts lost races.
+    """
+    for attempt in range(max_attempts):
+        if attempt:
+            # Spread out writers contending for the same document
+            time.sleep(random.uniform(0, OPTIMISTIC_BACKOFF_SECONDS * 2 ** attempt))
+        doc, current = current, None
+        if doc is None:
+            try:
+                doc = container.read_item(item=item, partition_key=partition_key)
+            except CosmosResourceNotFoundError:
+                doc = None
+
+        if doc is None:
+            if create is None:
+                return None
+            doc = create()
+            mutate(doc)
+            try:
+                return container.create_item(body=doc)
+            except CosmosResourceExistsError:
+                continue
+
+        if mutate(doc) is False:
+            return doc
+        try:
+            return container.replace_item(
+                item=item,
+                body=doc,
+                etag=doc["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+            continue
+    raise ConcurrentUpdateError(f"Gave up updating {item} after {max_attempts} conflicting attempts")
+
+
+class _ChargeHook:
+    """response_hook that sums the x-ms-request-charge of every response of one call."""
+
+    def __init__(self, chained=None):
+        self.request_charge = 0.0
+        self._chained = chained
+
+    def __call__(self, headers, result):
+        if self._chained:
+            self._chained(headers, result)
+        # Queries also invoke the hook once with the ItemPaged before any page is
+        # fetched, carrying the previous call's headers; only count real responses
+        if hasattr(result, "by_page") or not headers:
+            return
+        try:
+            self.request_charge += float(headers.get("x-ms-request-charge", 0) or 0)
+        except (TypeError, ValueError):
+            pass
+
+
+class _MeteredQuery:
+    """
+    Query results that are fetched page by page under the retry policy and
+    record their metrics once they have been consumed.
+
+    Iteration is lazy in Cosmos, so the call is timed until the last item is read.
+    A failed page is retried from the last continuation token, so items already
+    yielded are never repeated.
+    """
+
+    def __init__(self, client, open_pages, template, hook, started):
+        self._client = client
+        self._open_pages = open_pages
+        self._template = template
+        self._hook = hook
+        self._started = started
+
+    def __iter__(self):
+        count = 0
+        error = False
+        pager = None
+        continuation = None
+
+        def fetch_page():
+            nonlocal pager
+            if pager is None:
+                pager = self._open_pages(continuation)
+            try:
+                return list(next(pager))
+            except StopIteration:
+                return None
+            except Exception:
+                # Reopen from the last completed page on retry
+                pager = None
+                raise
+
+        try:
+            while True:
+                page = resilience.execute("query", fetch_page, self._client._name)
+                if page is None:
+                    return
+                continuation = pager.continuation_token
+                for item in page:
+                    count += 1
+                    yield item
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._client._record("query_items", self._template, self._hook, count, self._started, error)
+
+
+class ContainerClient:
+    """
+    Thin wrapper around a backend container.
+
+    Every call is timed and its request charge reported to data_metrics. Writes
+    also invalidate the request cache so memoized reads in the same request
+    don't return stale documents.
+    """
+
+    def __init__(self, container=None, partition_key_path: str = "/id", opener=None):
+        self._backend = container
+        self._opener = opener
+        self._open_lock = threading.Lock()
+        self.partition_key_path = partition_key_path
+
+    @property
+    def _container(self):
+        if self._backend is None:
+            with self._open_lock:
+                if self._backend is None:
+                    self._backend = self._opener()
+        return self._backend
+
+    def __getattr__(self, name):
+        # Guard against recursion when a failing lookup happens before the backend is open
+        if name.startswith("__") or name in ("_container", "_backend", "_opener", "_open_lock"):
+            raise AttributeError(name)
+        return getattr(self._container, name)
+
+    @property
+    def _name(self):
+        return getattr(self._container, "id", "?")
+
+    def _record(self, operation, template, hook, item_count, started, error=False):
+        data_metrics.record(
+            self._name,
+            operation,
+            template,
+            hook.request_charge,
+            item_count,
+            time.perf_counter() - started,
+            error,
+        )
+
+    def _metered(self, operation, method, *args, template=None, **kwargs):
+        hook = _ChargeHook(kwargs.pop("response_hook", None))
+        started = time.perf_counter()
+        kind = "read" if operation == "read_item" else "write"
+        try:
+            result = resilience.execute(kind, lambda: method(*args, response_hook=hook, **kwargs), self._name)
+        except Exception:
+            self._record(operation, template or operation, hook, 0, started, error=True)
+            raise
+        if isinstance(result, list):
+            item_count = len(result)
+        else:
+            item_count = 1 if result is not None else 0
+        self._record(operation, template or operation, hook, item_count, started)
+        return result
+
+    def query_items(self, query, parameters=None, **kwargs):
+        hook = _ChargeHook(kwargs.pop("response_hook", None))
+        started = time.perf_counter()
+        template = data_metrics.query_template(query)
+
+        def open_pages(continuation):
+            result = self._container.query_items(query=query, parameters=parameters, response_hook=hook, **kwargs)
+            return result.by_page(continuation)
+
+        return _MeteredQuery(self, open_pages, template, hook, started)
+
+    def read_item(self, item, partition_key, **kwargs):
+        return self._metered("read_item", self._container.read_item, item=item, partition_key=partition_key, **kwargs)
+
+    def query_page(self, query: str, parameters=None, page_size: int = DEFAULT_PAGE_SIZE, cursor=None, **kwargs) -> tuple:
+        """
+        Run a query and return one page of results with the cursor for the next.
+
+        Only page_size documents are fetched from the backend; the cursor wraps the
+        backend continuation token and is None once the results are exhausted.
+        """
+        continuation = decode_cursor(cursor)
+        hook = _ChargeHook(kwargs.pop("response_hook", None))
+        started = time.perf_counter()
+        template = data_metrics.query_template(query)
+
+        def fetch_page():
+            token = continuation
+            pager = self._container.query_items(
+                query=query,
+                parameters=parameters,
+                max_item_count=page_size,
+                response_hook=hook,
+                **kwargs
+            ).by_page(token)
+            while True:
+                items = list(next(pager, []))
+                # Cross-partition queries can return empty pages that still continue
+                if items or not pager.continuation_token or pager.continuation_token == token:
+                    return items, pager.continuation_token if items else None
+                token = pager.continuation_token
+
+        try:
+            items, next_token = resilience.execute("query", fetch_page, self._name)
+        except Exception:
+            self._record("query_page", template, hook, 0, started, error=True)
+            raise
+        self._record("query_page", template, hook, len(items), started)
+        return items, encode_cursor(next_token)
+
+    def create_item(self, body, **kwargs):
+        result = self._metered("create_item", self._container.create_item, body=body, **kwargs)
+        request_cache.invalidate_document(body)
+        return result
+
+    def upsert_item(self, body, **kwargs):
+        result = self._metered("upsert_item", self._container.upsert_item, body=body, **kwargs)
+        request_cache.invalidate_document(body)
+        return result
+
+    def replace_item(self, item, body, **kwargs):
+        result = self._metered("replace_item", self._container.replace_item, item=item, body=body, **kwargs)
+        request_cache.invalidate_document(body)
+        return result
+
+    def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        result = self._metered(
+            "patch_item", self._container.patch_item,
+            item=item, partition_key=partition_key, patch_operations=patch_operations, **kwargs
+        )
+        request_cache.invalidate_document(result)
+        return result
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        results = self._metered(
+            "execute_item_batch", self._container.execute_item_batch,
+            batch_operations=batch_operations, partition_key=partition_key, **kwargs
+        )
+        for result in results:
+            request_cache.invalidate_document(result.get("resourceBody"))
+        return results
+
+    def delete_item(self, item, partition_key, **kwargs):
+        self._metered("delete_item", self._container.delete_item, item=item, partition_key=partition_key, **kwargs)
+        request_cache.invalidate_document(item if isinstance(item, dict) else None)
+
+    def bulk_create(self, docs: list) -> list:
+        """Create many documents in as few round trips as possible."""
+        return self._bulk_write("create", docs)
+
+    def bulk_upsert(self, docs: list) -> list:
+        """Upsert many documents in as few round trips as possible."""
+        return self._bulk_write("upsert", docs)
+
+    def _bulk_write(self, operation: str, docs: list) -> list:
+        """
+        Documents sharing a partition key are written with transactional batches
+        of up to BATCH_SIZE operations; the remaining single-document partitions
+        are written concurrently. Results are returned in input order.
+        """
+        if not docs:
+            return []
+
+        if hasattr(self._container, "bulk_write"):
+            # Local backend: one lock acquisition and one SQLite transaction
+            hook = _ChargeHook()
+            started = time.perf_counter()
+            results = resilience.execute("write", lambda: self._container.bulk_write(operation, docs), self._name)
+            self._record(f"bulk_{operation}", f"bulk_{operation}", hook, len(results), started)
+        else:
+            groups = {}
+            for index, doc in enumerate(docs):
+                key = partition_key_value(doc, self.partition_key_path)
+                groups.setdefault(repr(key), (key, []))[1].append(index)
+
+            results = [None] * len(docs)
+            batches = []
+            singles = []
+            for key, indexes in groups.values():
+                if len(indexes) == 1:
+                    singles.append(indexes[0])
+                    continue
+                for start in range(0, len(indexes), BATCH_SIZE):
+                    batches.append((key, indexes[start:start + BATCH_SIZE]))
+
+            write_one = self._container.create_item if operation == "create" else self._container.upsert_item
+
+            def run_batch(key, indexes):
+                ops = [(operation, (docs[i],)) for i in indexes]
+                response = self._metered(
+                    "execute_item_batch", self._container.execute_item_batch,
+                    batch_operations=ops, partition_key=key, template=f"bulk_{operation}"
+                )
+                for i, result in zip(indexes, response):
+                    results[i] = result.get("resourceBody", docs[i])
+
+            def run_single(index):
+                results[index] = self._metered(f"{operation}_item", write_one, body=docs[index], template=f"bulk_{operation}")
+
+            # Each task runs in a copy of the caller's context so metrics keep the endpoint
+            with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, run_batch, key, indexes)
+                    for key, indexes in batches
+                ]
+                futures += [executor.submit(contextvars.copy_context().run, run_single, index) for index in singles]
+                for future in futures:
+                    future.result()
+
+        for doc in docs:
+            request_cache.invalidate_document(doc)
+        return results
@@ -0,0 +1,305 @@
+# storage_layout.py
+
+"""
+Partition layout of the main container.
+
+The main container was created with /id as its partition key, so every
+per-user query (modules, sessions, schedules, reminders, ...) fans out to all
+partitions. The user-partitioned container keys documents by their owner
+instead: pk is the document's user_email (created_by for modules added through
+GradeRadar), and documents without an owner - users, auth sessions, reset
+tokens - are keyed by their own id. A user's documents then share one logical
+partition, so their queries are single-partition and bulk writes batch.
+
+STORAGE_LAYOUT selects where MainContainer sends calls:
+
+    legacy  - the /id container only (default)
+    dual    - cutover: every write goes to both containers. Users that
+              migrate_layout.py has copied and verified carry a marker in the
+              new container and are served from it; everyone else is still
+              served from the legacy container
+    user    - the user-partitioned container only
+
+Callers pass the owner as partition_key (see database.user_partition_key);
+MainContainer translates it for whichever container it targets. Queries given
+a partition_key are scoped to that owner, all others run cross-partition.
+"""
+
+import datetime
+import logging
+import os
+
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+import request_cache
+from request_cache import memoize_per_request
+from storage import get_container, DEFAULT_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+STORAGE_LAYOUT = os.environ.get("STORAGE_LAYOUT", "legacy").lower()
+COSMOS_USER_DATA_CONTAINER = os.environ.get("COSMOS_USER_DATA_CONTAINER", "userdata")
+LAYOUTS = ("legacy", "dual", "user")
+
+PARTITION_KEY_PATH = "/pk"
+MARKER_ID = "layout_migrated"
+MARKER_TYPE = "layout_marker"
+
+# Properties Cosmos maintains per container; never copied between containers
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+def owner_key(doc: dict) -> str:
+    """Partition key value of a document in the user-partitioned container."""
+    return doc.get("user_email") or doc.get("created_by") or doc["id"]
+
+
+def to_partitioned(doc: dict) -> dict:
+    """Copy of doc as stored in the user-partitioned container."""
+    body = {key: value for key, value in doc.items() if key not in SYSTEM_PROPERTIES}
+    body["pk"] = owner_key(doc)
+    return body
+
+
+def to_legacy(doc: dict) -> dict:
+    """Copy of doc as stored in the legacy container."""
+    return {key: value for key, value in doc.items() if key not in SYSTEM_PROPERTIES and key != "pk"}
+
+
+@memoize_per_request
+def _has_marker(owner: str, container) -> bool:
+    try:
+        container.read_item(item=MARKER_ID, partition_key=owner)
+        return True
+    except CosmosResourceNotFoundError:
+        return False
+
+
+class MainContainer:
+    """
+    The main container as seen by the data modules, routed by STORAGE_LAYOUT.
+
+    Exposes the same calls as storage.ContainerClient. During the dual phase
+    the container serving an owner's reads also takes their writes first, and
+    the result is mirrored to the other container.
+    """
+
+    def __init__(self, legacy, partitioned, layout: str = STORAGE_LAYOUT):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown STORAGE_LAYOUT: {layout}")
+        self.legacy = legacy
+        self.partitioned = partitioned
+        self.layout = layout
+
+    # Routing
+
+    def is_migrated(self, owner: str) -> bool:
+        """Whether owner has been copied and verified (only meaningful in the dual phase)."""
+        return _has_marker(owner, self.partitioned)
+
+    def _targets(self, owner) -> tuple:
+        """(primary, mirror) containers for an owner's documents."""
+        if self.layout == "legacy":
+            return self.legacy, None
+        if self.layout == "user":
+            return self.partitioned, None
+        if owner is not None and self.is_migrated(owner):
+            return self.partitioned, self.legacy
+        return self.legacy, self.partitioned
+
+    def _body(self, container, doc: dict) -> dict:
+        return to_partitioned(doc) if container is self.partitioned else to_legacy(doc)
+
+    def _point_key(self, container, item, owner):
+        if container is self.partitioned:
+            return owner
+        # The legacy container is partitioned by id
+        return item["id"] if isinstance(item, dict) else item
+
+    # Mirroring
+
+    def mark_migrated(self, owner: str):
+        self.partitioned.upsert_item(body={
+            "id": MARKER_ID,
+            "pk": owner,
+            "type": MARKER_TYPE,
+            "migrated_at": datetime.datetime.utcnow().isoformat()
+        })
+        request_cache.invalidate(owner)
+
+    def clear_marker(self, owner: str):
+        """Send owner back to the legacy container until the next verification pass."""
+        try:
+            self.partitioned.delete_item(item=MARKER_ID, partition_key=owner)
+        except CosmosResourceNotFoundError:
+            pass
+        request_cache.invalidate(owner)
+
+    def _mirror_failed(self, mirror, owner, error):
+        logger.error(f"Layout mirror write to {'user' if mirror is self.partitioned else 'legacy'} container failed for {owner}: {error}")
+        if mirror is self.partitioned:
+            try:
+                self.clear_marker(owner)
+            except Exception as e:
+                logger.error(f"Could not clear layout marker for {owner}: {e}")
+
+    def _mirror_upsert(self, mirror, docs: list, owner):
+        if mirror is None or not docs:
+            return
+        try:
+            if len(docs) == 1:
+                mirror.upsert_item(body=self._body(mirror, docs[0]))
+            else:
+                mirror.bulk_upsert([self._body(mirror, doc) for doc in docs])
+        except Exception as e:
+            self._mirror_failed(mirror, owner, e)
+
+    def _mirror_delete(self, mirror, item, owner):
+        if mirror is None:
+            return
+        try:
+            mirror.delete_item(item=item, partition_key=self._point_key(mirror, item, owner))
+        except CosmosResourceNotFoundError:
+            pass
+        except Exception as e:
+            self._mirror_failed(mirror, owner, e)
+
+    # Reads
+
+    def read_item(self, item, partition_key=None, **kwargs):
+        """
+        Point-read a document by id and owner. Without an owner the read is a
+        cross-partition lookup by id in the user layout.
+        """
+        if partition_key is None:
+            if self.layout != "user":
+                return self.legacy.read_item(item=item, partition_key=self._point_key(self.legacy, item, None), **kwargs)
+            item_id = item["id"] if isinstance(item, dict) else item
+            found = list(self.partitioned.query_items(
+                query="SELECT * FROM c WHERE c.id = @id",
+                parameters=[{"name": "@id", "value": item_id}],
+                enable_cross_partition_query=True
+            ))
+            if not found:
+                raise CosmosResourceNotFoundError(
+                    status_code=404,
+                    message=f"Entity with the specified id does not exist: {item_id}"
+                )
+            return found[0]
+        primary, _ = self._targets(partition_key)
+        return primary.read_item(item=item, partition_key=self._point_key(primary, item, partition_key), **kwargs)
+
+    def _query_target(self, partition_key, kwargs):
+        kwargs.pop("enable_cross_partition_query", None)
+        if partition_key is not None:
+            primary, _ = self._targets(partition_key)
+            if primary is self.partitioned:
+                kwargs["partition_key"] = partition_key
+                return primary
+        else:
+            primary = self.partitioned if self.layout == "user" else self.legacy
+        kwargs["enable_cross_partition_query"] = True
+        return primary
+
+    def query_items(self, query, parameters=None, partition_key=None, **kwargs):
+        container = self._query_target(partition_key, kwargs)
+        return container.query_items(query=query, parameters=parameters, **kwargs)
+
+    def query_page(self, query: str, parameters=None, page_size: int = DEFAULT_PAGE_SIZE, cursor=None, partition_key=None, **kwargs) -> tuple:
+        container = self._query_target(partition_key, kwargs)
+        return container.query_page(query, parameters, page_size, cursor, **kwargs)
+
+    # Writes
+
+    def create_item(self, body, **kwargs):
+        owner = owner_key(body)
+        primary, mirror = self._targets(owner)
+        result = primary.create_item(body=self._body(primary, body), **kwargs)
+        self._mirror_upsert(mirror, [result], owner)
+        return result
+
+    def upsert_item(self, body, **kwargs):
+        owner = owner_key(body)
+        primary, mirror = self._targets(owner)
+        result = primary.upsert_item(body=self._body(primary, body), **kwargs)
+        self._mirror_upsert(mirror, [result], owner)
+        return result
+
+    def replace_item(self, item, body, **kwargs):
+        owner = owner_key(body)
+        primary, mirror = self._targets(owner)
+        result = primary.replace_item(item=item, body=self._body(primary, body), **kwargs)
+        self._mirror_upsert(mirror, [result], owner)
+        return result
+
+    def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        primary, mirror = self._targets(partition_key)
+        result = primary.patch_item(
+            item=item,
+            partition_key=self._point_key(primary, item, partition_key),
+            patch_operations=patch_operations,
+            **kwargs
+        )
+        self._mirror_upsert(mirror, [result], partition_key)
+        return result
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        primary, mirror = self._targets(partition_key)
+        operations = []
+        for operation in batch_operations:
+            name, args = operation[0], tuple(operation[1])
+            if name in ("create", "upsert", "replace"):
+                args = args[:-1] + (self._body(primary, args[-1]),)
+            operations.append((name, args) + tuple(operation[2:]))
+
+        if primary is self.partitioned:
+            key = partition_key
+        else:
+            # Batches address one partition, which in the legacy container is one document
+            first = operations[0][1][0]
+            key = first["id"] if isinstance(first, dict) else first
+        results = primary.execute_item_batch(batch_operations=operations, partition_key=key, **kwargs)
+
+        if mirror is not None:
+            written = [result.get("resourceBody") for result in results if result.get("resourceBody")]
+            self._mirror_upsert(mirror, written, partition_key)
+            for operation in operations:
+                if operation[0] == "delete":
+                    self._mirror_delete(mirror, operation[1][0], partition_key)
+        return results
+
+    def delete_item(self, item, partition_key, **kwargs):
+        primary, mirror = self._targets(partition_key)
+        primary.delete_item(item=item, partition_key=self._point_key(primary, item, partition_key), **kwargs)
+        self._mirror_delete(mirror, item, partition_key)
+
+    def bulk_create(self, docs: list) -> list:
+        """Create many documents in as few round trips as possible."""
+        return self._bulk_write("create", docs)
+
+    def bulk_upsert(self, docs: list) -> list:
+        """Upsert many documents in as few round trips as possible."""
+        return self._bulk_write("upsert", docs)
+
+    def _bulk_write(self, operation: str, docs: list) -> list:
+        owners = {}
+        for index, doc in enumerate(docs):
+            owners.setdefault(owner_key(doc), []).append(index)
+
+        results = [None] * len(docs)
+        for owner, indexes in owners.items():
+            primary, mirror = self._targets(owner)
+            write = primary.bulk_create if operation == "create" else primary.bulk_upsert
+            written = write([self._body(primary, docs[i]) for i in indexes])
+            for i, result in zip(indexes, written):
+                results[i] = result
+            self._mirror_upsert(mirror, written, owner)
+        return results
+
+
+def main_container(legacy_name: str) -> MainContainer:
+    """Build the main container for the configured STORAGE_LAYOUT."""
+    return MainContainer(
+        get_container(legacy_name, "/id"),
+        get_container(COSMOS_USER_DATA_CONTAINER, PARTITION_KEY_PATH)
+    )
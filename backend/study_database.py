@@ -2,8 +2,11 @@
 import uuid
 import datetime
 import logging
-from typing import List, Dict, Any, Optional
-from database import _container  
+from typing import List, Dict, Any, Optional, Tuple
+from database import _container, read_document, delete_document, patch_document, set_operations
+from storage import patch_path
+from request_cache import memoize_per_request
+from resilience import non_critical
 
 
 logger = logging.getLogger(__name__)
@@ -40,10 +43,11 @@ def get_user_schedules(user_email: str) -> List[dict]:
     schedules = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
     return schedules
 
+@memoize_per_request
 def get_active_schedule(user_email: str) -> Optional[dict]:
     """Get the active study schedule for a user"""
     query = "SELECT * FROM c WHERE c.type = 'study_schedule' AND c.user_email = @email AND c.is_active = true"
@@ -52,26 +56,14 @@ def get_active_schedule(user_email: str) -> Optional[dict]:
     schedules = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
     
     return schedules[0] if schedules else None
 
 def get_schedule(user_email: str, schedule_id: str) -> Optional[dict]:
     """Get a specific study schedule"""
-    query = "SELECT * FROM c WHERE c.type = 'study_schedule' AND c.id = @id AND c.user_email = @email"
-    parameters = [
-        {"name": "@id", "value": schedule_id},
-        {"name": "@email", "value": user_email}
-    ]
-
-    schedules = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    return schedules[0] if schedules else None
+    return read_document(schedule_id, user_email, "study_schedule")
 
 def update_schedule(user_email: str, schedule_id: str, updates: dict) -> Optional[dict]:
     """Update a study schedule"""
@@ -108,7 +100,7 @@ def deactivate_all_schedules(user_email: str) -> bool:
     schedules = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
 
     for schedule in schedules:
@@ -163,7 +155,7 @@ def delete_schedule(user_email: str, schedule_id: str) -> bool:
         return False
 
     # Delete from database
-    _container.delete_item(item=schedule_id, partition_key=schedule_id)
+    delete_document(schedule_id, user_email)
     return True
 
 # Study Session Operations
@@ -182,8 +174,26 @@ def create_study_session(user_email: str, session_data: dict) -> dict:
     result = _container.create_item(body=session_data)
     return result
 
-def get_user_sessions(user_email: str, start_date: Optional[str] = None, end_date: Optional[str] = None, schedule_id: Optional[str] = None) -> List[dict]:
-    """Get study sessions for a user with optional date range filtering and schedule filtering"""
+def create_study_sessions(user_email: str, sessions_data: List[dict]) -> List[dict]:
+    """Create many study sessions with one bulk write"""
+    for session_data in sessions_data:
+        if not session_data.get('id'):
+            session_data['id'] = f"session_{str(uuid.uuid4())}"
+        session_data['user_email'] = user_email
+        session_data['type'] = 'study_session'
+
+    return _container.bulk_create(sessions_data)
+
+def save_study_sessions(user_email: str, sessions: List[dict]) -> List[dict]:
+    """Write back many modified study sessions with one bulk write"""
+    now = datetime.datetime.utcnow().isoformat()
+    for session in sessions:
+        session['user_email'] = user_email
+        session['updated_at'] = now
+
+    return _container.bulk_upsert(sessions)
+
+def _user_sessions_query(user_email: str, start_date: Optional[str] = None, end_date: Optional[str] = None, schedule_id: Optional[str] = None):
     query = "SELECT * FROM c WHERE c.type = 'study_session' AND c.user_email = @email"
     parameters = [{"name": "@email", "value": user_email}]
 
@@ -197,14 +207,24 @@ def get_user_sessions(user_email: str, start_date: Optional[str] = None, end_dat
     if schedule_id:
         query += " AND c.schedule_id = @scheduleId"
         parameters.append({"name": "@scheduleId", "value": schedule_id})
+    return query, parameters
 
+@memoize_per_request
+def get_user_sessions(user_email: str, start_date: Optional[str] = None, end_date: Optional[str] = None, schedule_id: Optional[str] = None) -> List[dict]:
+    """Get study sessions for a user with optional date range filtering and schedule filtering"""
+    query, parameters = _user_sessions_query(user_email, start_date, end_date, schedule_id)
     sessions = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
     return sessions
 
+def get_user_sessions_page(user_email: str, page_size: int, cursor: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, schedule_id: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """Return (sessions, next_cursor) for one page of a user's study sessions"""
+    query, parameters = _user_sessions_query(user_email, start_date, end_date, schedule_id)
+    return _container.query_page(query, parameters, page_size, cursor, partition_key=user_email)
+
 def get_active_schedule_sessions(user_email: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[dict]:
     """Get study sessions for a user's active schedule with optional date range filtering"""
     # First get the active schedule
@@ -221,40 +241,15 @@ def get_active_schedule_sessions(user_email: str, start_date: Optional[str] = No
 
 def get_session(user_email: str, session_id: str) -> Optional[dict]:
     """Get a specific study session"""
-    query = "SELECT * FROM c WHERE c.type = 'study_session' AND c.id = @id AND c.user_email = @email"
-    parameters = [
-        {"name": "@id", "value": session_id},
-        {"name": "@email", "value": user_email}
-    ]
-
-    sessions = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    return sessions[0] if sessions else None
+    return read_document(session_id, user_email, "study_session")
 
 def update_session(user_email: str, session_id: str, updates: dict) -> Optional[dict]:
-    """Update a study session"""
-    session = get_session(user_email, session_id)
-    if not session:
-        return None
+    """Update fields of a study session with a single patch (no read)"""
+    fields = {key: value for key, value in updates.items() if key not in ['id', 'user_email', 'type']}
+    if not fields:
+        return get_session(user_email, session_id)
 
-    # Ensure session is a dictionary before updating it
-    if not isinstance(session, dict):
-        session_dict = dict(session)
-    else:
-        session_dict = session
-
-    # Update fields
-    for key, value in updates.items():
-        if key not in ['id', 'user_email', 'type']:
-            session_dict[key] = value
-
-    # Update in database
-    result = _container.replace_item(item=session_id, body=session_dict)
-    return result
+    return patch_document(session_id, set_operations(fields), user_email, "study_session")
 
 def delete_session(user_email: str, session_id: str) -> bool:
     """Delete a study session"""
@@ -263,7 +258,7 @@ def delete_session(user_email: str, session_id: str) -> bool:
         return False
 
     # Delete from database
-    _container.delete_item(item=session_id, partition_key=session_id)
+    delete_document(session_id, user_email)
     return True
 
 def delete_sessions_for_schedule(user_email: str, schedule_id: str) -> int:
@@ -284,13 +279,13 @@ def delete_sessions_for_schedule(user_email: str, schedule_id: str) -> int:
         sessions = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=user_email
         ))
 
         # Delete each session
         deleted_count = 0
         for session in sessions:
-            _container.delete_item(item=session["id"], partition_key=session["id"])
+            delete_document(session["id"], user_email)
             deleted_count += 1
             
         return deleted_count
@@ -303,17 +298,10 @@ def delete_sessions_for_schedule(user_email: str, schedule_id: str) -> int:
 
 def get_study_streak(user_email: str) -> dict:
     """Get or create the study streak for a user"""
-    query = "SELECT * FROM c WHERE c.type = 'study_streak' AND c.user_email = @email"
-    parameters = [{"name": "@email", "value": user_email}]
+    streak = read_document(f"streak_{user_email}", user_email, "study_streak")
 
-    streaks = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    if streaks:
-        return streaks[0]
+    if streak:
+        return streak
 
     # Create new streak document if none exists
     streak_doc = {
@@ -331,17 +319,13 @@ def get_study_streak(user_email: str) -> dict:
 
 def update_study_streak(user_email: str, study_date: str, studied: bool) -> dict:
     """Update the study streak based on study activity"""
-    streak_doc = get_study_streak(user_email)
-
-    # Ensure streak_doc is a dictionary before updating it
-    if not isinstance(streak_doc, dict):
-        streak_dict = dict(streak_doc)
-    else:
-        streak_dict = streak_doc
+    streak_dict = get_study_streak(user_email)
 
-    # Make sure history exists
+    # Only the touched fields are patched; history is updated by key, not rewritten
+    changes = {}
     if "history" not in streak_dict:
         streak_dict["history"] = {}
+        changes["history"] = {}
 
     # Update the history
     streak_dict["history"][study_date] = studied
@@ -349,6 +333,7 @@ def update_study_streak(user_email: str, study_date: str, studied: bool) -> dict
     if studied:
         # Update last study date
         streak_dict["last_study_date"] = study_date
+        changes["last_study_date"] = study_date
 
         # Calculate current streak
         current_date = datetime.datetime.fromisoformat(study_date.replace('Z', '+00:00')).date()
@@ -366,14 +351,18 @@ def update_study_streak(user_email: str, study_date: str, studied: bool) -> dict
                 streak_dict["current_streak"] = streak_dict.get("current_streak", 0) + 1
             else:
                 streak_dict["current_streak"] = 1
+        changes["current_streak"] = streak_dict["current_streak"]
 
         # Update longest streak if needed
         if streak_dict.get("current_streak", 0) > streak_dict.get("longest_streak", 0):
             streak_dict["longest_streak"] = streak_dict["current_streak"]
+            changes["longest_streak"] = streak_dict["longest_streak"]
 
     # Save updates
-    _container.replace_item(item=streak_dict["id"], body=streak_dict)
-    return streak_dict
+    operations = set_operations(changes)
+    operations.append({"op": "set", "path": patch_path("history", study_date), "value": studied})
+    updated = patch_document(streak_dict["id"], operations, user_email, "study_streak")
+    return updated or streak_dict
 
 # Achievements Operations
 
@@ -385,7 +374,7 @@ def get_user_achievements(user_email: str) -> List[dict]:
     achievements = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
 
     if not achievements:
@@ -498,47 +487,30 @@ def initialize_default_achievements(user_email: str) -> List[dict]:
 
     return default_achievements
 
-def update_achievement(user_email: str, achievement_id: str, progress: int) -> dict:
-    """Update an achievement's progress"""
-    query = "SELECT * FROM c WHERE c.type = 'achievement' AND c.id = @id AND c.user_email = @email"
-    parameters = [
-        {"name": "@id", "value": achievement_id},
-        {"name": "@email", "value": user_email}
-    ]
+def update_achievement(user_email: str, achievement_id: str, progress: int, achievement: Optional[dict] = None) -> dict:
+    """Update an achievement's progress (pass the achievement doc if already loaded to skip the read)"""
+    if achievement is None:
+        achievement = read_document(achievement_id, user_email, "achievement")
 
-    achievements = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    if not achievements:
+    if not achievement:
         return None
 
-    achievement = achievements[0]
-
-    # Ensure achievement is a dictionary before updating it
-    if not isinstance(achievement, dict):
-        achievement_dict = dict(achievement)
-    else:
-        achievement_dict = achievement
-
-    # Update progress
-    achievement_dict["progress"] = progress
+    changes = {"progress": progress}
 
     # Calculate percentage
-    if achievement_dict.get("target", 0) > 0:
-        achievement_dict["progressPercent"] = min(100, int((progress / achievement_dict["target"]) * 100))
+    progress_percent = achievement.get("progressPercent", 0)
+    if achievement.get("target", 0) > 0:
+        progress_percent = min(100, int((progress / achievement["target"]) * 100))
+        changes["progressPercent"] = progress_percent
 
     # Update status
-    if achievement_dict.get("progressPercent", 0) >= 100:
-        achievement_dict["status"] = "completed"
-    elif achievement_dict.get("status") == "locked" and progress > 0:
-        achievement_dict["status"] = "in-progress"
+    if progress_percent >= 100:
+        changes["status"] = "completed"
+    elif achievement.get("status") == "locked" and progress > 0:
+        changes["status"] = "in-progress"
 
-    # Save updates
-    _container.replace_item(item=achievement_id, body=achievement_dict)
-    return achievement_dict
+    # Save only the changed fields
+    return patch_document(achievement_id, set_operations(changes), user_email, "achievement")
 
 def check_and_update_achievements(user_email: str) -> List[dict]:
     """Check and update all achievements based on user activity"""
@@ -572,17 +544,16 @@ def check_and_update_achievements(user_email: str) -> List[dict]:
     updated_achievements = []
     
     for achievement in achievements:
+        updated = achievement
         if achievement["name"] == "First Steps":
-            update_achievement(user_email, achievement["id"], len(completed_sessions))
+            updated = update_achievement(user_email, achievement["id"], len(completed_sessions), achievement) or achievement
         elif achievement["name"] == "Steady Learner":
-            update_achievement(user_email, achievement["id"], streak_doc.get("current_streak", 0))
+            updated = update_achievement(user_email, achievement["id"], streak_doc.get("current_streak", 0), achievement) or achievement
         elif achievement["name"] == "Time Master":
-            update_achievement(user_email, achievement["id"], int(total_hours))
+            updated = update_achievement(user_email, achievement["id"], int(total_hours), achievement) or achievement
         elif achievement["name"] == "Weekend Warrior":
-            update_achievement(user_email, achievement["id"], weekend_sessions)
+            updated = update_achievement(user_email, achievement["id"], weekend_sessions, achievement) or achievement
         
-        # Fetch the updated achievement
-        updated = get_achievement(user_email, achievement["id"])
         updated_achievements.append(updated)
     
     # Now also check completion-based achievements
@@ -598,35 +569,16 @@ def check_and_update_achievements(user_email: str) -> List[dict]:
 
 def get_achievement(user_email: str, achievement_id: str) -> Optional[dict]:
     """Get a specific achievement"""
-    query = "SELECT * FROM c WHERE c.type = 'achievement' AND c.id = @id AND c.user_email = @email"
-    parameters = [
-        {"name": "@id", "value": achievement_id},
-        {"name": "@email", "value": user_email}
-    ]
-
-    achievements = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    return achievements[0] if achievements else None
+    return read_document(achievement_id, user_email, "achievement")
 
 # Analytics Operations
 
 def get_study_stats(user_email: str) -> dict:
     """Get or create study statistics for a user"""
-    query = "SELECT * FROM c WHERE c.type = 'study_stats' AND c.user_email = @email"
-    parameters = [{"name": "@email", "value": user_email}]
-
-    stats_list = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
+    stats = read_document(f"stats_{user_email}", user_email, "study_stats")
 
-    if stats_list:
-        return stats_list[0]
+    if stats:
+        return stats
 
     # Create new stats document if none exists
     stats_doc = {
@@ -647,6 +599,7 @@ def get_study_stats(user_email: str) -> dict:
     _container.create_item(body=stats_doc)
     return stats_doc
 
+@non_critical
 def update_study_stats(user_email: str) -> dict:
     """Update study statistics based on session history"""
     # Get sessions
@@ -747,41 +700,13 @@ def get_user_ai_tips(user_email: str) -> List[dict]:
     tips = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True
+        partition_key=user_email
     ))
     return tips
 
 def update_ai_tip_status(user_email: str, tip_id: str, applied: bool, rejected: bool) -> Optional[dict]:
     """Update the status of an AI tip (applied or rejected)"""
-    query = "SELECT * FROM c WHERE c.type = 'ai_tip' AND c.id = @id AND c.user_email = @email"
-    parameters = [
-        {"name": "@id", "value": tip_id},
-        {"name": "@email", "value": user_email}
-    ]
-
-    tips = list(_container.query_items(
-        query=query,
-        parameters=parameters,
-        enable_cross_partition_query=True
-    ))
-
-    if not tips:
-        return None
-
-    tip = tips[0]
-
-    # Ensure tip is a dictionary before updating it
-    if not isinstance(tip, dict):
-        tip_dict = dict(tip)
-    else:
-        tip_dict = tip
-
-    tip_dict['applied'] = applied
-    tip_dict['rejected'] = rejected
-
-    # Save updates
-    _container.replace_item(item=tip_dict["id"], body=tip_dict)
-    return tip_dict
+    return patch_document(tip_id, set_operations({"applied": applied, "rejected": rejected}), user_email, "ai_tip")
 
 # Module Analytics Operations
 
@@ -1066,7 +991,7 @@ def get_current_and_upcoming_sessions(user_email: str, limit: int = 10) -> List[
     sessions = list(_container.query_items(
         query=query,
         parameters=parameters,
-        enable_cross_partition_query=True,
+        partition_key=user_email,
         max_item_count=limit
     ))
     
@@ -1079,7 +1004,8 @@ def get_current_and_upcoming_sessions(user_email: str, limit: int = 10) -> List[
             
             # Update session to in_progress status
             session["status"] = "in_progress"
-            _container.replace_item(item=session["id"], body=session)
+            patch_document(session["id"], set_operations({"status": "in_progress"}),
+                           user_email, "study_session", condition="c.status = 'planned'")
     
     return sessions
 
@@ -1117,44 +1043,42 @@ def get_sessions_requiring_status_update() -> List[dict]:
 
 def mark_session_as_completed(user_email: str, session_id: str, feedback: Optional[dict] = None) -> Optional[dict]:
     """Mark a session as completed with optional feedback"""
-    # Get the session
-    session = get_session(user_email, session_id)
-    if not session:
-        return None
-    
-    # Ensure session is a dictionary
-    if not isinstance(session, dict):
-        session_dict = dict(session)
-    else:
-        session_dict = session
-        
-    # Update session data
-    session_dict["status"] = "completed"
-    session_dict["completed"] = True
-    session_dict["completed_at"] = datetime.datetime.utcnow().isoformat()
+    # Only the completion fields are written, so a concurrent status update
+    # from the session tracker can't overwrite the rest of the document
+    changes = {
+        "status": "completed",
+        "completed": True,
+        "completed_at": datetime.datetime.utcnow().isoformat()
+    }
     
     # Add feedback if provided
     if feedback:
-        session_dict["productivity"] = feedback.get("productivity")
-        session_dict["difficulty"] = feedback.get("difficulty")
-        session_dict["feedback_notes"] = feedback.get("notes")
+        # Topics and XP depend on the stored session, so read it first
+        session = get_session(user_email, session_id)
+        if not session:
+            return None
+        
+        changes["productivity"] = feedback.get("productivity")
+        changes["difficulty"] = feedback.get("difficulty")
+        changes["feedback_notes"] = feedback.get("notes")
         
         # Add topics if provided
         if "topics" in feedback and feedback["topics"]:
-            if not session_dict.get("topics"):
-                session_dict["topics"] = []
-            session_dict["topics"].extend(feedback["topics"])
+            topics = list(session.get("topics") or [])
+            topics.extend(feedback["topics"])
             # Remove duplicates while preserving order
             seen = set()
-            session_dict["topics"] = [x for x in session_dict["topics"] if not (x in seen or seen.add(x))]
+            changes["topics"] = [x for x in topics if not (x in seen or seen.add(x))]
         
         # Calculate XP based on productivity and session duration
         productivity = feedback.get("productivity", 3)
-        xp_earned = calculate_xp(session_dict, productivity)
-        session_dict["xpEarned"] = xp_earned
+        xp_earned = calculate_xp(session, productivity)
+        changes["xpEarned"] = xp_earned
     
     # Update session in database
-    updated_session = _container.replace_item(item=session_id, body=session_dict)
+    updated_session = patch_document(session_id, set_operations(changes), user_email, "study_session")
+    if not updated_session:
+        return None
     
     # Update streak for the user
     current_date = datetime.datetime.utcnow().date().isoformat()
@@ -1164,25 +1088,7 @@ def mark_session_as_completed(user_email: str, session_id: str, feedback: Option
 
 def mark_session_as_missed(user_email: str, session_id: str) -> Optional[dict]:
     """Mark a session as missed"""
-    # Get the session
-    session = get_session(user_email, session_id)
-    if not session:
-        return None
-    
-    # Ensure session is a dictionary
-    if not isinstance(session, dict):
-        session_dict = dict(session)
-    else:
-        session_dict = session
-        
-    # Update session data
-    session_dict["status"] = "missed"
-    session_dict["missed"] = True
-    
-    # Update session in database
-    updated_session = _container.replace_item(item=session_id, body=session_dict)
-    
-    return updated_session
+    return patch_document(session_id, set_operations({"status": "missed", "missed": True}), user_email, "study_session")
 
 def update_session_statuses_automatically():
     """Automatic update of session statuses based on current time"""
@@ -1199,20 +1105,19 @@ def update_session_statuses_automatically():
             session.get("startTime") <= current_time and 
             session.get("endTime") >= current_time):
             
-            # Update to in_progress
-            session["status"] = "in_progress"
-            _container.replace_item(item=session["id"], body=session)
-            updated_count += 1
+            # Update to in_progress, unless the user changed the session meanwhile
+            if patch_document(session["id"], set_operations({"status": "in_progress"}),
+                              session["user_email"], "study_session", condition="c.status = 'planned'"):
+                updated_count += 1
             
         # Check if session should be marked as missed
         elif (session.get("date") < current_date or 
               (session.get("date") == current_date and session.get("endTime") < current_time)):
             
-            # Mark as missed
-            session["status"] = "missed"
-            session["missed"] = True
-            _container.replace_item(item=session["id"], body=session)
-            updated_count += 1
+            # Mark as missed, unless the user completed it meanwhile
+            if patch_document(session["id"], set_operations({"status": "missed", "missed": True}),
+                              session["user_email"], "study_session", condition="c.status = 'planned'"):
+                updated_count += 1
     
     return updated_count
 
@@ -1732,21 +1637,20 @@ def check_and_update_completion_achievements(user_email: str) -> List[dict]:
     updated_achievements = []
     
     for achievement in achievements:
+        updated = achievement
         if achievement["name"] == "Perfect Week":
-            update_achievement(user_email, achievement["id"], len(perfect_weeks))
+            updated = update_achievement(user_email, achievement["id"], len(perfect_weeks), achievement) or achievement
         elif achievement["name"] == "Consistency Champion":
             # Count days with high completion rate
             high_completion_days = 0
             if completion_rate >= 90 and len(completed_sessions) >= 10:
                 high_completion_days = 30  # Simplified for now - in real implementation, would track day by day
-            update_achievement(user_email, achievement["id"], high_completion_days)
+            updated = update_achievement(user_email, achievement["id"], high_completion_days, achievement) or achievement
         elif achievement["name"] == "Marathon Scholar":
-            update_achievement(user_email, achievement["id"], 1 if marathon_days else 0)
+            updated = update_achievement(user_email, achievement["id"], 1 if marathon_days else 0, achievement) or achievement
         elif achievement["name"] == "Comeback Kid":
-            update_achievement(user_email, achievement["id"], 1 if has_comeback else 0)
+            updated = update_achievement(user_email, achievement["id"], 1 if has_comeback else 0, achievement) or achievement
         
-        # Fetch the updated achievement
-        updated = get_achievement(user_email, achievement["id"])
         updated_achievements.append(updated)
     
     return updated_achievements
@@ -1786,7 +1690,7 @@ def get_user_learning_preferences(user_email: str) -> dict:
         feedback_records = list(_container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            partition_key=user_email
         ))
         
         # Extract patterns from feedback
@@ -1,5 +1,6 @@
 # study_routes.py
 import azure.functions as func
+import asyncio
 import json
 import traceback
 import datetime
@@ -9,7 +10,8 @@ from user_routes import verify_session
 from models import ScheduleRequest, FeedbackForm, StudySessionStatus, SessionFeedback
 from study_database import (
     create_study_schedule, get_user_schedules, get_schedule, update_schedule, delete_schedule,
-    create_study_session, get_user_sessions, get_session, update_session, delete_session,
+    create_study_session, create_study_sessions, save_study_sessions,
+    get_user_sessions, get_user_sessions_page, get_session, update_session, delete_session,
     delete_sessions_for_schedule, get_active_schedule, activate_schedule, mark_schedule_events_created,
     get_active_schedule_sessions, deactivate_all_schedules,
     get_study_streak, update_study_streak,
@@ -24,11 +26,10 @@ from study_database import (
 )
 from ai_scheduler import generate_study_schedule, generate_ai_tips
 from calendar_routes import create_event
-from database import get_user_modules
+from database import get_user_modules, create_calendar_events as create_calendar_events_bulk, discard_calendar_events
+from storage import page_params
+import async_data
 import logging
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
-from azure.storage.blob import BlobServiceClient
 import os
 
 
@@ -171,11 +172,9 @@ def create_schedule_ai(req: func.HttpRequest) -> func.HttpResponse:
         created_schedule = create_study_schedule(identity, ai_schedule)
 
         # Save generated sessions with reference to the schedule
-        sessions = []
         for session_data in study_sessions:
             session_data["schedule_id"] = created_schedule["id"]
-            created_session = create_study_session(identity, session_data)
-            sessions.append(created_session)
+        sessions = create_study_sessions(identity, study_sessions)
 
         # Save analytics about the generated schedule
         from study_database import save_ai_schedule_analytics
@@ -337,14 +336,16 @@ def create_calendar_events_route(req: func.HttpRequest) -> func.HttpResponse:
         # Get all sessions for this schedule
         sessions = get_user_sessions(identity, schedule_id=schedule_id)
         
-        # Create calendar events for each session
-        created_events = []
-        for session in sessions:
-            event_id = create_calendar_event_for_session(req, identity, session)
-            if event_id:
-                # Update session with event_id
-                update_session(identity, session["id"], {"event_id": event_id})
-                created_events.append(event_id)
+        # Create calendar events for all sessions, then link them back in one bulk write
+        sessions = [session for session in sessions if not session.get("event_id")]
+        created_events = create_session_events(identity, sessions)
+        linked = [session for session in sessions if session.get("event_id")]
+        try:
+            save_study_sessions(identity, linked)
+        except Exception:
+            # Unlinked events would be created again on retry
+            discard_calendar_events(created_events)
+            raise
                 
         # Mark schedule as having events created
         mark_schedule_events_created(identity, schedule_id)
@@ -369,6 +370,11 @@ def get_sessions(req: func.HttpRequest) -> func.HttpResponse:
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
 
+    try:
+        page_size, cursor = page_params(req.params)
+    except ValueError as e:
+        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+
     try:
         # Get optional date range filters
         start_date = req.params.get('start_date')
@@ -377,7 +383,17 @@ def get_sessions(req: func.HttpRequest) -> func.HttpResponse:
         # Check if we should filter by active schedule only
         active_only = req.params.get('active_only', 'false').lower() == 'true'
         
-        if active_only:
+        if page_size:
+            # Paged listing: one page per call, continued with next_cursor
+            schedule_id = req.params.get('schedule_id')
+            if active_only:
+                active_schedule = get_active_schedule(identity)
+                if not active_schedule:
+                    return func.HttpResponse(json.dumps({"items": [], "next_cursor": None}), status_code=200)
+                schedule_id = active_schedule.get('id')
+            sessions, next_cursor = get_user_sessions_page(identity, page_size, cursor, start_date, end_date, schedule_id)
+            return func.HttpResponse(json.dumps({"items": sessions, "next_cursor": next_cursor}), status_code=200)
+        elif active_only:
             # Get sessions only from active schedule
             sessions = get_active_schedule_sessions(identity, start_date, end_date)
         else:
@@ -619,24 +635,29 @@ def get_streak(req: func.HttpRequest) -> func.HttpResponse:
 
 # === Analytics Routes ===
 
-def get_analytics(req: func.HttpRequest) -> func.HttpResponse:
+async def get_analytics(req: func.HttpRequest) -> func.HttpResponse:
     """Get study analytics data for the current user"""
-    is_valid, identity = verify_session(req)
+    is_valid, identity = await asyncio.to_thread(verify_session, req)
     if not is_valid:
         return func.HttpResponse(json.dumps({"error": identity}), status_code=401)
 
     try:
-        # Get study stats
-        stats = get_study_stats(identity)
-
-        # Get module stats
-        module_stats = get_module_study_stats(identity)
-
-        # Get chart data
-        module_time_distribution = get_module_time_distribution(identity)
-        sessions_timeline = get_sessions_timeline(identity)
-        productivity_patterns = get_productivity_patterns(identity)
-        grade_distribution = get_grade_distribution_data(identity)
+        # The six loads are independent, so issue them together
+        (
+            stats,
+            module_stats,
+            module_time_distribution,
+            sessions_timeline,
+            productivity_patterns,
+            grade_distribution
+        ) = await asyncio.gather(
+            async_data.get_study_stats(identity),
+            async_data.get_module_study_stats(identity),
+            async_data.get_module_time_distribution(identity),
+            async_data.get_sessions_timeline(identity),
+            async_data.get_productivity_patterns(identity),
+            async_data.get_grade_distribution_data(identity)
+        )
 
         return func.HttpResponse(
             json.dumps({
@@ -808,23 +829,54 @@ def create_sessions_from_schedule(user_email: str, schedule: dict, create_calend
                     "schedule_id": schedule["id"]
                 }
 
-                created_session = create_study_session(user_email, session_data)
-
-                # Create calendar event for the session if requested
-                if create_calendar_events:
-                    event_id = create_calendar_event_for_session(None, user_email, created_session)
-
-                    # Update session with event_id if created
-                    if event_id:
-                        update_session(user_email, created_session["id"], {"event_id": event_id})
-                        created_session["event_id"] = event_id
-
-                sessions.append(created_session)
+                sessions.append(session_data)
 
         # Move to next day
         current_date += datetime.timedelta(days=1)
 
-    return sessions
+    # Create calendar events first if requested, so sessions are written once with their event_id
+    created_events = []
+    if create_calendar_events:
+        for session_data in sessions:
+            session_data["id"] = f"session_{str(uuid.uuid4())}"
+        created_events = create_session_events(user_email, sessions)
+
+    try:
+        return create_study_sessions(user_email, sessions)
+    except Exception:
+        discard_calendar_events(created_events)
+        raise
+
+def create_session_events(user_email: str, sessions: list) -> list:
+    """
+    Create the calendar events of study sessions in one bulk write and set
+    event_id on the sessions whose event was created; a failed event leaves
+    its session without one, as before. Returns the created events.
+    """
+    events = [build_session_event(user_email, session) for session in sessions]
+    created_events = create_calendar_events_bulk(user_email, events)
+    created_ids = {event["id"] for event in created_events}
+    for session, event in zip(sessions, events):
+        if event["id"] in created_ids:
+            session["event_id"] = event["id"]
+    return created_events
+
+def build_session_event(user_email: str, session: dict) -> dict:
+    """Build the calendar event document for a study session"""
+    return {
+        "id": str(uuid.uuid4()),
+        "title": session.get("title", "Study Session"),
+        "description": session.get("description", f"Study session"),
+        "date": session.get("date", ""),
+        "start_time": session.get("startTime", ""),
+        "end_time": session.get("endTime", ""),
+        "all_day": False,
+        "type": "study_session",  # Mark specifically as study_session type
+        "color": "#9e78ff",  # Use purple for study sessions
+        "user_email": user_email,
+        "schedule_id": session.get("schedule_id", ""),  # Include reference to the schedule
+        "session_id": session.get("id")
+    }
 
 def create_calendar_event_for_session(req, user_email: str, session: dict):
     """Create a calendar event for a study session"""
@@ -835,18 +887,7 @@ def create_calendar_event_for_session(req, user_email: str, session: dict):
             return None
 
         # Prepare calendar event data
-        event_data = {
-            "title": session.get("title", "Study Session"),
-            "description": session.get("description", f"Study session"),
-            "date": session.get("date", ""),
-            "start_time": session.get("startTime", ""),
-            "end_time": session.get("endTime", ""),
-            "all_day": False,
-            "type": "study_session",  # Mark specifically as study_session type
-            "color": "#9e78ff",  # Use purple for study sessions
-            "user_email": user_email,
-            "schedule_id": session.get("schedule_id", "")  # Include reference to the schedule
-        }
+        event_data = build_session_event(user_email, session)
 
         # Call create_event function
         if req:
@@ -0,0 +1,35 @@
+# conftest.py
+
+"""
+The tests run against the in-process storage backend (local_storage.py), so
+they need neither Cosmos DB nor network access:
+
+    cd backend && python -m pytest tests
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_PATH"] = ":memory:"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_storage import LocalDatabase  # noqa: E402
+
+
+@pytest.fixture
+def container():
+    """An empty local container partitioned by /pk."""
+    return LocalDatabase().get_container_client("test", "/pk")
+
+
+@pytest.fixture
+def university():
+    """
+    A university name no other test uses. The data layer's containers and
+    catalogs are shared by the whole session, so tests keep apart by name.
+    """
+    return f"Test University {uuid.uuid4().hex[:8]}"
@@ -0,0 +1,67 @@
+import pytest
+
+import database
+from module_routes import add_cohorts
+from resilience import LoadShedError
+
+DEGREE = "Science"
+
+
+@pytest.fixture(autouse=True)
+def small_cohorts(monkeypatch):
+    monkeypatch.setattr(database, "COHORT_MIN_SIZE", 3)
+
+
+def _score(university, name, score):
+    database.update_university_module_data({
+        "university": university, "degree": DEGREE, "name": name, "code": "", "score": score
+    })
+
+
+def _module(university, name, score):
+    return {"university": university, "degree": DEGREE, "name": name, "score": score}
+
+
+def test_cohort_of_a_folded_score_is_found(university):
+    for score in (40, 50, 60):
+        _score(university, "Programming 1", score)
+    _score(university, "Programming I", 70)
+
+    cohort = database.get_module_cohort(_module(university, "Programming I", 70))
+    assert cohort == {"percentile": 75.0, "cohort_size": 4}
+
+
+def test_no_cohort_without_a_score_or_enough_classmates(university):
+    for score in (40, 50):
+        _score(university, "Optics", score)
+    assert database.get_module_cohort(_module(university, "Optics", 45)) is None
+    assert database.get_module_cohort(_module(university, "Optics", None)) is None
+    assert database.get_module_cohort(_module(university, "Unscored", 45)) is None
+    assert database.get_module_cohort(_module(f"{university} Elsewhere", "Optics", 45)) is None
+
+
+def test_listing_reads_each_university_once(university, monkeypatch):
+    for name in ("Optics", "Mechanics"):
+        for score in (40, 50, 60):
+            _score(university, name, score)
+    reads = []
+    find_university_doc = database._find_university_doc
+    monkeypatch.setattr(database, "_find_university_doc", lambda name: reads.append(name) or find_university_doc(name))
+
+    modules = [_module(university, "Optics", 55), _module(university, "Mechanics", 35), _module(university, "Optics", None)]
+    add_cohorts(modules)
+    assert reads == [university]
+    assert [module["cohort"] for module in modules] == [
+        {"percentile": 66.7, "cohort_size": 3}, {"percentile": 0.0, "cohort_size": 3}, None
+    ]
+
+
+def test_listing_without_cohorts_when_shed(university, monkeypatch):
+    for score in (40, 50, 60):
+        _score(university, "Optics", score)
+    def throttled(name):
+        raise LoadShedError("throttling")
+    monkeypatch.setattr(database, "_find_university_doc", throttled)
+    modules = [_module(university, "Optics", 55)]
+    add_cohorts(modules)
+    assert modules[0]["cohort"] is None
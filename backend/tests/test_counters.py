@@ -0,0 +1,59 @@
+import pytest
+
+import counters
+import database
+from local_storage import LocalDatabase
+
+
+@pytest.fixture
+def container():
+    # Shards are their own partitions, as in the universities container
+    return LocalDatabase().get_container_client("counters", "/id")
+
+
+def test_increments_are_summed_over_shards(container, monkeypatch):
+    shards = iter([0, 1, 1, 2])
+    monkeypatch.setattr(counters.random, "randrange", lambda n: next(shards))
+    for _ in range(4):
+        counters.increment(container, "uni", {"total": 1, "major:maths": 1}, labels={"major:maths": "Maths"})
+
+    counts, labels, seeded = counters.read(container, "uni")
+    assert counts == {"total": 4, "major:maths": 4}
+    assert labels == {"major:maths": "Maths"}
+    assert not seeded
+    assert len(list(container.query_items("SELECT * FROM c WHERE c.type = 'counter_shard'"))) == 3
+
+
+def test_seed_records_the_base_counts_once(container):
+    assert counters.seed(container, "uni", {"total": 10})
+    assert not counters.seed(container, "uni", {"total": 99})
+    counters.increment(container, "uni", {"total": 1})
+
+    counts, _, seeded = counters.read(container, "uni")
+    assert counts == {"total": 11}
+    assert seeded
+
+
+def test_keys_changed_since(container):
+    counters.increment(container, "recent", {"total": 1})
+    assert counters.keys_changed_since(container, 60) == {"recent"}
+
+
+# Compaction into university documents
+
+def test_compaction_folds_shards_into_the_university_document(university):
+    for major in ["Computer Science", "Mathematics"]:
+        database.increment_university_and_major_counter(university, major)
+
+    # Registrations count at once, before compaction
+    counter, _ = database.get_university_counts(database.get_university_doc(university))
+    assert counter == 2
+
+    assert database.compact_university_counters() >= 1
+    doc = database.get_university_doc(university)
+    assert doc["counter"] == 2
+    assert database.get_major_count(doc, "Mathematics") == 1
+
+    # Idempotent: running again changes nothing
+    database.compact_university_counters()
+    assert database.get_university_doc(university)["counter"] == 2
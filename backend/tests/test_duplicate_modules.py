@@ -0,0 +1,117 @@
+import uuid
+
+import pytest
+
+import database
+from module_search import ModuleSearchIndex, canonical_name
+
+UNIVERSITY = "Test University"
+DEGREE = "Science"
+
+
+def index_of(*names):
+    index = ModuleSearchIndex()
+    index.apply_module_stats([
+        {"id": name, "name": name, "code": "", "university": UNIVERSITY, "degree": DEGREE, "student_counter": 1}
+        for name in names
+    ], full=True)
+    return index
+
+
+def similar_name(index, name, **kwargs):
+    match = index.similar(UNIVERSITY, DEGREE, name, **kwargs)
+    return match["name"] if match else None
+
+
+def test_canonical_name_keeps_qualifiers_apart_from_words():
+    assert canonical_name("Programming II") == ("programming", ("2",))
+    assert canonical_name("Introduction to the Theory of Computation") == ("introduction theory computation", ())
+    assert canonical_name("Physics A") == ("physics", ("a",))
+    assert canonical_name("Maths 1a") == ("maths", ("1a",))
+    # The article is not a qualifier
+    assert canonical_name("A Study of Rhetoric") == ("study rhetoric", ())
+
+
+@pytest.mark.parametrize("existing, name", [
+    ("Programming 1", "Programming I"),
+    ("Programming 1", "programming one"),
+    ("Introduction to Databases", "Introduction to the Databases"),
+])
+def test_same_canonical_name_is_the_same_module(existing, name):
+    index = index_of(existing, "Unrelated Module")
+    assert similar_name(index, name, exact=True) == existing
+
+
+@pytest.mark.parametrize("existing, name", [
+    ("Programming 1", "Programming 2"),
+    ("Physics B", "Physics A"),
+    ("Linear Algebra B", "Linear Algebra"),
+    ("Maths 1a", "Maths 1b"),
+])
+def test_different_qualifiers_are_never_similar(existing, name):
+    index = index_of(existing)
+    assert similar_name(index, name) is None
+    assert similar_name(index, name, exact=True) is None
+
+
+def test_near_names_are_similar_but_not_the_same():
+    index = index_of("Inorganic Chemistry")
+    assert similar_name(index, "Organic Chemistry") == "Inorganic Chemistry"
+    assert similar_name(index, "Organic Chemistry", exact=True) is None
+
+
+def test_different_codes_are_never_similar():
+    index = ModuleSearchIndex()
+    index.apply_module_stats([{"id": "1", "name": "Databases", "code": "CS101", "university": UNIVERSITY, "degree": DEGREE}], full=True)
+    assert index.similar(UNIVERSITY, DEGREE, "Databases", "CS102") is None
+    assert index.similar(UNIVERSITY, DEGREE, "Databases", "CS101", exact=True)["id"] == "1"
+
+
+# Scores of a module without statistics go to the same module, never a near one
+
+def _score(university, name, score):
+    database.update_university_module_data({
+        "university": university, "degree": DEGREE, "name": name, "code": "", "score": score
+    })
+
+
+def _students(university):
+    query = "SELECT c.name, c.student_counter FROM c WHERE c.type = 'module_stats' AND c.university = @university"
+    parameters = [{"name": "@university", "value": university}]
+    rows = database._uni_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True)
+    return {row["name"]: row["student_counter"] for row in rows}
+
+
+def test_scores_fold_only_into_the_same_module(university):
+    for name in ["Inorganic Chemistry", "Physics B", "Linear Algebra B", "Programming 1"]:
+        _score(university, name, 60)
+    for name in ["Organic Chemistry", "Physics A", "Linear Algebra", "Programming I"]:
+        _score(university, name, 70)
+
+    assert _students(university) == {
+        "Inorganic Chemistry": 1, "Organic Chemistry": 1,
+        "Physics B": 1, "Physics A": 1,
+        "Linear Algebra B": 1, "Linear Algebra": 1,
+        "Programming 1": 2,
+    }
+
+
+
+def test_reviews_count_in_the_same_statistics_as_scores(university):
+    _score(university, "Programming 1", 60)
+    _score(university, "Programming I", 70)
+    module = {
+        "id": f"module_{uuid.uuid4()}", "type": "module", "name": "Programming I", "code": "",
+        "university": university, "degree": DEGREE, "user_email": "reviewer@example.com",
+    }
+    database._container.create_item(body=module)
+    database.create_module_review({
+        "module_id": module["id"], "university": university, "degree": DEGREE, "user_email": "reviewer@example.com",
+        "difficulty_rating": 4, "teaching_quality_rating": 3, "recommended_rating": 5,
+    })
+
+    assert _students(university) == {"Programming 1": 2}
+    assert database.get_module_statistics(module["id"], university, DEGREE)["total_reviews"] == 1
+    listed = database.get_degree_modules_with_stats(university, DEGREE)
+    assert len(listed) == 1
+    assert listed[0]["statistics"]["total_reviews"] == 1
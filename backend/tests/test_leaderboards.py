@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def user(university):
+    email = f"{uuid.uuid4().hex}@example.com"
+    database.create_user({"id": email, "email": email, "firstName": "Ada", "university": university})
+    return email
+
+
+def _entry(university):
+    return next((entry for entry in database.get_top_contributors(database.CONTRIBUTOR_LEADERBOARD_SIZE)
+                 if entry["university"] == university), None)
+
+
+def _create_review(user, university):
+    database._container.create_item(body={
+        "id": f"review_{uuid.uuid4()}", "type": "module_review", "user_email": user,
+        "module_id": "module_x", "university": university, "degree": "CS"
+    })
+
+
+def test_contributions_move_the_leaderboard(user, university):
+    database.get_contributions(user)
+    database.record_contribution(user, reviews=2)
+    database.record_contribution(user, modules=1)
+    assert database.get_user_by_email(user)["graderadar_contributions"] == {"reviews": 2, "modules": 1}
+    assert _entry(university) == {"display_name": "Ada", "university": university,
+                     "score": 2 * database.REVIEW_POINTS + database.MODULE_POINTS}
+
+    database.record_contribution(user, reviews=-2, modules=-1)
+    assert _entry(university) is None
+
+
+def test_first_contribution_counts_earlier_reviews(user, university):
+    # Reviews written before contributions were kept, the last one just now
+    for _ in range(3):
+        _create_review(user, university)
+    database.record_contribution(user, reviews=1)
+    assert database.get_user_by_email(user)["graderadar_contributions"] == {"reviews": 3, "modules": 0}
+    assert _entry(university)["score"] == 3 * database.REVIEW_POINTS
+
+
+def test_rebuild_recounts_every_contributor(user, university):
+    _create_review(user, university)
+    # Written without recording the contribution
+    assert _entry(university) is None
+
+    assert database.rebuild_contributor_leaderboard() > 0
+    assert _entry(university)["score"] == database.REVIEW_POINTS
+
+
+def test_top_universities_only_list_those_with_modules(university):
+    with_modules, without_modules = f"{university} A", f"{university} B"
+    for name in (with_modules, without_modules):
+        database._ensure_university_doc(name)
+        database._uni_container.patch_item(item=name, partition_key=name,
+                                           patch_operations=[{"op": "set", "path": "/counter", "value": 10 ** 6}])
+    database._update_degree_summaries(with_modules, {"CS": 2})
+
+    top = database.get_top_universities(database.TOP_UNIVERSITIES_MAX)
+    assert top[0] == {"name": with_modules, "students_count": 10 ** 6, "degrees_count": 1}
+    assert without_modules not in [entry["name"] for entry in top]
+    assert len(database.get_top_universities(1)) == 1
+    assert database.get_top_universities(-1) == []
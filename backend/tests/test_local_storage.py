@@ -0,0 +1,189 @@
+import pytest
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from local_storage import compile_query
+
+DOCS = [
+    {"id": "1", "pk": "a", "name": "Alice", "age": 30, "tags": ["x", "y"], "address": {"city": "Leeds"}},
+    {"id": "2", "pk": "a", "name": "bob", "age": 25, "tags": ["y"]},
+    {"id": "3", "pk": "b", "name": "Carol", "age": "thirty", "tags": []},
+    {"id": "4", "pk": "b", "name": "Dave", "age": 41, "score": None},
+]
+
+
+def run(query, parameters=None):
+    return compile_query(query).run(DOCS, parameters)
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+# Query engine
+
+def test_where_with_parameters_and_boolean_logic():
+    rows = run("SELECT * FROM c WHERE c.age >= @min AND NOT (c.pk = 'b' OR c.name = 'bob')",
+               [{"name": "@min", "value": 20}])
+    assert ids(rows) == ["1"]
+
+
+def test_comparisons_with_undefined_or_mismatched_types_filter_out():
+    # Carol's age is a string and Dave has no address: both are undefined, not false
+    assert ids(run("SELECT * FROM c WHERE c.age > 20")) == ["1", "2", "4"]
+    assert ids(run("SELECT * FROM c WHERE NOT (c.address.city = 'Leeds')")) == []
+    assert ids(run("SELECT * FROM c WHERE IS_DEFINED(c.score)")) == ["4"]
+    assert ids(run("SELECT * FROM c WHERE IS_NULL(c.score)")) == ["4"]
+    assert ids(run("SELECT * FROM c WHERE NOT IS_DEFINED(c.address)")) == ["2", "3", "4"]
+
+
+def test_in_and_between():
+    assert ids(run("SELECT * FROM c WHERE c.id IN ('2', '4')")) == ["2", "4"]
+    assert ids(run("SELECT * FROM c WHERE c.age BETWEEN 25 AND 30")) == ["1", "2"]
+
+
+def test_string_and_array_functions():
+    assert ids(run("SELECT * FROM c WHERE CONTAINS(c.name, 'AR', true)")) == ["3"]
+    assert ids(run("SELECT * FROM c WHERE STARTSWITH(LOWER(c.name), 'b')")) == ["2"]
+    assert ids(run("SELECT * FROM c WHERE ARRAY_CONTAINS(c.tags, 'x')")) == ["1"]
+    assert ids(run("SELECT * FROM c WHERE ARRAY_LENGTH(c.tags) = 0")) == ["3"]
+
+
+def test_order_by_several_keys_offset_limit_and_top():
+    rows = run("SELECT * FROM c ORDER BY c.pk DESC, c.id ASC")
+    assert ids(rows) == ["3", "4", "1", "2"]
+    assert ids(run("SELECT * FROM c ORDER BY c.id OFFSET 1 LIMIT 2")) == ["2", "3"]
+    assert ids(run("SELECT TOP 1 * FROM c ORDER BY c.id DESC")) == ["4"]
+
+
+def test_projections_value_and_distinct():
+    assert run("SELECT c.id, c.address.city AS city FROM c WHERE c.id = '1'") == [{"id": "1", "city": "Leeds"}]
+    # Undefined properties are left out of projected rows
+    assert run("SELECT c.id, c.address.city AS city FROM c WHERE c.id = '2'") == [{"id": "2"}]
+    assert run("SELECT VALUE c.name FROM c WHERE c.pk = 'a'") == ["Alice", "bob"]
+    assert run("SELECT DISTINCT VALUE c.pk FROM c") == ["a", "b"]
+
+
+def test_aggregates_skip_undefined_values():
+    assert run("SELECT VALUE COUNT(1) FROM c") == [4]
+    assert run("SELECT VALUE SUM(c.age) FROM c WHERE IS_NUMBER(c.age)") == [96]
+    assert run("SELECT MIN(c.age) AS youngest, MAX(c.age) AS oldest FROM c WHERE IS_NUMBER(c.age)") == [
+        {"youngest": 25, "oldest": 41}
+    ]
+
+
+def test_unsupported_syntax_is_rejected():
+    with pytest.raises(ValueError):
+        compile_query("SELECT * FROM c WHERE REGEXMATCH(c.name, 'a')").run(DOCS)
+
+
+def test_query_items_by_partition_and_page(container):
+    for doc in DOCS:
+        container.create_item(body=doc)
+    assert ids(container.query_items("SELECT * FROM c ORDER BY c.id", partition_key="b")) == ["3", "4"]
+
+    pages = container.query_items("SELECT * FROM c ORDER BY c.id", max_item_count=3).by_page()
+    assert ids(next(pages)) == ["1", "2", "3"]
+    token = pages.continuation_token
+    rest = container.query_items("SELECT * FROM c ORDER BY c.id", max_item_count=3).by_page(token)
+    assert ids(next(rest)) == ["4"]
+    assert rest.continuation_token is None
+
+
+# Point operations
+
+def test_create_conflicts_and_missing_reads(container):
+    container.create_item(body={"id": "1", "pk": "a"})
+    with pytest.raises(CosmosResourceExistsError):
+        container.create_item(body={"id": "1", "pk": "a"})
+    # The same id in another partition is another document
+    container.create_item(body={"id": "1", "pk": "b"})
+    with pytest.raises(CosmosResourceNotFoundError):
+        container.read_item(item="2", partition_key="a")
+
+
+def test_replace_honours_etag(container):
+    stored = container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    container.replace_item(item="1", body=dict(stored, n=2), etag=stored["_etag"],
+                           match_condition=MatchConditions.IfNotModified)
+    with pytest.raises(CosmosAccessConditionFailedError):
+        container.replace_item(item="1", body=dict(stored, n=3), etag=stored["_etag"],
+                               match_condition=MatchConditions.IfNotModified)
+    assert container.read_item(item="1", partition_key="a")["n"] == 2
+
+
+# Patch
+
+def test_patch_operations(container):
+    container.create_item(body={"id": "1", "pk": "a", "n": 1, "tags": ["x"], "old": True, "nested": {"k": 1}})
+    patched = container.patch_item(item="1", partition_key="a", patch_operations=[
+        {"op": "incr", "path": "/n", "value": 2},
+        {"op": "add", "path": "/tags/-", "value": "y"},
+        {"op": "set", "path": "/nested/j", "value": 2},
+        {"op": "remove", "path": "/old"},
+    ])
+    assert patched["n"] == 3
+    assert patched["tags"] == ["x", "y"]
+    assert patched["nested"] == {"k": 1, "j": 2}
+    assert "old" not in patched
+
+
+def test_patch_filter_predicate(container):
+    container.create_item(body={"id": "1", "pk": "a", "owner": "me", "n": 1})
+    container.patch_item(item="1", partition_key="a", patch_operations=[{"op": "incr", "path": "/n", "value": 1}],
+                         filter_predicate="FROM c WHERE c.owner = 'me'")
+    with pytest.raises(CosmosAccessConditionFailedError):
+        container.patch_item(item="1", partition_key="a", patch_operations=[{"op": "incr", "path": "/n", "value": 1}],
+                             filter_predicate="FROM c WHERE c.owner = 'you'")
+    assert container.read_item(item="1", partition_key="a")["n"] == 2
+
+
+def test_patch_rejects_missing_parents_too_many_operations_and_key_changes(container):
+    container.create_item(body={"id": "1", "pk": "a", "theme": "dark"})
+    with pytest.raises(CosmosHttpResponseError) as error:
+        container.patch_item(item="1", partition_key="a",
+                             patch_operations=[{"op": "set", "path": "/missing/leaf", "value": 1}])
+    assert error.value.status_code == 400
+    with pytest.raises(CosmosHttpResponseError):
+        container.patch_item(item="1", partition_key="a",
+                             patch_operations=[{"op": "set", "path": f"/f{i}", "value": i} for i in range(11)])
+    with pytest.raises(CosmosHttpResponseError):
+        container.patch_item(item="1", partition_key="a", patch_operations=[{"op": "set", "path": "/pk", "value": "b"}])
+    assert container.read_item(item="1", partition_key="a")["theme"] == "dark"
+
+
+# Transactional batches
+
+def test_batch_applies_every_operation(container):
+    container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    results = container.execute_item_batch(batch_operations=[
+        ("create", ({"id": "2", "pk": "a"},)),
+        ("patch", ("1", [{"op": "incr", "path": "/n", "value": 1}])),
+    ], partition_key="a")
+    assert len(results) == 2
+    assert container.read_item(item="1", partition_key="a")["n"] == 2
+
+
+def test_batch_rolls_back_when_an_operation_fails(container):
+    container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    with pytest.raises(Exception):
+        container.execute_item_batch(batch_operations=[
+            ("create", ({"id": "2", "pk": "a"},)),
+            ("patch", ("1", [{"op": "incr", "path": "/n", "value": 1}])),
+            # Fails: the document exists
+            ("create", ({"id": "1", "pk": "a"},)),
+        ], partition_key="a")
+    assert container.read_item(item="1", partition_key="a")["n"] == 1
+    with pytest.raises(CosmosResourceNotFoundError):
+        container.read_item(item="2", partition_key="a")
+
+
+def test_batch_rejects_other_partitions(container):
+    with pytest.raises(ValueError):
+        container.execute_item_batch(batch_operations=[("create", ({"id": "1", "pk": "b"},))], partition_key="a")
+    assert list(container.query_items("SELECT * FROM c")) == []
@@ -0,0 +1,61 @@
+import counters
+import database
+
+
+def test_compaction_folds_shards_into_sparse_major_counts(university):
+    for major in ["Computer Science", "Computer Science", "Mathematics"]:
+        database.increment_university_and_major_counter(university, major)
+
+    # Registrations count at once, before compaction
+    counter, major_counts = database.get_university_counts(database.get_university_doc(university))
+    assert counter == 3
+    assert major_counts == {
+        database.major_id("Computer Science"): 2,
+        database.major_id("Mathematics"): 1,
+    }
+
+    assert database.compact_university_counters() >= 1
+    doc = database.get_university_doc(university)
+    assert doc["counter"] == 3
+    assert doc["major_counts"] == major_counts
+    assert database.get_major_count(doc, "computer science") == 2
+    assert database.get_major_count(doc, "Physics") == 0
+
+    # Idempotent: running again changes nothing
+    database.compact_university_counters()
+    assert database.get_university_doc(university)["major_counts"] == major_counts
+
+
+def test_compaction_converts_legacy_major_lists(university):
+    database._uni_container.create_item(body={
+        "id": university,
+        "name": university,
+        "counter": 3,
+        "majors": [
+            {"major_name": "History", "counter": 3},
+            {"major_name": "Geography", "counter": 0},
+        ],
+    })
+    doc = database.get_university_doc(university)
+    assert database.get_major_count(doc, "History") == 3
+
+    database.increment_university_and_major_counter(university, "History")
+    database.compact_university_counters()
+
+    doc = database.get_university_doc(university)
+    assert "majors" not in doc
+    assert doc["counter"] == 4
+    # Majors without students are not kept
+    assert doc["major_counts"] == {database.major_id("History"): 4}
+
+
+def test_live_counts_do_not_create_majors(university):
+    database._uni_container.create_item(body={"id": university, "name": university, "counter": 0, "major_counts": {}})
+    label = f"Major {university}"
+    counters.increment(database._uni_container, university, {"total": 1, database._major_counter(label): 1},
+                       labels={database._major_counter(label): label})
+
+    live = database.with_live_counts(database.get_university_doc(university))
+    assert live["major_counts"] == {label: 1}
+    assert database.major_id(label) is None
+    assert database.get_major_count(live, label) == 1
@@ -0,0 +1,58 @@
+import database
+from module_search import ModuleSearchIndex
+
+UNIVERSITY = "Test University"
+DEGREE = "Science"
+
+
+def module(doc_id, name, code="", university=UNIVERSITY, **fields):
+    return {"id": doc_id, "name": name, "code": code, "university": university, "degree": DEGREE, **fields}
+
+
+def ids(docs):
+    return [doc["id"] for doc in docs]
+
+
+def test_search_ranks_code_and_name_matches():
+    index = ModuleSearchIndex()
+    index.apply_module_stats([
+        module("1", "Advanced Databases", "CS301"),
+        module("2", "Databases", "CS101"),
+        module("3", "Compilers", "DB100", university="Elsewhere"),
+    ], full=True)
+    assert ids(index.search("databases")) == ["2", "1"]
+    assert ids(index.search("cs1")) == ["2"]
+    assert index.search("databases", university="Elsewhere") == []
+    assert ids(index.search("compilers", university="Elsewhere")) == ["3"]
+    assert index.search("databases", limit=0) == []
+
+
+def test_refreshes_update_the_index():
+    index = ModuleSearchIndex()
+    index.apply_module_stats([module("1", "Databases"), module("2", "Compilers")], full=True)
+    index.apply_module_stats([module("1", "Distributed Systems")], full=False)
+    assert index.search("databases") == []
+    assert ids(index.search("distributed")) == ["1"]
+    # A full refresh drops documents that are gone
+    index.apply_module_stats([module("1", "Distributed Systems")], full=True)
+    assert index.search("compilers") == []
+
+
+def test_statistics_embedded_in_university_documents_are_searchable():
+    index = ModuleSearchIndex(lambda uni_doc: [
+        module(f"{uni_doc['id']}:{name}", name, university=uni_doc["id"]) for name in uni_doc["degrees"][DEGREE]["modules"]
+    ])
+    index.apply_universities([{"id": UNIVERSITY, "degrees": {DEGREE: {"modules": ["Optics"]}}}], full=True)
+    assert ids(index.search("optics")) == [f"{UNIVERSITY}:Optics"]
+    # Split: the embedded statistics are gone
+    index.apply_universities([{"id": UNIVERSITY}], full=False)
+    assert index.search("optics") == []
+
+
+def test_search_modules_finds_scored_modules(university):
+    database.update_university_module_data({
+        "university": university, "degree": DEGREE, "name": "Quantum Mechanics", "code": "PHY301", "score": 65
+    })
+    found = database.search_modules("quantum", university=university)
+    assert [(doc["name"], doc["code"]) for doc in found] == [("Quantum Mechanics", "PHY301")]
+    assert database.search_modules("phy301", university=university)[0]["name"] == "Quantum Mechanics"
@@ -0,0 +1,72 @@
+import pytest
+
+import storage
+from storage import ConcurrentUpdateError, optimistic_update
+
+
+def _stored(container, doc_id="1"):
+    return container.read_item(item=doc_id, partition_key="a")
+
+
+def test_update_applies_the_mutation(container):
+    container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    stored = optimistic_update(container, "1", "a", lambda doc: doc.update(n=doc["n"] + 1))
+    assert stored["n"] == 2
+    assert _stored(container)["n"] == 2
+
+
+def test_conflicting_writer_is_retried_on_a_fresh_copy(container, monkeypatch):
+    monkeypatch.setattr(storage, "OPTIMISTIC_BACKOFF_SECONDS", 0)
+    container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    seen = []
+
+    def increment(doc):
+        seen.append(doc["n"])
+        if len(seen) == 1:
+            # Another writer gets in between our read and our write
+            other = _stored(container)
+            container.replace_item(item="1", body=dict(other, n=other["n"] + 10))
+        doc["n"] += 1
+
+    optimistic_update(container, "1", "a", increment)
+    assert seen == [1, 11]
+    assert _stored(container)["n"] == 12
+
+
+def test_mutation_returning_false_skips_the_write(container):
+    stored = container.create_item(body={"id": "1", "pk": "a", "n": 1})
+    result = optimistic_update(container, "1", "a", lambda doc: False)
+    assert result["_etag"] == stored["_etag"]
+    assert _stored(container)["_etag"] == stored["_etag"]
+
+
+def test_missing_document_is_created_or_left(container):
+    assert optimistic_update(container, "1", "a", lambda doc: doc.update(n=1)) is None
+    created = optimistic_update(container, "1", "a", lambda doc: doc.update(n=doc["n"] + 1),
+                                create=lambda: {"id": "1", "pk": "a", "n": 0})
+    assert created["n"] == 1
+
+
+def test_losing_the_create_race_updates_the_winner(container, monkeypatch):
+    monkeypatch.setattr(storage, "OPTIMISTIC_BACKOFF_SECONDS", 0)
+
+    def create():
+        # Another writer creates the document first
+        container.create_item(body={"id": "1", "pk": "a", "n": 5})
+        return {"id": "1", "pk": "a", "n": 0}
+
+    optimistic_update(container, "1", "a", lambda doc: doc.update(n=doc["n"] + 1), create=create)
+    assert _stored(container)["n"] == 6
+
+
+def test_gives_up_after_max_attempts(container, monkeypatch):
+    monkeypatch.setattr(storage, "OPTIMISTIC_BACKOFF_SECONDS", 0)
+    container.create_item(body={"id": "1", "pk": "a", "n": 0})
+
+    def always_loses(doc):
+        container.replace_item(item="1", body=_stored(container))
+        doc["n"] += 1
+
+    with pytest.raises(ConcurrentUpdateError):
+        optimistic_update(container, "1", "a", always_loses, max_attempts=3)
+    assert _stored(container)["n"] == 0
@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+
+import database
+from storage import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_params
+
+
+def test_page_params_defaults_and_limits():
+    # No paging asked for: endpoints keep returning the plain list
+    assert page_params({}) == (None, None)
+    assert page_params({"page_size": "10"}) == (10, None)
+    assert page_params({"page_size": str(MAX_PAGE_SIZE * 2)}) == (MAX_PAGE_SIZE, None)
+    cursor = encode_cursor("token")
+    assert page_params({"cursor": cursor}) == (DEFAULT_PAGE_SIZE, cursor)
+
+
+@pytest.mark.parametrize("params", [
+    {"page_size": "ten"},
+    {"page_size": "0"},
+    {"page_size": "-5"},
+    {"cursor": "not base64!"},
+])
+def test_page_params_rejects_bad_input(params):
+    with pytest.raises(ValueError):
+        page_params(params)
+
+
+def test_cursor_round_trip():
+    for token in ['{"token":"+RID:~abc==#RT:1","range":{"min":"","max":"FF"}}', "42", "ü"]:
+        cursor = encode_cursor(token)
+        assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+        assert decode_cursor(cursor) == token
+    assert encode_cursor(None) is None
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["!!!", encode_cursor("abc"), encode_cursor("-10")])
+def test_search_cursor_offset_rejects_malformed_and_negative(cursor):
+    with pytest.raises(ValueError):
+        database.search_cursor_offset(cursor)
+
+
+def test_search_universities_page_walks_every_match(university):
+    names = [f"{university} Campus {i}" for i in range(5)]
+    for name in names:
+        database._ensure_university_doc(name)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = database.search_universities_page(university, 2, cursor)
+        assert len(page) <= 2
+        seen.extend(doc["name"] for doc in page)
+        if cursor is None:
+            break
+    assert sorted(seen) == names
+    assert database.search_cursor_offset(None) == 0
+
+
+def test_events_page_walks_every_event():
+    email = f"{uuid.uuid4().hex}@example.com"
+    created = []
+    for day in range(1, 6):
+        event = database.prepare_calendar_event(email, {"title": f"Event {day}", "date": f"2024-01-0{day}"})
+        database._events_container.create_item(body=event)
+        created.append(event["id"])
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = database.get_user_events_page(email, 2, cursor)
+        seen.extend(event["id"] for event in page)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(created)
+
+    page, _ = database.get_user_events_page(email, 10, start_date="2024-01-02", end_date="2024-01-03")
+    assert sorted(event["title"] for event in page) == ["Event 2", "Event 3"]
@@ -0,0 +1,126 @@
+import uuid
+
+import pytest
+
+import database
+from account_routes import merge_operations
+from storage import apply_patch_operations
+
+OWNER = "owner@example.com"
+
+
+# apply_patch_operations (read-modify-write fallbacks and the local backend)
+
+def test_set_add_replace_remove_incr():
+    doc = {"a": 1, "b": {"c": 2}, "items": [1, 2]}
+    apply_patch_operations(doc, [
+        {"op": "set", "path": "/b/d", "value": 3},
+        {"op": "replace", "path": "/a", "value": 5},
+        {"op": "incr", "path": "/b/c", "value": -2},
+        {"op": "incr", "path": "/fresh", "value": 4},
+        {"op": "add", "path": "/items/0", "value": 0},
+        {"op": "set", "path": "/items/3", "value": 3},
+        {"op": "remove", "path": "/items/1"},
+    ])
+    assert doc == {"a": 5, "b": {"c": 0, "d": 3}, "fresh": 4, "items": [0, 2, 3]}
+
+
+def test_escaped_path_segments():
+    doc = {}
+    apply_patch_operations(doc, [{"op": "set", "path": "/a~1b~0c", "value": 1}])
+    assert doc == {"a/b~c": 1}
+
+
+def test_move():
+    doc = {"old": {"x": 1}, "items": ["a", "b"]}
+    apply_patch_operations(doc, [
+        {"op": "move", "from": "/old", "path": "/new"},
+        {"op": "move", "from": "/items/0", "path": "/items/-"},
+    ])
+    assert doc == {"new": {"x": 1}, "items": ["b", "a"]}
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "replace", "path": "/missing", "value": 1},
+    {"op": "remove", "path": "/missing"},
+    {"op": "incr", "path": "/text", "value": 1},
+    {"op": "set", "path": "/missing/leaf", "value": 1},
+    # A parent that is not an object
+    {"op": "set", "path": "/text/leaf", "value": 1},
+    {"op": "set", "path": "/items/5", "value": 1},
+])
+def test_invalid_operations_raise(operation):
+    with pytest.raises(ValueError):
+        apply_patch_operations({"text": "x", "items": []}, [operation])
+
+
+def test_create_parents():
+    doc = {}
+    apply_patch_operations(doc, [
+        {"op": "set", "path": "/settings/theme/dark", "value": True},
+        {"op": "add", "path": "/log/-", "value": "first"},
+    ], create_parents=True)
+    assert doc == {"settings": {"theme": {"dark": True}}, "log": ["first"]}
+
+
+# patch_document
+
+@pytest.fixture
+def document():
+    doc = {"id": f"note_{uuid.uuid4()}", "type": "note", "user_email": OWNER, "count": 0}
+    database._container.create_item(body=doc)
+    return doc
+
+
+def _read(document):
+    return database.read_document(document["id"], OWNER)
+
+
+def test_patch_checks_owner_type_and_condition(document):
+    operations = [{"op": "incr", "path": "/count", "value": 1}]
+    assert database.patch_document(document["id"], operations, OWNER, "note")["count"] == 1
+    assert database.patch_document(document["id"], operations, OWNER, "reminder") is None
+    assert database.patch_document(document["id"], operations, OWNER, condition="c.count > 5") is None
+    assert _read(document)["count"] == 1
+
+
+def test_missing_parents_fall_back_without_losing_concurrent_writes(document, monkeypatch):
+    read_item = database._container.read_item
+    raced = []
+
+    def read_then_race(*args, **kwargs):
+        doc = read_item(*args, **kwargs)
+        if not raced:
+            # Another request patches the document between our read and our write
+            raced.append(True)
+            database.patch_document(document["id"], [{"op": "incr", "path": "/count", "value": 1}], OWNER)
+        return doc
+
+    monkeypatch.setattr(database._container, "read_item", read_then_race)
+    updated = database.patch_document(document["id"], [{"op": "set", "path": "/settings/theme/dark", "value": True}],
+                                      OWNER, create_parents=True)
+    assert updated["settings"] == {"theme": {"dark": True}}
+    assert _read(document)["count"] == 1
+
+
+def test_fallback_checks_the_condition(document):
+    operations = [{"op": "set", "path": "/settings/theme", "value": "dark"}]
+    assert database.patch_document(document["id"], operations, OWNER, condition="c.count > 5", create_parents=True) is None
+    assert "settings" not in _read(document)
+    assert database.patch_document(document["id"], operations, OWNER, condition="c.count = 0", create_parents=True)
+    assert _read(document)["settings"] == {"theme": "dark"}
+
+
+# Settings updates deep merge like the read-modify-replace they replaced
+
+@pytest.mark.parametrize("stored, update, expected", [
+    ({"theme": "light"}, {"theme": {"dark": True}}, {"theme": {"dark": True}}),
+    ({"notifications": {"email": True}}, {"notifications": {"push": False}}, {"notifications": {"email": True, "push": False}}),
+    ({"notifications": {"email": True}}, {"notifications": {}}, {"notifications": {"email": True}}),
+    ({}, {"notifications": {}}, {"notifications": {}}),
+    (None, {"theme": "dark"}, {"theme": "dark"}),
+])
+def test_settings_merge(stored, update, expected):
+    doc = {} if stored is None else {"settings": stored}
+    apply_patch_operations(doc, merge_operations(update, doc.get("settings"), "settings"), create_parents=True)
+    assert doc["settings"] == expected
@@ -0,0 +1,132 @@
+import uuid
+
+import azure.functions as func
+import pytest
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+
+import resilience
+from resilience import DataUnavailableError, LoadShedError, execute, non_critical
+
+
+@pytest.fixture
+def breaker_name(monkeypatch):
+    monkeypatch.setattr(resilience, "_backoff", lambda attempt: 0)
+    monkeypatch.setattr(resilience, "FAILURE_THRESHOLD", 3)
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+def failing(*errors, result="ok"):
+    """A call raising errors in turn, then returning result; counts its calls."""
+    remaining = list(errors)
+
+    def call():
+        call.calls += 1
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    call.calls = 0
+    return call
+
+
+def status(code, retry_after_ms=None):
+    error = CosmosHttpResponseError(status_code=code, message=f"status {code}")
+    error.headers = {"x-ms-retry-after-ms": str(retry_after_ms)} if retry_after_ms is not None else {}
+    return error
+
+
+def test_transient_failures_are_retried(breaker_name):
+    call = failing(status(429), status(503))
+    assert execute("write", call, breaker_name) == "ok"
+    assert call.calls == 3
+
+
+def test_writes_are_not_repeated_when_they_may_have_applied(breaker_name):
+    call = failing(status(408))
+    with pytest.raises(CosmosHttpResponseError):
+        execute("write", call, breaker_name)
+    assert call.calls == 1
+    # A read is safe to repeat
+    assert execute("read", failing(status(408)), breaker_name) == "ok"
+
+
+def test_request_errors_pass_through(breaker_name):
+    call = failing(CosmosResourceNotFoundError(message="missing"))
+    with pytest.raises(CosmosResourceNotFoundError):
+        execute("read", call, breaker_name)
+    assert call.calls == 1
+
+
+def test_exhausted_retries_raise_data_unavailable(breaker_name, monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_ATTEMPTS", 2)
+    call = failing(*[status(429, retry_after_ms=1)] * 5)
+    with pytest.raises(DataUnavailableError) as error:
+        execute("read", call, breaker_name)
+    assert call.calls == 2
+    assert error.value.retry_after >= 1.0
+
+
+def _open_circuit(breaker_name):
+    for _ in range(resilience.FAILURE_THRESHOLD):
+        resilience.get_breaker(breaker_name).record_failure(throttled=False)
+
+
+def test_open_circuit_fails_fast_then_probes(breaker_name, monkeypatch):
+    _open_circuit(breaker_name)
+    call = failing()
+    with pytest.raises(DataUnavailableError):
+        execute("read", call, breaker_name)
+    assert call.calls == 0
+
+    # Recovered: the probe goes through and closes the circuit
+    monkeypatch.setattr(resilience, "RECOVERY_SECONDS", 0)
+    assert execute("read", call, breaker_name) == "ok"
+    assert execute("read", call, breaker_name) == "ok"
+    assert call.calls == 2
+
+
+def test_failed_probe_reopens_the_circuit(breaker_name, monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_ATTEMPTS", 1)
+    _open_circuit(breaker_name)
+    monkeypatch.setattr(resilience, "RECOVERY_SECONDS", 0)
+    with pytest.raises(DataUnavailableError):
+        execute("read", failing(status(503)), breaker_name)
+
+    monkeypatch.setattr(resilience, "RECOVERY_SECONDS", 15)
+    call = failing()
+    with pytest.raises(DataUnavailableError):
+        execute("read", call, breaker_name)
+    assert call.calls == 0
+
+
+def test_non_critical_work_is_skipped_while_throttled(breaker_name):
+    call = failing(status(429))
+
+    @non_critical
+    def analytics():
+        return execute("write", call, breaker_name)
+
+    assert analytics() is None
+    # Not retried: the capacity is left to user-facing requests
+    assert call.calls == 1
+
+
+def test_non_critical_work_is_skipped_while_the_circuit_is_open(breaker_name):
+    _open_circuit(breaker_name)
+    call = failing()
+
+    @non_critical
+    def analytics():
+        return execute("write", call, breaker_name)
+
+    assert analytics() is None
+    assert call.calls == 0
+    with pytest.raises(LoadShedError):
+        resilience.get_breaker(breaker_name).before_call(critical=False)
+
+
+def test_shed_errors_do_not_turn_the_request_into_a_503(breaker_name):
+    _open_circuit(breaker_name)
+    token = resilience.begin_request()
+    non_critical(lambda: execute("write", failing(), breaker_name))()
+    response = resilience.end_request(token, func.HttpResponse("error", status_code=500))
+    assert response.status_code == 500
@@ -0,0 +1,89 @@
+import time
+import uuid
+
+import pytest
+
+import database
+
+USER = "reviewer@example.com"
+
+
+@pytest.fixture
+def module(university):
+    database._ensure_university_doc(university)
+    module = {
+        "id": f"module_{uuid.uuid4()}",
+        "type": "module",
+        "name": "Algorithms",
+        "code": "CS201",
+        "university": university,
+        "degree": "Computer Science",
+        "user_email": USER,
+    }
+    database._container.create_item(body=module)
+    return module
+
+
+def review(module, difficulty, teaching, recommended, grade=None):
+    return database.create_module_review({
+        "module_id": module["id"],
+        "university": module["university"],
+        "degree": module["degree"],
+        "user_email": USER,
+        "difficulty_rating": difficulty,
+        "teaching_quality_rating": teaching,
+        "recommended_rating": recommended,
+        "grade_received": grade,
+    })
+
+
+def statistics(module):
+    return database.get_module_statistics(module["id"], module["university"], module["degree"])
+
+
+def stats_doc(module):
+    uni_doc = database._find_university_doc(module["university"])
+    stats_id = database.module_stats_id(uni_doc["id"], module["degree"], module["code"])
+    return database._uni_container.read_item(item=stats_id, partition_key=stats_id)
+
+
+def test_running_totals_follow_reviews_created_edited_and_deleted(module):
+    first = review(module, 2, 4, 5, grade=72)
+    review(module, 4, 2, 3, grade=55)
+    assert statistics(module) == {
+        "difficulty_avg": 3.0,
+        "teaching_quality_avg": 3.0,
+        "recommended_avg": 4.0,
+        "total_reviews": 2,
+        "grade_distribution": {"71-80%": 1, "51-60%": 1},
+    }
+
+    database.update_module_review(first["id"], USER, {"difficulty_rating": 4, "grade_received": 58, "module_id": "other"})
+    assert statistics(module)["difficulty_avg"] == 4.0
+    assert statistics(module)["grade_distribution"] == {"51-60%": 2}
+    assert stats_doc(module)["review_totals"]["count"] == 2
+
+    assert database.delete_module_review(first["id"], USER)
+    assert statistics(module)["total_reviews"] == 1
+    assert statistics(module)["grade_distribution"] == {"51-60%": 1}
+
+
+def test_only_the_owner_edits_a_review(module):
+    created = review(module, 2, 4, 5)
+    assert database.update_module_review(created["id"], "someone@example.com", {"difficulty_rating": 5}) is None
+    assert statistics(module)["difficulty_avg"] == 2.0
+
+
+def test_reconcile_corrects_drifted_totals(module, monkeypatch):
+    review(module, 2, 4, 5)
+    review(module, 4, 4, 5)
+    doc = stats_doc(module)
+    doc["review_totals"] = dict(doc["review_totals"], count=7, difficulty_sum=1)
+    database._uni_container.replace_item(item=doc["id"], body=doc)
+
+    # Documents written since a recount started are left to the next run
+    later = time.time() + 5
+    monkeypatch.setattr(database.time, "time", lambda: later)
+    assert database.reconcile_review_statistics() >= 1
+    assert statistics(module)["total_reviews"] == 2
+    assert statistics(module)["difficulty_avg"] == 3.0
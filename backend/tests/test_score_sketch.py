@@ -0,0 +1,100 @@
+import json
+import random
+
+import azure.functions as func
+import pytest
+
+import database
+import score_sketch
+from university_routes import get_university_degree_analytics
+
+DEGREE = "Economics"
+
+
+def sketch_of(scores):
+    sketch = score_sketch.empty()
+    for score in scores:
+        score_sketch.add(sketch, score)
+    return sketch
+
+
+def exact_quantile(scores, q):
+    ordered = sorted(scores)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def test_add_and_remove():
+    sketch = sketch_of([55.5, 55.9, 70])
+    assert sketch == {"count": 3, "sum": 181.4, "bins": {"55": 2, "70": 1}}
+    score_sketch.add(sketch, 70, -1)
+    assert sketch["bins"] == {"55": 2}
+    assert score_sketch.mean(sketch) == pytest.approx(55.7)
+    # Out of range scores are clamped
+    assert sketch_of([-5, 120])["bins"] == {"0": 1, "100": 1}
+
+
+def test_empty_sketches():
+    assert score_sketch.mean(score_sketch.empty()) is None
+    assert score_sketch.quantile(score_sketch.empty(), 0.5) is None
+    assert score_sketch.percentile_rank(None, 50) is None
+
+
+def test_quantiles_and_ranks_are_within_a_point_of_exact():
+    scores = [random.Random(seed).uniform(30, 95) for seed in range(500)]
+    sketch = sketch_of(scores)
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        assert abs(score_sketch.quantile(sketch, q) - exact_quantile(scores, q)) <= 1
+    for score in (40, 62.5, 90):
+        exact = 100 * sum(1 for s in scores if s < score) / len(scores)
+        assert abs(score_sketch.percentile_rank(sketch, score) - exact) <= 1
+    assert score_sketch.percentile_rank(sketch, 0) == 0
+    assert score_sketch.percentile_rank(sketch, 100) == 100
+
+
+def test_merge_equals_one_sketch_of_every_score():
+    first, second = [40, 41.5, 60], [60.2, 75, 88]
+    merged = score_sketch.merge([sketch_of(first), None, sketch_of(second)])
+    assert merged == sketch_of(first + second)
+    assert score_sketch.summary(merged)["median"] == score_sketch.quantile(merged, 0.5)
+    assert set(score_sketch.summary(merged)["percentiles"]) == {"10", "25", "50", "75", "90"}
+
+
+def test_grade_distribution_uses_the_grade_ranges():
+    sketch = sketch_of([5, 45, 49.5, 95])
+    assert score_sketch.grade_distribution(sketch, database.get_grade_range) == {
+        database.get_grade_range(5): 1, database.get_grade_range(45): 2, database.get_grade_range(95): 1
+    }
+
+
+def test_merged_score_summary_needs_every_scored_module():
+    complete = {"student_counter": 2, "score_sketch": sketch_of([40, 60])}
+    other = {"student_counter": 1, "score_sketch": sketch_of([80])}
+    reviewed_only = {"student_counter": 0}
+    summary = database.merged_score_summary([complete, other, reviewed_only])
+    assert summary["median"] == score_sketch.quantile(sketch_of([40, 60, 80]), 0.5)
+
+    # Scored before sketches were kept: the merge would leave its scores out
+    partial = {"student_counter": 3, "score_sketch": sketch_of([50])}
+    assert database.merged_score_summary([complete, partial]) == {"median": None, "percentiles": {}}
+    assert database.merged_score_summary([]) == {"median": None, "percentiles": {}}
+
+
+def test_degree_analytics_report_percentiles_over_every_module(university):
+    for name, scores in (("Micro", [40, 50, 60]), ("Macro", [70, 80])):
+        for score in scores:
+            database.update_university_module_data({
+                "university": university, "degree": DEGREE, "name": name, "code": "", "score": score
+            })
+
+    request = func.HttpRequest(method="GET", url="/api/analytics/university/degree", body=b"",
+                               params={"university": university, "degree": DEGREE})
+    response = get_university_degree_analytics(request)
+    assert response.status_code == 200
+    analytics = json.loads(response.get_body())
+    everything = sketch_of([40, 50, 60, 70, 80])
+    assert analytics["median"] == score_sketch.quantile(everything, 0.5)
+    assert analytics["percentiles"]["90"] == score_sketch.quantile(everything, 0.9)
+    assert {module["name"]: module["median"] for module in analytics["modules"]} == {
+        "Micro": score_sketch.quantile(sketch_of([40, 50, 60]), 0.5),
+        "Macro": score_sketch.quantile(sketch_of([70, 80]), 0.5),
+    }
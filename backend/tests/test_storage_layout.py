@@ -0,0 +1,145 @@
+import uuid
+
+import pytest
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+import migrate_layout
+from storage import get_container
+from storage_layout import MARKER_TYPE, MainContainer
+
+ALICE = "alice@example.com"
+BOB = "bob@example.com"
+
+
+def layout(name):
+    suffix = uuid.uuid4().hex[:8]
+    return MainContainer(get_container(f"legacy-{suffix}", "/id"), get_container(f"userdata-{suffix}", "/pk"), name)
+
+
+def note(owner, text="hello"):
+    return {"id": f"note_{uuid.uuid4().hex[:8]}", "type": "note", "user_email": owner, "text": text}
+
+
+def stored(container, doc, key):
+    try:
+        return container.read_item(item=doc["id"], partition_key=key)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        layout("sharded")
+
+
+def test_legacy_layout_only_writes_the_id_container():
+    main = layout("legacy")
+    doc = note(ALICE)
+    main.create_item(body=doc)
+    assert "pk" not in main.read_item(item=doc["id"], partition_key=ALICE)
+    assert stored(main.legacy, doc, doc["id"])["text"] == "hello"
+    assert stored(main.partitioned, doc, ALICE) is None
+
+
+def test_user_layout_keys_documents_by_owner():
+    main = layout("user")
+    doc, other = note(ALICE), note(BOB)
+    main.create_item(body=doc)
+    main.create_item(body=other)
+    # Users own themselves
+    main.create_item(body={"id": ALICE, "email": ALICE})
+
+    assert main.read_item(item=doc["id"], partition_key=ALICE)["pk"] == ALICE
+    assert main.read_item(item=ALICE, partition_key=ALICE)["pk"] == ALICE
+    # No owner: found by id across partitions
+    assert main.read_item(item=other["id"])["text"] == "hello"
+    scoped = main.query_items("SELECT * FROM c WHERE c.type = 'note'", partition_key=ALICE)
+    assert [row["id"] for row in scoped] == [doc["id"]]
+    everyone = main.query_items("SELECT * FROM c WHERE c.type = 'note'", enable_cross_partition_query=True)
+    assert len(list(everyone)) == 2
+    assert stored(main.legacy, doc, doc["id"]) is None
+
+
+def test_dual_layout_mirrors_writes_and_serves_migrated_users_from_the_new_container():
+    main = layout("dual")
+    doc = note(ALICE)
+    main.create_item(body=doc)
+    main.patch_item(item=doc["id"], partition_key=ALICE, patch_operations=[{"op": "set", "path": "/text", "value": "edited"}])
+    assert stored(main.legacy, doc, doc["id"])["text"] == "edited"
+    assert stored(main.partitioned, doc, ALICE)["text"] == "edited"
+
+    assert not main.is_migrated(ALICE)
+    main.mark_migrated(ALICE)
+    main.partitioned.patch_item(item=doc["id"], partition_key=ALICE,
+                                patch_operations=[{"op": "set", "path": "/text", "value": "new container"}])
+    assert main.read_item(item=doc["id"], partition_key=ALICE)["text"] == "new container"
+    assert [row["text"] for row in main.query_items("SELECT * FROM c WHERE c.type = 'note'", partition_key=ALICE)] == ["new container"]
+
+    main.delete_item(item=doc["id"], partition_key=ALICE)
+    assert stored(main.legacy, doc, doc["id"]) is None
+    assert stored(main.partitioned, doc, ALICE) is None
+
+    main.clear_marker(ALICE)
+    assert not main.is_migrated(ALICE)
+
+
+def test_dual_layout_mirrors_batches_and_bulk_writes():
+    main = layout("dual")
+    first, second = note(ALICE), note(ALICE)
+    main.execute_item_batch(batch_operations=[("create", (first,))], partition_key=ALICE)
+    main.bulk_upsert([second, note(BOB)])
+    for doc in (first, second):
+        assert stored(main.legacy, doc, doc["id"]) is not None
+        assert stored(main.partitioned, doc, ALICE) is not None
+    main.execute_item_batch(batch_operations=[("delete", (first["id"],))], partition_key=ALICE)
+    assert stored(main.legacy, first, first["id"]) is None
+    assert stored(main.partitioned, first, ALICE) is None
+
+
+@pytest.fixture
+def migration(monkeypatch):
+    main = layout("dual")
+    monkeypatch.setattr(migrate_layout, "_container", main)
+    monkeypatch.setattr(migrate_layout, "_legacy", main.legacy)
+    monkeypatch.setattr(migrate_layout, "_partitioned", main.partitioned)
+    return main
+
+
+def test_copy_then_verify_marks_every_user(migration):
+    for owner in (ALICE, BOB):
+        migration.legacy.create_item(body={"id": owner, "email": owner})
+        for _ in range(3):
+            migration.legacy.create_item(body=note(owner))
+
+    checkpoint = migrate_layout.copy_documents(page_size=3)
+    assert checkpoint["copied"] == 8 and checkpoint["completed_at"]
+    report = migrate_layout.verify(page_size=3)
+    assert report["missing"] == report["different"] == report["extra"] == 0
+    assert report["newly_migrated"] == 2
+    assert migrate_layout.migrated_users() == {ALICE, BOB}
+
+
+def test_verify_only_marks_users_whose_documents_match(migration):
+    missing, different, extra = note(ALICE), note(ALICE), note(BOB)
+    migration.legacy.create_item(body=missing)
+    migration.legacy.create_item(body=different)
+    migration.partitioned.create_item(body=dict(different, pk=ALICE, text="stale"))
+    migration.partitioned.create_item(body=dict(extra, pk=BOB))
+    matching = note("carol@example.com")
+    migration.create_item(body=matching)
+
+    report = migrate_layout.verify(page_size=10)
+    assert (report["missing"], report["different"], report["extra"]) == (1, 1, 1)
+    assert migrate_layout.migrated_users() == {"carol@example.com"}
+
+    report = migrate_layout.verify(page_size=10, fix=True)
+    assert report["repaired"] == 3
+    assert stored(migration.partitioned, missing, ALICE) is not None
+    assert stored(migration.partitioned, different, ALICE)["text"] == "hello"
+    assert stored(migration.partitioned, extra, BOB) is None
+
+    report = migrate_layout.verify(page_size=10)
+    assert report["unverified"] == 0
+    assert ALICE in migrate_layout.migrated_users()
+    markers = migration.partitioned.query_items(f"SELECT * FROM c WHERE c.type = '{MARKER_TYPE}'", enable_cross_partition_query=True)
+    assert {row["pk"] for row in markers} == migrate_layout.migrated_users()
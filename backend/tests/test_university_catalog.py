@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+import database
+from university_catalog import UniversityCatalog
+
+
+class Source:
+    """Documents with _ts, served like _fetch_university_docs."""
+
+    def __init__(self, *names):
+        self.docs = {}
+        self.calls = []
+        self.clock = 0
+        self.fail = False
+        for name in names:
+            self.write(name)
+
+    def write(self, name, **fields):
+        self.clock += 1
+        self.docs[name] = {"id": name, "name": name, "_ts": self.clock, **fields}
+
+    def __call__(self, since):
+        self.calls.append(since)
+        if self.fail:
+            raise RuntimeError("store unavailable")
+        return [doc for doc in self.docs.values() if since is None or doc["_ts"] >= since]
+
+
+def names(catalog):
+    return sorted(doc["name"] for doc in catalog.documents())
+
+
+def test_first_read_loads_everything_then_serves_the_snapshot():
+    source = Source("A", "B")
+    catalog = UniversityCatalog(source, ttl=60)
+    assert names(catalog) == ["A", "B"]
+    source.write("C")
+    assert names(catalog) == ["A", "B"]
+    assert source.calls == [None]
+
+
+def test_invalidate_fetches_only_the_changes():
+    source = Source("A", "B")
+    catalog = UniversityCatalog(source, ttl=60)
+    catalog.documents()
+    source.write("B", counter=5)
+    source.write("C")
+    catalog.invalidate()
+    assert names(catalog) == ["A", "B", "C"]
+    assert source.calls == [None, 2]
+    assert next(doc for doc in catalog.documents() if doc["name"] == "B")["counter"] == 5
+
+
+def test_full_reload_drops_deleted_documents():
+    source = Source("A", "B")
+    catalog = UniversityCatalog(source, ttl=60, full_reload=0)
+    catalog.documents()
+    del source.docs["B"]
+    catalog.invalidate()
+    assert names(catalog) == ["A"]
+    assert source.calls == [None, None]
+
+
+def test_stale_snapshot_is_refreshed_in_the_background():
+    source = Source("A")
+    catalog = UniversityCatalog(source, ttl=0)
+    catalog.documents()
+    source.write("B")
+    # Served at once; the refresh catches up behind it
+    assert "A" in names(catalog)
+    deadline = time.monotonic() + 5
+    while names(catalog) != ["A", "B"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert names(catalog) == ["A", "B"]
+
+
+def test_failed_refresh_serves_the_previous_snapshot():
+    source = Source("A")
+    catalog = UniversityCatalog(source, ttl=60)
+    catalog.documents()
+    source.fail = True
+    catalog.invalidate()
+    assert names(catalog) == ["A"]
+
+    # Without a snapshot to fall back on the error is raised
+    with pytest.raises(RuntimeError):
+        UniversityCatalog(source).documents()
+
+
+def test_derived_views_are_rebuilt_once_per_version():
+    source = Source("A")
+    built = []
+    changes = []
+    catalog = UniversityCatalog(source, ttl=60, on_refresh=lambda changed, full: changes.append((len(changed), full)))
+
+    def build(docs):
+        built.append(len(docs))
+        return len(docs)
+
+    assert catalog.derive("count", build) == 1
+    assert catalog.derive("count", build) == 1
+    source.write("B")
+    catalog.invalidate()
+    assert catalog.derive("count", build) == 2
+    assert built == [1, 2]
+    # The newest document seen is fetched again, in case others share its _ts
+    assert changes == [(1, True), (2, False)]
+
+
+def test_catalog_sees_universities_created_by_this_worker(university):
+    database.get_all_universities_docs()
+    database._ensure_university_doc(university)
+    assert university in [doc["name"] for doc in database.get_all_universities_docs()]
+    # Counter shards and other typed documents in the container are not universities
+    assert all("type" not in doc for doc in database.get_all_universities_docs())
+    assert university in database.get_all_universities_json()
@@ -0,0 +1,63 @@
+import pytest
+
+from university_search import UniversitySearchIndex, normalize
+
+UNIVERSITIES = [
+    {"name": "King's College London", "counter": 50},
+    {"name": "University of London", "counter": 10},
+    {"name": "London School of Economics", "counter": 30},
+    {"name": "Londonderry Institute", "counter": 5},
+    {"name": "Université de Montréal", "counter": 20},
+    {"name": "Imperial College", "counter": 40},
+    {"name": "London", "counter": 0},
+    {"counter": 100},
+]
+
+
+@pytest.fixture
+def index():
+    return UniversitySearchIndex(UNIVERSITIES)
+
+
+def search(index, query, **kwargs):
+    return [doc["name"] for doc in index.search(query, **kwargs)]
+
+
+def test_normalize():
+    assert normalize("  King’s   College, LONDON ") == "kings college london"
+    assert normalize("Université de Montréal") == "universite de montreal"
+    assert normalize(None) == ""
+
+
+def test_documents_without_names_are_not_indexed(index):
+    assert len(index) == 7
+
+
+def test_matches_are_ranked_exact_prefix_word_prefix_then_substring(index):
+    assert search(index, "london") == [
+        "London",
+        # Prefixes: more students first
+        "London School of Economics",
+        "Londonderry Institute",
+        # A word starts with the query
+        "King's College London",
+        "University of London",
+    ]
+    assert search(index, "ondon", limit=2) == ["King's College London", "London School of Economics"]
+
+
+def test_queries_are_normalized_like_names(index):
+    assert search(index, "kings college") == ["King's College London"]
+    assert search(index, "MONTREAL") == ["Université de Montréal"]
+
+
+def test_short_queries_check_every_name(index):
+    assert search(index, "im") == ["Imperial College"]
+
+
+def test_offset_limit_and_misses(index):
+    assert search(index, "college", offset=1) == ["Imperial College"]
+    assert search(index, "london", offset=1, limit=2) == ["London School of Economics", "Londonderry Institute"]
+    assert search(index, "oxford") == []
+    assert search(index, "  ") == []
+    assert search(index, "london", limit=0) == []
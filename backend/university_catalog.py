@@ -0,0 +1,126 @@
+# university_catalog.py
+
+"""
+Process-wide snapshot of the university documents.
+
+The public university listings (top universities, analytics, search, GradeRadar)
+all need every university document. Instead of scanning the universities
+container on each request, they read an in-memory snapshot shared by every
+request the worker serves:
+
+    - The first read loads the whole catalog.
+    - After CATALOG_TTL_SECONDS the snapshot is still served, and a background
+      thread fetches only the documents changed since the newest _ts it has
+      seen. Every CATALOG_FULL_RELOAD_SECONDS the refresh reloads everything
+      instead, so deleted documents drop out.
+    - Writes to university documents made by this worker call invalidate(), and
+      the next read catches up before answering. Other workers see the change
+      within CATALOG_TTL_SECONDS.
+
+Snapshot documents are shared between requests and must not be modified;
+copy one before changing it (see database.with_live_counts). The module
+statistics documents, which share the universities container, are kept in a
+second catalog that feeds module search (see module_search.py).
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TTL_SECONDS = float(os.environ.get("UNIVERSITY_CATALOG_TTL_SECONDS", "60"))
+CATALOG_FULL_RELOAD_SECONDS = float(os.environ.get("UNIVERSITY_CATALOG_FULL_RELOAD_SECONDS", "3600"))
+
+
+class UniversityCatalog:
+    def __init__(self, fetch, ttl: float = CATALOG_TTL_SECONDS, full_reload: float = CATALOG_FULL_RELOAD_SECONDS,
+                 on_refresh=None):
+        """
+        fetch(since) returns the documents with _ts >= since, or all of them
+        when since is None. on_refresh(changed, full) is told about every
+        refresh, for indexes maintained incrementally alongside the snapshot.
+        """
+        self._fetch = fetch
+        self._on_refresh = on_refresh
+        self.ttl = ttl
+        self.full_reload = full_reload
+        # One refresh at a time; readers never wait on it once a snapshot exists
+        self._refresh_lock = threading.Lock()
+        self._docs = None
+        self._snapshot = None
+        self._max_ts = 0
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._stale = False
+        self._derived = {}
+        self.version = 0
+
+    def documents(self) -> list:
+        """The university documents, refreshed as described above."""
+        if self._snapshot is None or self._stale:
+            self._refresh(time.monotonic())
+        elif time.monotonic() - self._refreshed_at > self.ttl:
+            self._refresh_in_background()
+        return self._snapshot
+
+    def derive(self, key: str, build):
+        """
+        build(documents), computed once per snapshot version: for views every
+        request would otherwise rebuild from the same catalog.
+        """
+        documents = self.documents()
+        version = self.version
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = build(documents)
+        self._derived[key] = (version, value)
+        return value
+
+    def invalidate(self):
+        """A university document changed; catch up on the next read."""
+        self._stale = True
+
+    def _refresh_in_background(self):
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._refresh, args=(time.monotonic(),), daemon=True).start()
+
+    def _refresh(self, requested: float):
+        with self._refresh_lock:
+            if self._snapshot is not None and not self._stale and self._refreshed_at >= requested:
+                # Another thread refreshed while we waited
+                return
+
+            full = self._docs is None or time.monotonic() - self._loaded_at > self.full_reload
+            # Cleared before fetching so a write during the fetch marks it again
+            self._stale = False
+            started = time.monotonic()
+            try:
+                changed = self._fetch(None if full else self._max_ts)
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                logger.warning(f"University catalog refresh failed, serving the previous snapshot: {e}")
+                # Wait out the TTL before trying again rather than on every request
+                self._refreshed_at = started
+                return
+
+            docs = {} if full else dict(self._docs)
+            max_ts = 0 if full else self._max_ts
+            for doc in changed:
+                docs[doc["id"]] = doc
+                max_ts = max(max_ts, doc.get("_ts", 0))
+
+            self._docs = docs
+            self._snapshot = list(docs.values())
+            self._max_ts = max_ts
+            self._refreshed_at = started
+            if full:
+                self._loaded_at = started
+            self.version += 1
+            if self._on_refresh is not None:
+                self._on_refresh(changed, full)
+            logger.info(f"University catalog {'loaded' if full else 'refreshed'}: {len(changed)} documents fetched, {len(docs)} total")
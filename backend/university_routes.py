@@ -521,40 +521,28 @@ def import_template_modules(req: func.HttpRequest) -> func.HttpResponse:
 def get_university_analytics(req: func.HttpRequest) -> func.HttpResponse:
     """Get analytics data for all universities"""
     try:
-        from database import get_all_universities_docs
+        from database import get_all_universities_docs, get_degree_summaries, get_major_count
         universities = get_all_universities_docs()
         
         # Prepare an analytics-friendly response
         analytics_data = []
         
         for uni in universities:
-            # Skip universities with no degrees or modules
-            if "degrees" not in uni:
-                continue
-                
             uni_data = {
                 "name": uni.get("name", ""),
                 "students_count": uni.get("counter", 0),
                 "degrees": []
             }
             
-            # Process each degree
-            for degree_name, degree_data in uni.get("degrees", {}).items():
-                # Skip degrees with no modules
-                if "modules" not in degree_data:
-                    continue
-                    
+            # Process each degree with modules
+            for degree_name, summary in get_degree_summaries(uni).items():
                 # Count students in this degree
-                student_count = 0
-                for major in uni.get("majors", []):
-                    if major.get("major_name") == degree_name:
-                        student_count = major.get("counter", 0)
-                        break
+                student_count = get_major_count(uni, degree_name)
                 
                 degree_info = {
                     "name": degree_name,
                     "students_count": student_count,
-                    "modules_count": len(degree_data.get("modules", {}))
+                    "modules_count": summary["modules_count"]
                 }
                 
                 uni_data["degrees"].append(degree_info)
@@ -587,7 +575,7 @@ def get_university_degree_analytics(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        from database import get_university_doc
+        from database import get_university_doc, get_degree_summaries, get_module_stats_docs, module_score_summary, merged_score_summary, get_major_count
         uni_doc = get_university_doc(university_name)
         
         if not uni_doc:
@@ -598,25 +586,20 @@ def get_university_degree_analytics(req: func.HttpRequest) -> func.HttpResponse:
             )
             
         # Check if degree exists
-        if "degrees" not in uni_doc or degree_name not in uni_doc["degrees"]:
+        if degree_name not in get_degree_summaries(uni_doc):
             return func.HttpResponse(
                 json.dumps({"error": "Degree not found"}),
                 status_code=404,
                 mimetype="application/json"
             )
-            
-        degree_data = uni_doc["degrees"][degree_name]
         
         # Get student count
-        student_count = 0
-        for major in uni_doc.get("majors", []):
-            if major.get("major_name") == degree_name:
-                student_count = major.get("counter", 0)
-                break
+        student_count = get_major_count(uni_doc, degree_name)
         
         # Prepare module data
         modules = []
-        for module_key, module_data in degree_data.get("modules", {}).items():
+        stats_docs = get_module_stats_docs(uni_doc, degree_name)
+        for module_data in stats_docs:
             # Simplify the grade distribution for the response
             grade_dist = []
             if "grade_distribution" in module_data:
@@ -634,6 +617,7 @@ def get_university_degree_analytics(req: func.HttpRequest) -> func.HttpResponse:
                 "semester": module_data.get("semester", 1),
                 "students_count": module_data.get("student_counter", 0),
                 "average_score": module_data.get("average_score", 0),
+                "median": module_score_summary(module_data)["median"],
                 "grade_distribution": grade_dist
             }
             
@@ -647,6 +631,8 @@ def get_university_degree_analytics(req: func.HttpRequest) -> func.HttpResponse:
             "degree": degree_name,
             "students_count": student_count,
             "modules_count": len(modules),
+            # Over every score in the degree's modules
+            **merged_score_summary(stats_docs),
             "modules": modules
         }
         
@@ -677,7 +663,7 @@ def get_module_analytics(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        from database import get_university_doc
+        from database import get_university_doc, get_degree_summaries, find_module_stats, module_score_summary
         uni_doc = get_university_doc(university_name)
         
         if not uni_doc:
@@ -688,24 +674,15 @@ def get_module_analytics(req: func.HttpRequest) -> func.HttpResponse:
             )
             
         # Check if degree exists
-        if "degrees" not in uni_doc or degree_name not in uni_doc["degrees"]:
+        if degree_name not in get_degree_summaries(uni_doc):
             return func.HttpResponse(
                 json.dumps({"error": "Degree not found"}),
                 status_code=404,
                 mimetype="application/json"
             )
-            
-        degree_data = uni_doc["degrees"][degree_name]
         
         # Find the module
-        module_data = None
-        for module_key, data in degree_data.get("modules", {}).items():
-            if module_name and data.get("name") == module_name:
-                module_data = data
-                break
-            elif module_code and data.get("code") == module_code:
-                module_data = data
-                break
+        module_data = find_module_stats(uni_doc, degree_name, module_code, module_name)
         
         if not module_data:
             return func.HttpResponse(
@@ -732,6 +709,7 @@ def get_module_analytics(req: func.HttpRequest) -> func.HttpResponse:
             "semester": module_data.get("semester", 1),
             "students_count": module_data.get("student_counter", 0),
             "average_score": module_data.get("average_score", 0),
+            **module_score_summary(module_data),
             "grade_distribution": grade_dist,
             "last_updated": module_data.get("last_updated", "")
         }
@@ -757,23 +735,9 @@ def get_top_universities(req: func.HttpRequest) -> func.HttpResponse:
         # Get limit parameter, default to 10
         limit = int(req.params.get("limit", "10"))
         
-        from database import get_all_universities_docs
-        universities = get_all_universities_docs()
-        
-        # Filter to include only universities with degree data
-        valid_universities = []
-        for uni in universities:
-            if "degrees" in uni and uni["degrees"]:  # Only include universities with degree data
-                # Create a simplified response object
-                uni_data = {
-                    "name": uni.get("name", ""),
-                    "students_count": uni.get("counter", 0),
-                    "degrees_count": len(uni.get("degrees", {}))
-                }
-                valid_universities.append(uni_data)
-        
-        # Sort by student count (descending) and take the top N
-        top_universities = sorted(valid_universities, key=lambda x: x["students_count"], reverse=True)[:limit]
+        from database import get_top_universities as top_universities_by_students
+        # Served from a snapshot kept sorted alongside the university catalog
+        top_universities = top_universities_by_students(limit)
         
         return func.HttpResponse(
             json.dumps({"universities": top_universities}),
@@ -798,7 +762,7 @@ def search_university_analytics(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        from database import get_all_universities_docs
+        from database import get_all_universities_docs, get_degree_summaries
         all_universities = get_all_universities_docs()
         
         # Find matching universities
@@ -807,11 +771,12 @@ def search_university_analytics(req: func.HttpRequest) -> func.HttpResponse:
         
         for uni in all_universities:
             # Only include in search if it has degree data
-            if "degrees" in uni and uni["degrees"] and query in uni.get("name", "").lower():
+            degrees = get_degree_summaries(uni)
+            if degrees and query in uni.get("name", "").lower():
                 results.append({
                     "name": uni.get("name", ""),
                     "students_count": uni.get("counter", 0),
-                    "degrees_count": len(uni.get("degrees", {}))
+                    "degrees_count": len(degrees)
                 })
         
         if not results:
@@ -846,7 +811,7 @@ def get_university_degrees_list(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        from database import get_university_doc
+        from database import get_university_doc, get_degree_summaries, get_major_count
         university_doc = get_university_doc(university_name)
         
         if not university_doc:
@@ -859,22 +824,15 @@ def get_university_degrees_list(req: func.HttpRequest) -> func.HttpResponse:
         # Get degrees with module counts
         degrees_data = []
         
-        if "degrees" in university_doc:
-            for degree_name, degree_data in university_doc["degrees"].items():
-                module_count = len(degree_data.get("modules", {}))
-                
-                # Get student count from majors
-                student_count = 0
-                for major in university_doc.get("majors", []):
-                    if major.get("major_name") == degree_name:
-                        student_count = major.get("counter", 0)
-                        break
-                
-                degrees_data.append({
-                    "name": degree_name,
-                    "modules_count": module_count,
-                    "students_count": student_count
-                })
+        for degree_name, summary in get_degree_summaries(university_doc).items():
+            # Get student count from majors
+            student_count = get_major_count(university_doc, degree_name)
+            
+            degrees_data.append({
+                "name": degree_name,
+                "modules_count": summary["modules_count"],
+                "students_count": student_count
+            })
         
         # Sort by student count descending
         degrees_data.sort(key=lambda x: x["students_count"], reverse=True)
@@ -909,7 +867,7 @@ def get_degree_modules_list(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        from database import get_university_doc
+        from database import get_university_doc, get_degree_summaries, get_module_stats_docs
         university_doc = get_university_doc(university_name)
         
         if not university_doc:
@@ -920,19 +878,17 @@ def get_degree_modules_list(req: func.HttpRequest) -> func.HttpResponse:
             )
             
         # Check if degree exists
-        if "degrees" not in university_doc or degree_name not in university_doc["degrees"]:
+        if degree_name not in get_degree_summaries(university_doc):
             return func.HttpResponse(
                 json.dumps({"error": "Degree not found"}),
                 status_code=404,
                 mimetype="application/json"
             )
-            
-        degree_data = university_doc["degrees"][degree_name]
         
         # Get modules list
         modules_list = []
         
-        for module_key, module_data in degree_data.get("modules", {}).items():
+        for module_data in get_module_stats_docs(university_doc, degree_name):
             module_info = {
                 "name": module_data.get("name", ""),
                 "code": module_data.get("code", ""),
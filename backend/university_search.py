@@ -0,0 +1,99 @@
+# university_search.py
+
+"""
+In-memory name search over the university catalog.
+
+University autocomplete fires on every keystroke, so instead of a
+CONTAINS(LOWER(c.name), ...) scan per request, names are indexed once per
+catalog snapshot (see database.search_universities):
+
+    - every 3-character window (trigram) of a normalized name maps to the
+      names containing it, so a substring query only checks the names that
+      contain all of its trigrams
+    - queries shorter than a trigram are checked against every name
+
+Names are normalized (case, accents, punctuation, spacing) on both sides, so
+"kings college" finds "King's College London". Matches are ranked: exact
+name, name prefix, word prefix, then anywhere in the name; ties go to the
+university with more registered students, then alphabetically.
+"""
+
+import heapq
+import re
+import unicodedata
+
+GRAM = 3
+
+_SEPARATORS = re.compile(r"[^\w]+")
+_APOSTROPHES = re.compile(r"['’`]")
+
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accent-free, single-spaced text with punctuation removed."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = _APOSTROPHES.sub("", text)
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def grams(text: str) -> set:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class UniversitySearchIndex:
+    def __init__(self, docs: list):
+        self._docs = [doc for doc in docs if doc.get("name")]
+        self._names = [normalize(doc["name"]) for doc in self._docs]
+        self._postings = {}
+        for position, name in enumerate(self._names):
+            for gram in grams(name):
+                self._postings.setdefault(gram, []).append(position)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _candidates(self, query: str):
+        if len(query) < GRAM:
+            return range(len(self._names))
+        postings = []
+        for gram in grams(query):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    def _rank(self, query: str, name: str):
+        if name == query:
+            return EXACT
+        if name.startswith(query):
+            return PREFIX
+        position = name.find(query)
+        if position < 0:
+            return None
+        if name[position - 1] == " ":
+            return WORD_PREFIX
+        # A later word may still start with the query
+        return WORD_PREFIX if f" {query}" in name else SUBSTRING
+
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> list:
+        """University documents matching query, best first, from offset to offset + limit."""
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+        ranked = []
+        for position in self._candidates(query):
+            rank = self._rank(query, self._names[position])
+            if rank is not None:
+                doc = self._docs[position]
+                ranked.append((rank, -doc.get("counter", 0), self._names[position], position))
+        top = heapq.nsmallest(max(offset, 0) + limit, ranked)
+        return [self._docs[position] for *_, position in top[max(offset, 0):]]
@@ -4,20 +4,25 @@ import os
 import json
 import datetime
 import uuid
-from passlib.hash import bcrypt
-from pydantic import ValidationError
 from azure.functions import HttpRequest, HttpResponse
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
 
-from models import User, UserLogin
+# passlib and the pydantic models are imported inside register/login: every
+# route imports this module for verify_session and most never need them
 from database import (
     create_user,
     get_user_by_email,
     increment_university_and_major_counter,
     get_university_doc,
+    with_live_counts,
+    get_majors_dictionary,
     search_universities,
+    search_universities_page,
+    search_cursor_offset,
     update_user_calculator,
     _container
 )
+from storage import page_params
 
 # Session configuration
 SESSION_COOKIE_NAME = "session_id"
@@ -29,7 +34,7 @@ def get_session(session_id: str) -> dict:
         session_key = f"session:{session_id}"
         session_doc = _container.read_item(item=session_key, partition_key=session_key)
         return session_doc
-    except Exception:
+    except CosmosResourceNotFoundError:
         return None
 
 def create_session(email: str) -> str:
@@ -88,6 +93,10 @@ def verify_session(req: HttpRequest) -> (bool, str):
 
 
 def register_user(req: HttpRequest) -> HttpResponse:
+    from passlib.hash import bcrypt
+    from pydantic import ValidationError
+    from models import User
+
     # Process registration with email notification
     try:
         body = req.get_json()
@@ -156,6 +165,10 @@ def register_user(req: HttpRequest) -> HttpResponse:
     return response
 
 def login_user(req: HttpRequest) -> HttpResponse:
+    from passlib.hash import bcrypt
+    from pydantic import ValidationError
+    from models import UserLogin
+
     try:
         body = req.get_json()
     except Exception:
@@ -232,9 +245,20 @@ def protected_resource(req: HttpRequest) -> HttpResponse:
 
 def get_universities_endpoint(req: HttpRequest) -> HttpResponse:
     try:
-        from database import get_all_universities_docs
-        docs = get_all_universities_docs()
-        return HttpResponse(json.dumps(docs), status_code=200, mimetype="application/json")
+        from database import get_all_universities_json
+        return HttpResponse(get_all_universities_json(), status_code=200, mimetype="application/json")
+    except Exception as e:
+        return HttpResponse(json.dumps({"error": str(e)}),
+                            status_code=500,
+                            mimetype="application/json")
+
+
+def get_majors_endpoint(req: HttpRequest) -> HttpResponse:
+    """Every major, for pickers; universities only count majors by id (major_counts)"""
+    try:
+        majors = [{"id": major, "major_name": name} for major, name in get_majors_dictionary().items()]
+        majors.sort(key=lambda major: major["major_name"])
+        return HttpResponse(json.dumps(majors), status_code=200, mimetype="application/json")
     except Exception as e:
         return HttpResponse(json.dumps({"error": str(e)}),
                             status_code=500,
@@ -257,7 +281,7 @@ def get_university_endpoint(req: HttpRequest) -> HttpResponse:
                 status_code=404,
                 mimetype="application/json"
             )
-        return HttpResponse(json.dumps(doc), status_code=200, mimetype="application/json")
+        return HttpResponse(json.dumps(with_live_counts(doc)), status_code=200, mimetype="application/json")
     except Exception as e:
         return HttpResponse(json.dumps({"error": str(e)}),
                             status_code=500,
@@ -370,11 +394,21 @@ def search_universities_endpoint(req: HttpRequest) -> HttpResponse:
     try:
         limit = int(req.params.get("limit", 10))
         offset = int(req.params.get("offset", 0))
+        page_size, cursor = page_params(req.params)
+        # A cursor that decodes to anything but an offset is the client's mistake
+        search_cursor_offset(cursor)
+        if limit < 0 or offset < 0:
+            raise ValueError("Negative limit or offset")
     except Exception:
         return HttpResponse(json.dumps({"error": "Invalid pagination parameters."}),
                             status_code=400,
                             mimetype="application/json")
     try:
+        if page_size:
+            results, next_cursor = search_universities_page(query, page_size, cursor)
+            return HttpResponse(json.dumps({"items": results, "next_cursor": next_cursor}),
+                                status_code=200,
+                                mimetype="application/json")
         results = search_universities(query, limit=limit, offset=offset)
         return HttpResponse(json.dumps(results), status_code=200, mimetype="application/json")
     except Exception as e: